@@ -0,0 +1,4 @@
+"""
+Benchmarks for Twinkly render-pipelinen
+Kjøres uten maskinvare mot en falsk Twinkly-kontroller
+"""
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Benchmark av render-pipelinen i TwinklySquare
+Kjører uten maskinvare og måler frames/s og minnebruk per frame
+
+Bruk (fra prosjektmappen):
+    python -m benchmarks.bench_render
+    python -m benchmarks.bench_render --panels 6x2 --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from types import ModuleType
+
+import twinkly_client
+from twinkly_client import TwinklySquare
+from device_cache import DeviceCache
+from layout_cache import LayoutCache
+from readings import PRICE, TEMPERATURE, Reading
+from render_ahead import RenderAhead
+from benchmarks.fake_twinkly import FakeHighControlInterface, synthetic_layout
+
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+ANIMATIONS = [
+    'show_sun_animation',
+    'show_rain_animation',
+    'show_snow_animation',
+    'show_thunder_animation',
+    'show_fog_animation',
+]
+
+
+class _NoSleepTime(ModuleType):
+    """time-modul der sleep() ikke venter - animasjoner kjører så fort de kan"""
+
+    def __init__(self):
+        super().__init__('time')
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    @staticmethod
+    def sleep(seconds):
+        pass
+
+
+def create_twinkly(panels_x: int, panels_y: int) -> TwinklySquare:
+    """Lager en tilkoblet TwinklySquare mot en falsk kontroller"""
+    layout = synthetic_layout(panels_x, panels_y)
+    # Egne cacher så den falske enheten ikke havner i prosjektets cachefiler
+    cache_dir = Path(tempfile.mkdtemp(prefix='twinkly-bench-'))
+    original = twinkly_client.HighControlInterface
+    twinkly_client.HighControlInterface = lambda host: FakeHighControlInterface(host, layout)
+    try:
+        twinkly = TwinklySquare(ip_address='127.0.0.1',
+                                device_cache=DeviceCache(cache_dir / 'devices.json'),
+                                layout_cache=LayoutCache(cache_dir / 'layouts'),
+                                use_movies=False)  # Mål strømming, ikke filmer på enheten
+        if not twinkly.connect():
+            raise RuntimeError("Kunne ikke koble til falsk Twinkly")
+    finally:
+        twinkly_client.HighControlInterface = original
+    return twinkly
+
+
+def build_cases(twinkly: TwinklySquare) -> dict:
+    """
+    Lager benchmark-tilfellene
+
+    Hver case er en funksjon som renderer én eller flere frames
+    og returnerer hvor mange frames som ble laget.
+    """
+    cases = {}
+
+    canvas = [[(0, 0, 0) for _ in range(twinkly.width)] for _ in range(twinkly.height)]
+    for y in range(twinkly.height):
+        for x in range(twinkly.width):
+            if (x + y) % 3 == 0:
+                canvas[y][x] = (20, 20, 40)
+
+    def create_frame():
+        twinkly.create_frame(canvas)
+        return 1
+    cases['create_frame'] = create_frame
+
+    values = [(-5.3, 'Ute (Sokndal)', TEMPERATURE), (21.4, 'Stue', TEMPERATURE),
+              (8.9, 'Kjeller', TEMPERATURE), (87.2, 'Strømpris NO2', PRICE)]
+    counter = {'i': 0}
+
+    def show_temperature_with_icon():
+        value, location, metric = values[counter['i'] % len(values)]
+        counter['i'] += 1
+        twinkly.show_temperature_with_icon(value, location, metric)
+        return 1
+    cases['show_temperature_with_icon'] = show_temperature_with_icon
+
+    # Byttet i rotasjonen: ferdig frame sendes, så rendres neste mens denne vises
+    readings = [Reading('bench', location, location, metric, value) for value, location, metric in values]
+    ahead = RenderAhead(twinkly)
+
+    def rotate_render_ahead():
+        i = counter['i']
+        counter['i'] += 1
+        twinkly.send_frame(ahead.take(readings[i % len(readings)]))
+        ahead.prepare([readings[(i + k) % len(readings)] for k in range(1, ahead.depth + 1)])
+        return 1
+    cases['rotate_render_ahead'] = rotate_render_ahead
+
+    def show_clock():
+        i = counter['i']
+        counter['i'] += 1
+        twinkly.show_clock((i // 60) % 24, i % 60)
+        return 1
+    cases['show_clock'] = show_clock
+
+    def make_animation(method_name):
+        method = getattr(twinkly, method_name)
+
+        def run():
+            before = twinkly.control.frames_sent
+            method(duration=1)
+            return twinkly.control.frames_sent - before
+        return run
+
+    for name in ANIMATIONS:
+        cases[name] = make_animation(name)
+
+    def show_electricity_warning():
+        before = twinkly.control.frames_sent
+        twinkly.show_electricity_warning(150, threshold=100, duration=1)
+        return twinkly.control.frames_sent - before
+    cases['show_electricity_warning'] = show_electricity_warning
+
+    return cases
+
+
+def time_case(run, min_seconds: float) -> dict:
+    """Kjører en case til min_seconds har gått og måler frames/s"""
+    run()  # Oppvarming
+
+    frames = 0
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds or calls < 3:
+        frames += run()
+        calls += 1
+        elapsed = time.perf_counter() - start
+
+    return {
+        'frames': frames,
+        'seconds': round(elapsed, 4),
+        'fps': round(frames / elapsed, 2),
+        'ms_per_frame': round(elapsed * 1000 / frames, 4),
+    }
+
+
+def measure_allocations(run, control: FakeHighControlInterface, calls: int = 5) -> dict:
+    """
+    Måler minne allokert per frame med tracemalloc
+
+    For caser som sender frames måles topp-allokeringen mellom hver sendte
+    frame (i den falske kontrolleren). For create_frame, som ikke sender,
+    måles toppen per kall.
+    """
+    tracemalloc.start()
+    try:
+        frames = 0
+        peak_total = 0
+        for _ in range(calls):
+            control.reset_alloc_tracking()
+            baseline = tracemalloc.get_traced_memory()[0]
+            produced = run()
+            if control.alloc_frames:
+                peak_total += control.alloc_peak_total
+                frames += control.alloc_frames
+            else:
+                peak_total += tracemalloc.get_traced_memory()[1] - baseline
+                frames += produced
+    finally:
+        tracemalloc.stop()
+
+    return {'alloc_bytes_per_frame': int(peak_total / max(frames, 1))}
+
+
+def git_commit() -> str:
+    """Henter nåværende git commit (kort hash)"""
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).parent
+        )
+        if result.returncode == 0:
+            return result.stdout.strip()
+    except OSError:
+        pass
+    return 'unknown'
+
+
+def compare(results: dict, baseline_path: Path):
+    """Skriver ut endring i frames/s mot et tidligere resultat"""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+
+    print(f"\nSammenligning mot {baseline.get('commit', baseline_path.name)}:")
+    for name, result in results['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            print(f"  {name:30s} (ny)")
+            continue
+        change = (result['fps'] - old['fps']) / old['fps'] * 100
+        marker = '✗' if change < -10 else '✓'
+        print(f"  {marker} {name:28s} {old['fps']:>10.1f} -> {result['fps']:>10.1f} fps ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark av Twinkly render-pipelinen")
+    parser.add_argument('--panels', default='3x2', help="Paneloppsett BxH (standard 3x2 = 384 LEDs)")
+    parser.add_argument('--seconds', type=float, default=1.0, help="Minimum tid per case")
+    parser.add_argument('--only', nargs='*', help="Kjør bare disse casene")
+    parser.add_argument('--output', type=Path, help="JSON resultatfil (standard benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', type=Path, help="Tidligere resultatfil å sammenligne med")
+    args = parser.parse_args()
+
+    panels_x, panels_y = (int(v) for v in args.panels.lower().split('x'))
+
+    random.seed(1234)  # Animasjonene bruker random - gjør kjøringene sammenlignbare
+    twinkly = create_twinkly(panels_x, panels_y)
+    cases = build_cases(twinkly)
+    if args.only:
+        cases = {name: run for name, run in cases.items() if name in args.only}
+
+    commit = git_commit()
+    results = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'panels': args.panels,
+        'leds': len(twinkly.control.layout),
+        'results': {},
+    }
+
+    print(f"Benchmark {commit} - {results['leds']} LEDs ({args.panels} paneler)")
+    original_time = twinkly_client.time
+    twinkly_client.time = _NoSleepTime()
+    try:
+        for name, run in cases.items():
+            result = time_case(run, args.seconds)
+            result.update(measure_allocations(run, twinkly.control))
+            results['results'][name] = result
+            print(f"  {name:30s} {result['fps']:>10.1f} fps  "
+                  f"{result['ms_per_frame']:>8.3f} ms/frame  "
+                  f"{result['alloc_bytes_per_frame']:>8d} B/frame")
+    finally:
+        twinkly_client.time = original_time
+
+    output = args.output or RESULTS_DIR / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✓ Resultater lagret i {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Falsk Twinkly-kontroller for benchmarks
+Etterligner den delen av xled sin HighControlInterface som TwinklySquare bruker
+"""
+import tracemalloc
+from typing import Dict, List
+
+
+PANEL_SIZE = 8  # Hvert Square-panel er 8x8 LEDs
+
+
+def synthetic_layout(panels_x: int = 3, panels_y: int = 2) -> List[Dict[str, float]]:
+    """
+    Lager et syntetisk LED layout med samme koordinatsystem som Twinkly
+
+    Twinkly-koordinater: x går fra -1 til 1, y fra 0 (bunn) til 1 (topp).
+    LEDs nummereres panel for panel i slangemønster, slik de er koblet.
+
+    Args:
+        panels_x: Antall paneler i bredden
+        panels_y: Antall paneler i høyden
+
+    Returns:
+        Liste med {'x', 'y', 'z'} koordinater, én per LED (standard 384)
+    """
+    width = panels_x * PANEL_SIZE
+    height = panels_y * PANEL_SIZE
+    coordinates = []
+
+    for panel_y in range(panels_y):
+        for panel_x in range(panels_x):
+            for row in range(PANEL_SIZE):
+                columns = range(PANEL_SIZE)
+                if row % 2 == 1:
+                    columns = reversed(columns)
+                for col in columns:
+                    x = panel_x * PANEL_SIZE + col
+                    y = panel_y * PANEL_SIZE + row
+                    # Midt i cellen slik at int()-avrunding treffer riktig piksel
+                    coordinates.append({
+                        'x': -1.0 + (2 * x + 1) / width,
+                        'y': 1.0 - (y + 0.5) / height,
+                        'z': 0.0
+                    })
+
+    return coordinates
+
+
+class FakeHighControlInterface:
+    """Stand-in for xled.control.HighControlInterface uten nettverk"""
+
+    def __init__(self, host, layout: List[Dict[str, float]] = None):
+        """
+        Args:
+            host: IP-adresse (ignoreres)
+            layout: LED koordinater (standard 6 paneler / 384 LEDs)
+        """
+        self.host = host
+        self.layout = layout if layout is not None else synthetic_layout()
+        self.mode = 'movie'
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.last_frame = b''
+        # Minnetopp per sendt frame når tracemalloc er aktiv (se bench_render)
+        self.alloc_peak_total = 0
+        self.alloc_frames = 0
+        self._alloc_baseline = 0
+
+    def reset_alloc_tracking(self):
+        """Nullstiller minnemåling - kalles rett før en måling starter"""
+        self.alloc_peak_total = 0
+        self.alloc_frames = 0
+        if tracemalloc.is_tracing():
+            self._alloc_baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+    def get_device_info(self) -> dict:
+        return {
+            'number_of_led': len(self.layout),
+            'mac': 'fa:ke:00:00:00:01',
+            'device_name': 'Benchmark',
+            'led_profile': 'RGB',
+        }
+
+    def get_led_layout(self) -> dict:
+        return {'source': '2d', 'synthesized': False, 'coordinates': self.layout}
+
+    def set_mode(self, mode: str):
+        self.mode = mode
+
+    def get_mode(self) -> dict:
+        return {'mode': self.mode}
+
+    def set_rt_frame_socket(self, frame, version, leds_number=None):
+        data = frame.read() if hasattr(frame, 'read') else bytes(frame)
+        self.frames_sent += 1
+        self.bytes_sent += len(data)
+        self.last_frame = data
+
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            self.alloc_peak_total += peak - self._alloc_baseline
+            self.alloc_frames += 1
+            self._alloc_baseline = current
+            tracemalloc.reset_peak()
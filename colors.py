@@ -0,0 +1,193 @@
+"""
+Fargepipeline for Twinkly
+Gamma- og lysstyrketabell som brukes på hele framen i ett pass, og
+kontinuerlige fargeskalaer (LUT) for temperatur, strømpris og klokke
+"""
+from typing import List, Sequence, Tuple
+
+Color = Tuple[int, int, int]
+
+# LEDs lyser lineært med verdien, mens fargene i koden er valgt for øyet
+GAMMA = 2.2
+
+
+def build_output_table(gamma: float = GAMMA, brightness: float = 1.0) -> bytes:
+    """
+    Lager 256-tabellen som brukes på hver byte i framen
+
+    Verdier over 0 blir aldri 0 (så lenge lysstyrken er over 0) - ellers
+    ville svake farger som ikonbakgrunnen forsvinne helt.
+
+    Args:
+        gamma: Gammaverdi (1.0 = ingen korreksjon)
+        brightness: Lysstyrke 0.0-1.0
+
+    Returns:
+        256 bytes for bytes.translate()
+    """
+    brightness = max(0.0, min(1.0, brightness))
+    floor = 1 if brightness > 0 else 0
+    table = bytearray(256)
+    for i in range(1, 256):
+        value = 255 * (i / 255) ** gamma * brightness
+        table[i] = min(255, max(floor, int(round(value))))
+    return bytes(table)
+
+
+class ColorPipeline:
+    """Utgangstrinn for frames: gamma og lysstyrke som én oppslagstabell"""
+
+    def __init__(self, gamma: float = GAMMA, brightness: float = 1.0):
+        """
+        Args:
+            gamma: Gammaverdi
+            brightness: Lysstyrke 0.0-1.0
+        """
+        self.gamma = gamma
+        self.brightness = brightness
+        self.table = build_output_table(gamma, brightness)
+
+    def set_brightness(self, brightness: float) -> bool:
+        """
+        Bytter lysstyrke - koster bare én ny tabell
+
+        Returns:
+            True hvis lysstyrken endret seg
+        """
+        brightness = max(0.0, min(1.0, brightness))
+        if brightness == self.brightness:
+            return False
+        self.brightness = brightness
+        self.table = build_output_table(self.gamma, brightness)
+        return True
+
+    def apply(self, frame: bytes) -> bytes:
+        """Bruker tabellen på alle bytes i framen (ett pass i C)"""
+        return frame.translate(self.table)
+
+
+class ColorRamp:
+    """Kontinuerlig fargeskala forhåndsberegnet til en oppslagstabell"""
+
+    def __init__(self, stops: Sequence[Tuple[float, Color]], size: int = 256):
+        """
+        Args:
+            stops: (verdi, farge) i stigende rekkefølge - lineær overgang mellom dem
+            size: Antall oppføringer i tabellen
+        """
+        self.low = stops[0][0]
+        self.high = stops[-1][0]
+        self.scale = (size - 1) / (self.high - self.low)
+        self.lut: List[Color] = []
+        segment = 0
+        for i in range(size):
+            value = self.low + i / self.scale
+            while segment < len(stops) - 2 and value > stops[segment + 1][0]:
+                segment += 1
+            (v0, c0), (v1, c1) = stops[segment], stops[segment + 1]
+            t = 0.0 if v1 == v0 else min(1.0, max(0.0, (value - v0) / (v1 - v0)))
+            self.lut.append(tuple(int(round(a + (b - a) * t)) for a, b in zip(c0, c1)))
+
+    def __call__(self, value: float) -> Color:
+        index = int((value - self.low) * self.scale + 0.5)
+        return self.lut[min(len(self.lut) - 1, max(0, index))]
+
+
+# Samme fargeområder som før (blå < 0 < lyseblå < 10 < gul < 20 < rød),
+# men med glidende overganger
+TEMPERATURE_RAMP = ColorRamp([
+    (-15, (0, 40, 255)),     # Iskaldt
+    (-2, (0, 100, 255)),     # Blå for kaldt
+    (5, (0, 200, 255)),      # Lyseblå
+    (15, (255, 200, 0)),     # Gul
+    (25, (255, 50, 0)),      # Rød/oransje for varmt
+    (35, (255, 0, 0)),
+])
+
+# Strømpris i øre/kWh: grønn (billig) - gul (middels) - rød (dyrt)
+PRICE_RAMP = ColorRamp([
+    (0, (0, 255, 0)),
+    (35, (0, 255, 0)),
+    (75, (255, 200, 0)),
+    (115, (255, 0, 0)),
+    (300, (255, 0, 0)),
+])
+
+# Netatmo-målinger utenom temperatur: grønn (bra) - gul - rød (dårlig luft, mye støy),
+# og blåtoner for luftfuktighet, trykk og nedbør
+HUMIDITY_RAMP = ColorRamp([
+    (20, (255, 150, 0)),     # Tørt
+    (40, (0, 255, 100)),
+    (60, (0, 200, 255)),
+    (80, (0, 60, 255)),      # Fuktig
+])
+
+CO2_RAMP = ColorRamp([
+    (400, (0, 255, 0)),
+    (1000, (255, 200, 0)),
+    (2000, (255, 0, 0)),
+])
+
+NOISE_RAMP = ColorRamp([
+    (35, (0, 255, 0)),
+    (55, (255, 200, 0)),
+    (75, (255, 0, 0)),
+])
+
+PRESSURE_RAMP = ColorRamp([
+    (980, (100, 100, 255)),  # Lavtrykk
+    (1013, (0, 200, 255)),
+    (1040, (255, 200, 0)),   # Høytrykk
+])
+
+RAIN_RAMP = ColorRamp([
+    (0, (0, 200, 255)),
+    (2, (0, 100, 255)),
+    (10, (0, 0, 255)),
+])
+
+WIND_RAMP = ColorRamp([
+    (0, (0, 255, 100)),
+    (30, (255, 200, 0)),
+    (70, (255, 0, 0)),
+])
+
+# Klokkefarger per del av døgnet (midt i perioden): 4 sifferfarger + kolon
+_CLOCK_PALETTES = [
+    (3, [(20, 40, 150), (80, 20, 120), (20, 100, 150), (100, 40, 150)], (150, 40, 150)),     # Natt
+    (9, [(50, 150, 255), (100, 200, 200), (200, 220, 100), (255, 200, 50)], (255, 100, 150)),  # Morgen
+    (15, [(255, 200, 0), (255, 150, 0), (255, 100, 50), (255, 200, 100)], (0, 200, 255)),    # Ettermiddag
+    (21, [(255, 100, 0), (200, 50, 100), (150, 100, 200), (100, 150, 255)], (150, 255, 100)),  # Kveld
+]
+
+
+def _clock_ramp(slot: int) -> ColorRamp:
+    # Døgnet går rundt - kveld før natt og natt etter kveld
+    palettes = [(_CLOCK_PALETTES[-1][0] - 24,) + _CLOCK_PALETTES[-1][1:]] + _CLOCK_PALETTES + \
+               [(_CLOCK_PALETTES[0][0] + 24,) + _CLOCK_PALETTES[0][1:]]
+    stops = [(hour, digits[slot] if slot < 4 else colon) for hour, digits, colon in palettes]
+    return ColorRamp(stops, size=24 * 4 * 2 + 1)
+
+
+_CLOCK_RAMPS = [_clock_ramp(slot) for slot in range(5)]
+
+
+def temperature_color(temperature: float) -> Color:
+    """Farge for en temperatur i °C"""
+    return TEMPERATURE_RAMP(temperature)
+
+
+def price_color(price: float) -> Color:
+    """Farge for en strømpris i øre/kWh"""
+    return PRICE_RAMP(price)
+
+
+def clock_colors(hours: int, minutes: int = 0) -> Tuple[List[Color], Color]:
+    """
+    Farger for klokken - glir gjennom døgnet
+
+    Returns:
+        (farge for hvert av de 4 sifrene, kolonfarge)
+    """
+    hour = hours + minutes / 60
+    return [ramp(hour) for ramp in _CLOCK_RAMPS[:4]], _CLOCK_RAMPS[4](hour)
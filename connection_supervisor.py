@@ -0,0 +1,139 @@
+"""
+Overvåking av forbindelsen til én Twinkly-enhet
+Egen tråd kobler til på nytt med eksponentiell backoff, mens render-løkken
+fortsetter å lage frames. Siste frame sendes så snart linken er oppe igjen.
+"""
+import random
+import threading
+import time
+from typing import Optional
+
+
+# Tilstander for forbindelsen
+CONNECTED = 'connected'
+CONNECTING = 'connecting'
+DISCONNECTED = 'disconnected'
+
+
+class ConnectionSupervisor(threading.Thread):
+    """Eier reconnect for en TwinklySquare slik at render-løkken aldri blokkerer"""
+
+    def __init__(self, name: str, twinkly, base_delay: float = 0.5, max_delay: float = 30.0):
+        """
+        Args:
+            name: Navn på enheten (brukes i logg)
+            twinkly: Tilkoblet TwinklySquare
+            base_delay: Ventetid etter første mislykkede forsøk (sekunder)
+            max_delay: Øvre grense for ventetid mellom forsøk (sekunder)
+        """
+        super().__init__(name=f"supervisor-{name}", daemon=True)
+        self.device_name = name
+        self.twinkly = twinkly
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.state = CONNECTED if twinkly.control else DISCONNECTED
+        self.attempts = 0  # Forsøk i pågående reconnect
+        self.reconnects = 0  # Vellykkede reconnects totalt
+        self.state_since = time.time()
+        self.last_error: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        if self.state != CONNECTED:
+            twinkly.link_up = False
+            self._wake.set()
+
+    def log(self, message: str):
+        print(f"[{self.device_name}] {message}" if self.device_name != 'Twinkly' else message)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            self.state_since = time.time()
+
+    @property
+    def connected(self) -> bool:
+        return self.state == CONNECTED
+
+    def status(self) -> dict:
+        """Tilstand for visning i logg/webgrensesnitt"""
+        return {
+            'device': self.device_name,
+            'state': self.state,
+            'since': self.state_since,
+            'attempts': self.attempts,
+            'reconnects': self.reconnects,
+            'last_error': self.last_error,
+        }
+
+    def report_failure(self, reason: str = 'sending feilet') -> bool:
+        """
+        Melder at sending feilet - reconnect starter i bakgrunnen
+
+        Kalles fra render-løkken og returnerer med en gang. Frames som
+        vises mens linken er nede bufres i TwinklySquare.
+
+        Returns:
+            True hvis forbindelsen nettopp gikk ned (første melding)
+        """
+        with self._lock:
+            if self.state != CONNECTED:
+                return False
+            self.twinkly.link_up = False
+            self.last_error = reason
+            self._set_state(DISCONNECTED)
+        self.log(f"✗ Mistet forbindelsen til Twinkly ({reason}) - kobler til på nytt i bakgrunnen")
+        self._wake.set()
+        return True
+
+    def stop(self):
+        """Ber tråden avslutte"""
+        self._stop_event.set()
+        self._wake.set()
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        Ventetid før neste forsøk: eksponentiell backoff med tilfeldig jitter
+
+        Args:
+            attempt: Antall mislykkede forsøk så langt (1 = første)
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(self.base_delay / 2, max(ceiling, self.base_delay / 2))
+
+    def _reconnect(self):
+        twinkly = self.twinkly
+        self.attempts = 0
+        while not self._stop_event.is_set():
+            self.attempts += 1
+            self._set_state(CONNECTING)
+            try:
+                ok = twinkly.connect() and twinkly.set_mode_rt()
+            except Exception as e:
+                self.last_error = str(e)
+                ok = False
+
+            if ok:
+                with self._lock:
+                    twinkly.link_up = True
+                    self._set_state(CONNECTED)
+                self.reconnects += 1
+                twinkly.flush_last_frame()
+                self.log(f"✓ Koblet til Twinkly på nytt (forsøk {self.attempts})")
+                return
+
+            self._set_state(DISCONNECTED)
+            delay = self.backoff_delay(self.attempts)
+            self.log(f"  Reconnect forsøk {self.attempts} feilet, prøver igjen om {delay:.1f}s...")
+            self._stop_event.wait(delay)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stop_event.is_set():
+                break
+            if self.state != CONNECTED:
+                self._reconnect()
@@ -0,0 +1,334 @@
+"""
+Datalag med stale-while-revalidate og kretsbrytere
+Displayet får alltid siste gode verdi med en gang, mens nye data hentes i
+bakgrunnen. Feiler et API, stopper kretsbryteren nye kall i en pause, og
+verdier som er eldre enn maks alder merkes som gamle (vises dempet).
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import metrics
+from readings import Reading, by_name
+
+
+# Tilstander for kretsbryteren
+CLOSED = 'closed'        # Alt normalt - kall slippes gjennom
+OPEN = 'open'            # API-et feiler - ingen kall før pausen er over
+HALF_OPEN = 'half_open'  # Pausen er over - ett prøvekall avgjør
+
+# Hvor ofte hver kilde hentes på nytt i bakgrunnen (sekunder)
+NETATMO_REFRESH = 60      # Netatmo måler hvert 5.-10. minutt
+PRICE_REFRESH = 60        # Pristabellen er cachet per dag - dette koster ingen kall
+
+# Maks alder før verdier fra en kilde vises som gamle (sekunder).
+# MAX_STALENESS i .env overstyrer alle kildene.
+MAX_STALENESS = {
+    'netatmo': 30 * 60,
+    'yr': 3 * 60 * 60,
+    'strømpris': 30 * 60,
+}
+
+# En henting som ikke er ferdig etter så lenge regnes som feilet (sekunder).
+# Dekker et kall med timeout, fornyet token og ett nytt kall
+FETCH_DEADLINE = 30
+
+# Lokasjoner som har forsvunnet fra svarene vises som gamle så lenge, deretter fjernes de
+DROP_AFTER = 24 * 60 * 60
+
+
+def max_staleness(source: str) -> float:
+    """Maks alder for en kilde (MAX_STALENESS i miljøet gjelder alle)"""
+    override = os.getenv('MAX_STALENESS')
+    return float(override) if override else MAX_STALENESS[source]
+
+
+class CircuitBreaker:
+    """Slutter å kalle et API som feiler, og prøver igjen med økende pauser"""
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 30.0,
+                 max_cooldown: float = 600.0):
+        """
+        Args:
+            name: Navn på API-et (brukes i logg)
+            failure_threshold: Antall feil på rad før bryteren åpner
+            cooldown: Første pause (sekunder)
+            max_cooldown: Lengste pause - pausen dobles for hvert mislykket prøvekall
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+        self.state = CLOSED
+        self.failures = 0  # Feil på rad
+        self.cooldown = cooldown
+        self.opened_at = 0.0
+        self.trips = 0  # Antall ganger bryteren har åpnet
+        self._lock = threading.Lock()
+
+    @property
+    def retry_at(self) -> float:
+        """Når neste prøvekall tidligst slippes gjennom (Unix-tid)"""
+        return self.opened_at + self.cooldown if self.state == OPEN else 0.0
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """
+        Spør om et kall kan gjøres nå
+
+        Når pausen er over slippes nøyaktig ett prøvekall gjennom.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and now >= self.opened_at + self.cooldown:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            recovered = self.state != CLOSED
+            self.state = CLOSED
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+        if recovered:
+            print(f"✓ {self.name} svarer igjen")
+
+    def record_failure(self, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                # Prøvekallet feilet - lengre pause
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            elif self.state == CLOSED and self.failures < self.failure_threshold:
+                return
+            self.state = OPEN
+            self.opened_at = now
+            self.trips += 1
+            cooldown = self.cooldown
+        print(f"⚠ {self.name} feiler ({self.failures} på rad) - venter {cooldown:.0f}s før neste forsøk")
+
+    def status(self) -> dict:
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'trips': self.trips,
+            'retry_at': self.retry_at,
+        }
+
+
+class CachedSource:
+    """Siste gode verdi fra én kilde, hentet på nytt i bakgrunnen når den blir gammel"""
+
+    def __init__(self, name: str, fetch: Callable[[], object], refresh_interval: float,
+                 breaker: Optional[CircuitBreaker] = None, deadline: float = FETCH_DEADLINE):
+        """
+        Args:
+            name: Kildenavn (nøkkel i MAX_STALENESS)
+            fetch: Henter ny verdi - None eller unntak regnes som feil
+            refresh_interval: Sekunder før verdien hentes på nytt
+            breaker: Kretsbryter for API-et (lager en egen hvis None)
+            deadline: Sekunder før en henting som henger regnes som feilet
+        """
+        self.name = name
+        self.fetch = fetch
+        self.refresh_interval = refresh_interval
+        self.breaker = breaker or CircuitBreaker(name)
+        self.deadline = deadline
+        self.value = None
+        self.updated_at = 0.0  # Siste vellykkede henting
+        self.attempted = False
+        self._in_flight = False
+        self._started_at = 0.0
+        self._generation = 0  # Svar fra en henting som er gitt opp brukes ikke
+        self._lock = threading.Lock()
+
+    def age(self, now: Optional[float] = None) -> Optional[float]:
+        """Sekunder siden siste vellykkede henting (None hvis aldri hentet)"""
+        if self.value is None:
+            return None
+        return (time.time() if now is None else now) - self.updated_at
+
+    def _expire(self) -> bool:
+        """Gir opp en henting som har passert fristen (kalles med låsen)"""
+        if not self._in_flight or time.time() - self._started_at < self.deadline:
+            return False
+        print(f"✗ Henting fra {self.name} svarte ikke på {self.deadline:.0f}s - gir opp")
+        self._in_flight = False
+        self._generation += 1
+        return True
+
+    def _start(self) -> Optional[int]:
+        """Reserverer en henting - returnerer generasjonen, eller None hvis ingen skal startes"""
+        with self._lock:
+            expired = self._expire()
+        if expired:
+            self.breaker.record_failure()
+        with self._lock:
+            if self._in_flight or not self.breaker.allow():
+                return None
+            self._in_flight = True
+            self._started_at = time.time()
+            return self._generation
+
+    def _run(self, generation: int):
+        try:
+            value = self.fetch()
+        except Exception as e:
+            print(f"✗ Feil ved henting fra {self.name}: {e}")
+            value = None
+        with self._lock:
+            if generation != self._generation:
+                return  # Gitt opp og allerede regnet som feil
+            self._in_flight = False
+        if value is None:
+            self.breaker.record_failure()
+        else:
+            self.value = value
+            self.updated_at = time.time()
+            self.breaker.record_success()
+
+    def _spawn(self, generation: int) -> threading.Thread:
+        thread = threading.Thread(target=self._run, args=(generation,), name=f"revalidate-{self.name}",
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def revalidate(self) -> bool:
+        """
+        Henter på nytt i en bakgrunnstråd (planleggeren kaller denne hvert refresh_interval)
+
+        Returns:
+            True hvis en henting ble startet (ikke allerede i gang, og kretsbryteren tillater det)
+        """
+        generation = self._start()
+        if generation is None:
+            return False
+        self._spawn(generation)
+        return True
+
+    def get(self, now: Optional[float] = None):
+        """
+        Siste gode verdi - returnerer med en gang
+
+        Første gang ventes det på hentingen (maks deadline sekunder). Etterpå
+        hentes den på nytt i en bakgrunnstråd når den er eldre enn
+        refresh_interval, og den gamle verdien brukes imens.
+
+        Returns:
+            Verdien, eller None hvis den aldri er hentet
+        """
+        now = time.time() if now is None else now
+        if not self.attempted:
+            self.attempted = True
+            generation = self._start()
+            if generation is not None:
+                self._spawn(generation).join(self.deadline)
+        elif now - self.updated_at >= self.refresh_interval:
+            self.revalidate()
+        return self.value
+
+    def status(self, now: Optional[float] = None) -> dict:
+        status = self.breaker.status()
+        status['age'] = self.age(now)
+        return status
+
+
+class DataLayer:
+    """Samler målinger fra Netatmo, Yr og strømpris uten å vente på trege eller nede API-er"""
+
+    def __init__(self, netatmo, forecasts, electricity):
+        """
+        Args:
+            netatmo: NetatmoClient
+            forecasts: ForecastManager (henter selv i bakgrunnen, med egen kretsbryter)
+            electricity: ElectricityClient
+        """
+        self.forecasts = forecasts
+        self.electricity = electricity
+        self.netatmo = CachedSource('netatmo', netatmo.get_snapshot, NETATMO_REFRESH,
+                                    CircuitBreaker('Netatmo'))
+        self.prices = CachedSource('strømpris', electricity.get_price_table, PRICE_REFRESH,
+                                   CircuitBreaker('Strømpris'))
+        # Kildene datalaget henter selv (Yr har egen planleggertråd)
+        self.sources = [self.netatmo, self.prices]
+        self._register_metrics()
+        self._last: Dict[str, Reading] = {}  # Siste gode måling per navn
+
+    @property
+    def snapshot(self):
+        """Siste netatmo_snapshot.StationSnapshot (hentes på nytt i bakgrunnen ved behov)"""
+        return self.netatmo.get()
+
+    @property
+    def price_profile(self):
+        """Dagens price_profile.PriceProfile"""
+        return self.prices.get()
+
+    def readings(self, now: Optional[float] = None) -> List[Reading]:
+        """
+        Alle målinger, med gamle verdier merket (Reading.stale)
+
+        Lokasjoner som mangler i siste svar (API nede, modul uten dekning)
+        beholdes med siste verdi slik at rotasjonen ikke mister dem.
+
+        Returns:
+            Liste med Reading i fast rekkefølge: Netatmo, Yr, strømpris
+        """
+        now = time.time() if now is None else now
+        current: List[Reading] = []
+
+        snapshot = self.snapshot
+        if snapshot is not None:
+            netatmo_stale = self.netatmo.age(now) > max_staleness('netatmo')
+            for reading in snapshot.readings():
+                reading.stale = netatmo_stale
+                current.append(reading)
+
+        current.extend(self.forecasts.current_readings(now, max_staleness('yr')))
+
+        profile = self.price_profile
+        price = self.electricity.reading_from(profile, now) if profile is not None else None
+        if price is not None:
+            price.stale = self.prices.age(now) > max_staleness('strømpris')
+            current.append(price)
+
+        fresh = by_name(current)
+        for name, last in self._last.items():
+            if name not in fresh and last.age(now) < DROP_AFTER:
+                current.append(Reading(last.source, last.id, last.name, last.metric, last.value,
+                                       last.timestamp, stale=True))
+        self._last = {name: reading for name, reading in {**self._last, **fresh}.items()
+                      if reading.age(now) < DROP_AFTER}
+        return current
+
+    def _yr_age(self) -> Optional[float]:
+        """Sekunder siden siste vellykkede Yr-kall for noe sted"""
+        last = max((client.last_success for client in self.forecasts.clients.values()), default=0.0)
+        return time.time() - last if last else None
+
+    def _register_metrics(self):
+        ages = {source.name: source.age for source in self.sources}
+        ages['yr'] = self._yr_age
+        breakers = {'netatmo': self.netatmo.breaker, 'yr': self.forecasts.breaker,
+                    'strømpris': self.prices.breaker}
+        for name, age in ages.items():
+            metrics.gauge('twinkly_source_age_seconds', 'Sekunder siden siste vellykkede henting',
+                          fn=age, source=name)
+        for name, breaker in breakers.items():
+            metrics.gauge('twinkly_circuit_open', '1 når kretsbryteren holder kall tilbake',
+                          fn=lambda breaker=breaker: int(breaker.state != CLOSED), source=name)
+            metrics.counter('twinkly_circuit_trips_total', 'Ganger kretsbryteren har åpnet',
+                            fn=lambda breaker=breaker: breaker.trips, source=name)
+
+    def status(self, now: Optional[float] = None) -> Dict[str, dict]:
+        """Alder og kretsbryter per kilde (for logg og web)"""
+        return {
+            'netatmo': self.netatmo.status(now),
+            'yr': self.forecasts.breaker.status(),
+            'strømpris': self.prices.status(now),
+        }
@@ -5,6 +5,7 @@ Debug script for å se LED koordinater
 import os
 from dotenv import load_dotenv
 from xled.control import HighControlInterface
+from led_layout import LedLayout, DEFAULT_WIDTH, DEFAULT_HEIGHT, PANEL_SIZE
 
 
 def check_coordinates():
@@ -29,17 +30,29 @@ def check_coordinates():
     print(f"\nX-verdier: min={min(x_values):.4f}, max={max(x_values):.4f}")
     print(f"Y-verdier: min={min(y_values):.4f}, max={max(y_values):.4f}")
     
-    # Tell hvor mange LEDs er i forskjellige områder
+    # Rutenett utledet fra koordinatene - samme som TwinklySquare bruker
+    led_layout = LedLayout.from_coordinates(coords)
+    print(f"\nUtledet rutenett: {led_layout.describe()}")
+    print(f"  Ubrukte piksler: {led_layout.unused_pixels}")
+    if led_layout.collisions:
+        print(f"  ✗ {len(led_layout.collisions)} piksler har mer enn én LED:")
+        for (x, y), leds in sorted(led_layout.collisions.items())[:10]:
+            print(f"    ({x}, {y}): LEDs {leds}")
+    else:
+        print("  ✓ Ingen kolliderende LEDs")
+    
+    legacy = LedLayout.truncation_collisions(coords, DEFAULT_WIDTH, DEFAULT_HEIGHT)
+    print(f"  Gammel int()-mapping til {DEFAULT_WIDTH}x{DEFAULT_HEIGHT}: {legacy} LEDs i kollisjon")
+    
+    # Tell hvor mange LEDs er i hvert panel
     print("\nFordeling av LEDs:")
-    x_bins = [0, 0.333, 0.667, 1.0]
-    y_bins = [0, 0.5, 1.0]
-    
-    for yi in range(len(y_bins)-1):
-        for xi in range(len(x_bins)-1):
-            count = sum(1 for c in coords 
-                       if x_bins[xi] <= c['x'] < x_bins[xi+1] 
-                       and y_bins[yi] <= c['y'] < y_bins[yi+1])
-            print(f"  x=[{x_bins[xi]:.2f}-{x_bins[xi+1]:.2f}], y=[{y_bins[yi]:.2f}-{y_bins[yi+1]:.2f}]: {count} LEDs")
+    per_panel = {}
+    for pixel in led_layout.index_map:
+        x, y = pixel % led_layout.width, pixel // led_layout.width
+        panel = (x // PANEL_SIZE, y // PANEL_SIZE)
+        per_panel[panel] = per_panel.get(panel, 0) + 1
+    for (panel_x, panel_y), count in sorted(per_panel.items(), key=lambda item: item[0][::-1]):
+        print(f"  Panel kolonne {panel_x}, rad {panel_y}: {count} LEDs")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,188 @@
+"""
+Cache over kjente Twinkly-enheter
+Husker MAC -> siste IP, firmware og layout-hash slik at tilkobling uten
+TWINKLY_IP bare trenger ett raskt gestalt-kall i stedet for et fullt søk
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from xled.discover import xdiscover
+from xled.exceptions import DiscoverTimeout
+
+
+DEVICE_CACHE_FILE = Path(__file__).parent / 'device_cache.json'
+
+VERIFY_TIMEOUT = 1.0  # Sekunder for gestalt-sjekk av en cachet IP
+DISCOVERY_TIMEOUT = 5.0  # Sekunder et fullt søk lytter etter svar
+
+_file_lock = threading.Lock()
+_discovery_lock = threading.Lock()
+_discovery_thread: Optional[threading.Thread] = None
+
+# MAC -> TwinklySquare som er koblet til enheten (flere enheter i samme prosess)
+_claim_lock = threading.Lock()
+_claimed: Dict[str, object] = {}
+
+
+def normalize_mac(mac: Optional[str]) -> Optional[str]:
+    """MAC-adresser sammenlignes med små bokstaver"""
+    return mac.lower() if mac else None
+
+
+def claim_device(mac: str, owner) -> bool:
+    """
+    Registrerer at owner bruker enheten
+
+    Args:
+        mac: MAC-adresse
+        owner: TwinklySquare som kobler til
+
+    Returns:
+        False hvis en annen allerede har enheten
+    """
+    with _claim_lock:
+        return _claimed.setdefault(normalize_mac(mac), owner) is owner
+
+
+def release_device(mac: Optional[str], owner):
+    """Frigjør enheten hvis owner har den"""
+    with _claim_lock:
+        if _claimed.get(normalize_mac(mac)) is owner:
+            del _claimed[normalize_mac(mac)]
+
+
+def verify_device(ip_address: str, timeout: float = VERIFY_TIMEOUT) -> Optional[dict]:
+    """
+    Sjekker at en Twinkly svarer på adressen
+
+    Bruker gestalt, som ikke krever innlogging.
+
+    Args:
+        ip_address: IP (eller "ip:port" for simulatoren)
+        timeout: Maks ventetid i sekunder
+
+    Returns:
+        Gestalt-svaret hvis enheten svarte, ellers None
+    """
+    try:
+        response = requests.get(f"http://{ip_address}/xled/v1/gestalt", timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    except (requests.RequestException, ValueError):
+        return None
+
+
+class DeviceCache:
+    """Persistert oversikt over Twinkly-enheter, nøklet på MAC-adresse"""
+
+    def __init__(self, path: Path = DEVICE_CACHE_FILE):
+        """
+        Args:
+            path: JSON-fil cachen lagres i
+        """
+        self.path = Path(path)
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, devices: Dict[str, dict]):
+        # Skriv til midlertidig fil først slik at en halvskrevet cache aldri leses
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(devices, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, mac: str) -> Optional[dict]:
+        """Henter cachet info for en enhet"""
+        return self._load().get(normalize_mac(mac))
+
+    def candidates(self, mac: Optional[str] = None, owner=None) -> List[Tuple[str, dict]]:
+        """
+        Enheter å prøve ved tilkobling
+
+        Args:
+            mac: Kun denne enheten hvis satt (ellers alle, sist sett først)
+            owner: TwinklySquare som spør - uten mac hoppes enheter en annen
+                   allerede har koblet til over
+
+        Returns:
+            Liste med (mac, info)
+        """
+        devices = self._load()
+        if mac:
+            mac = normalize_mac(mac)
+            return [(mac, devices[mac])] if mac in devices else []
+        with _claim_lock:
+            taken = {key for key, claimer in _claimed.items() if claimer is not owner}
+        return sorted(((key, info) for key, info in devices.items() if key not in taken),
+                      key=lambda item: item[1].get('last_seen', 0), reverse=True)
+
+    def remember(self, mac: str, ip_address: str, **info):
+        """
+        Lagrer eller oppdaterer en enhet
+
+        Args:
+            mac: MAC-adresse
+            ip_address: Siste kjente IP
+            **info: Ekstra felter (firmware, layout_hash, device_name, ...)
+        """
+        mac = normalize_mac(mac)
+        if not mac or not ip_address:
+            return
+        with _file_lock:
+            # Les på nytt - flere enheter/prosesser kan dele filen
+            devices = self._load()
+            entry = devices.setdefault(mac, {})
+            entry.update({key: value for key, value in info.items() if value is not None})
+            entry['ip'] = ip_address
+            entry['last_seen'] = int(time.time())
+            try:
+                self._save(devices)
+            except OSError as e:
+                print(f"⚠ Kunne ikke lagre enhetscache: {e}")
+
+
+def _run_discovery(cache: DeviceCache):
+    found = 0
+    try:
+        for device in xdiscover(timeout=DISCOVERY_TIMEOUT):
+            cache.remember(device.hw_address, device.ip_address)
+            found += 1
+    except DiscoverTimeout:
+        # xdiscover avslutter alltid med timeout når ingen flere svarer
+        pass
+    except Exception as e:
+        print(f"⚠ Feil under søk etter Twinkly enheter: {e}")
+    if found:
+        print(f"✓ Søk fant {found} Twinkly enhet(er)")
+    else:
+        print("✗ Ingen Twinkly enheter funnet")
+
+
+def discover_in_background(cache: DeviceCache) -> threading.Thread:
+    """
+    Starter fullt søk etter Twinkly-enheter i bakgrunnen
+
+    Funne enheter lagres i cachen. Kjører bare ett søk om gangen -
+    et pågående søk gjenbrukes.
+
+    Returns:
+        Søketråden (kan join'es for å vente på resultatet)
+    """
+    global _discovery_thread
+    with _discovery_lock:
+        if _discovery_thread is None or not _discovery_thread.is_alive():
+            print("Søker etter Twinkly enheter i bakgrunnen...")
+            _discovery_thread = threading.Thread(target=_run_discovery, args=(cache,),
+                                                 name='twinkly-discovery', daemon=True)
+            _discovery_thread.start()
+        return _discovery_thread
@@ -0,0 +1,446 @@
+"""
+Display-arbeidere for én eller flere Twinkly-enheter
+Hver enhet har sin egen tråd som renderer og sender, mens data hentes én gang
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import metrics
+from connection_supervisor import ConnectionSupervisor
+from readings import Reading
+from render_ahead import RenderAhead
+from scheduler import Scheduler, next_minute
+
+
+DEVICES_FILE = Path(__file__).parent / 'devices.json'
+STATE_FILE = Path(__file__).parent / 'display_state.json'
+
+# Nøkler i devices.json som overstyrer display_state.json for én enhet
+SCENE_KEYS = ('mode', 'location', 'interval', 'show_clock', 'clock_location', 'trend_hours',
+              'forecast_hours', 'brightness', 'night_brightness')
+
+# Lysstyrke 0.0-1.0 når scenen ikke setter noe. Nattdemping: i timene
+# NIGHT_HOURS (fra-til) brukes night_brightness i stedet for brightness
+DEFAULT_BRIGHTNESS = float(os.getenv('TWINKLY_BRIGHTNESS', 1.0))
+NIGHT_BRIGHTNESS = float(os.getenv('NIGHT_BRIGHTNESS', DEFAULT_BRIGHTNESS))
+NIGHT_HOURS = os.getenv('NIGHT_HOURS', '23-6')
+
+
+def get_state() -> dict:
+    """Hent nåværende state fra fil"""
+    if STATE_FILE.exists():
+        try:
+            with open(STATE_FILE, 'r') as f:
+                return json.load(f)
+        except:
+            pass
+    return {
+        'mode': 'rotate',
+        'location': None,
+        'interval': int(os.getenv('UPDATE_SECONDS', 60)),
+        'show_clock': False
+    }
+
+
+def scene_brightness(scene: dict, now: datetime) -> float:
+    """
+    Lysstyrken scenen skal ha akkurat nå
+
+    Args:
+        scene: Scene med 'brightness' og eventuelt 'night_brightness'
+        now: Tidspunktet som gjelder
+
+    Returns:
+        Lysstyrke 0.0-1.0
+    """
+    brightness = scene.get('brightness', DEFAULT_BRIGHTNESS)
+    night_brightness = scene.get('night_brightness', NIGHT_BRIGHTNESS)
+    if night_brightness == brightness:
+        return brightness
+    try:
+        start, end = (int(hour) for hour in NIGHT_HOURS.split('-'))
+    except ValueError:
+        return brightness
+    # Natten kan gå over midnatt (f.eks. 23-6)
+    is_night = start <= now.hour < end if start <= end else now.hour >= start or now.hour < end
+    return night_brightness if is_night else brightness
+
+
+def load_device_configs() -> List[dict]:
+    """
+    Henter listen over Twinkly-enheter som skal styres
+
+    Leser devices.json hvis den finnes, ellers TWINKLY_IPS (kommaseparert)
+    eller TWINKLY_IP. Uten noen av delene brukes én enhet med auto-discovery.
+
+    Returns:
+        Liste med enhetskonfigurasjoner ({'name', 'ip', ...scene-nøkler})
+    """
+    if DEVICES_FILE.exists():
+        try:
+            with open(DEVICES_FILE, 'r', encoding='utf-8') as f:
+                devices = json.load(f)
+            if devices:
+                for i, device in enumerate(devices, 1):
+                    device.setdefault('name', f"Twinkly {i}")
+                    device.setdefault('ip', None)
+                return devices
+        except (OSError, ValueError) as e:
+            print(f"⚠ Kunne ikke lese {DEVICES_FILE.name}: {e}")
+
+    ips = [ip.strip() for ip in os.getenv('TWINKLY_IPS', '').split(',') if ip.strip()]
+    if ips:
+        return [{'name': f"Twinkly {i}", 'ip': ip} for i, ip in enumerate(ips, 1)]
+
+    return [{'name': 'Twinkly', 'ip': os.getenv('TWINKLY_IP')}]
+
+
+def describe_cheapest(profile) -> str:
+    """Billigste periode som tekst for logg, f.eks. " - billigst 02:00-05:00 (41.2 øre)"""
+    if not profile or not profile.cheapest:
+        return ''
+    first, length, average = profile.cheapest
+    start = datetime.fromtimestamp(profile.starts[first])
+    end = datetime.fromtimestamp(profile.ends[first + length - 1])
+    return f" - billigst {start:%H:%M}-{end:%H:%M} ({average:.1f} øre)"
+
+
+class DisplayData:
+    """Øyeblikksbilde av alle hentede data, delt mellom alle enheter"""
+
+    def __init__(self, readings: Dict[str, Reading], yr_weather: Optional[dict] = None,
+                 electricity_price: Optional[float] = None, history=None, price_profile=None,
+                 forecast=None, netatmo=None):
+        """
+        Args:
+            readings: Visningsnavn -> Reading (Netatmo, Yr og strømpris)
+            yr_weather: Værdata fra Yr (symbol osv.)
+            electricity_price: Nåværende strømpris i øre/kWh
+            history: Delt history.History for trendvisning (valgfri)
+            price_profile: Dagens price_profile.PriceProfile (valgfri)
+            forecast: yr_client.Forecast for tidslinjen (valgfri)
+            netatmo: netatmo_snapshot.StationSnapshot med alle Netatmo-målinger (valgfri)
+        """
+        self.readings = readings
+        # Bare tall per navn - for logg, web og eldre kode
+        self.temperatures: Dict[str, float] = {name: reading.value for name, reading in readings.items()}
+        self.yr_weather = yr_weather
+        self.electricity_price = electricity_price
+        self.history = history
+        self.price_profile = price_profile
+        self.forecast = forecast
+        self.netatmo = netatmo
+        self.fetched_at = time.time()
+
+
+class DisplayWorker(threading.Thread):
+    """Render- og sendetråd for én Twinkly-enhet"""
+
+    def __init__(self, name: str, twinkly, scene: Optional[dict] = None):
+        """
+        Args:
+            name: Navn på enheten (brukes i logg)
+            twinkly: Tilkoblet TwinklySquare
+            scene: Overstyringer av display_state.json for denne enheten
+        """
+        super().__init__(name=f"display-{name}", daemon=True)
+        self.device_name = name
+        self.twinkly = twinkly
+        self.scene = {key: value for key, value in (scene or {}).items() if key in SCENE_KEYS}
+        self._data: Optional[DisplayData] = None
+        self._stop_event = threading.Event()
+        # Reconnect skjer i egen tråd - render-løkken fortsetter imens
+        self.supervisor = ConnectionSupervisor(name, twinkly)
+        # Rendering og keep-alive er egne tidtakere - tråden sover til neste frist
+        self.scheduler = Scheduler(f"display-{name}")
+        self._render_timer = None
+        self.location_index = 0
+        self.last_scene = None
+        self.first_run = True
+        # Neste målinger i rotasjonen rendres mens den forrige vises
+        self.render_ahead = RenderAhead(twinkly)
+        self._rotating = False
+        self._shown = None  # (navn, verdi, gammel) for målingen klokke-/enkeltvisningen viser
+        self._render_seconds = metrics.histogram('twinkly_render_seconds',
+                                                 'Tid per render (med animasjoner og sending)', device=name)
+        self._switch_seconds = metrics.histogram('twinkly_rotate_switch_seconds',
+                                                 'Tid fra frist til målingen er sendt i rotasjonen', device=name)
+        render_ahead_help = 'Bytter i rotasjonen med ferdig frame (hit) eller uten (miss)'
+        metrics.counter('twinkly_render_ahead_total', render_ahead_help,
+                        fn=lambda: self.render_ahead.hits, device=name, result='hit')
+        metrics.counter('twinkly_render_ahead_total', render_ahead_help,
+                        fn=lambda: self.render_ahead.misses, device=name, result='miss')
+
+    def log(self, message: str):
+        """Skriver logglinje med enhetsnavn når flere enheter kjører"""
+        print(f"[{self.device_name}] {message}" if self.device_name != 'Twinkly' else message)
+
+    def current_scene(self) -> dict:
+        """Global state med denne enhetens overstyringer"""
+        state = get_state()
+        state.update(self.scene)
+        return state
+
+    def publish(self, data: DisplayData):
+        """Gir arbeideren nye data (kalles fra hovedtråden)"""
+        first = self._data is None
+        self._data = data
+        if first:
+            # Første datasett vises med en gang
+            self.render_now()
+        elif self._shown is not None and self._changed(data):
+            # Klokke og enkeltvisning tegnes på nytt med en gang verdien endres
+            self.render_now()
+        elif self._rotating:
+            # Nye verdier rendres i render-tråden før de skal vises
+            self.scheduler.call_later(0, self._prepare_next, name='render-ahead')
+
+    def _changed(self, data: DisplayData) -> bool:
+        """True hvis målingen som vises nå har fått ny verdi"""
+        name, value, stale = self._shown
+        reading = data.readings.get(name)
+        return reading is not None and (reading.value, reading.stale) != (value, stale)
+
+    def render_now(self):
+        """Tegner på nytt med en gang, f.eks. når scenen er endret (kalles fra hovedtråden)"""
+        if self._render_timer is not None:
+            self.scheduler.reschedule(self._render_timer)
+
+    def stop(self):
+        """Ber tråden avslutte"""
+        self._stop_event.set()
+        self.scheduler.stop()
+        self.supervisor.stop()
+
+    def _show_failed(self):
+        # Framen er bufret i TwinklySquare og sendes når linken er tilbake
+        self.supervisor.report_failure("kunne ikke oppdatere Twinkly display")
+
+    def _keep_alive(self) -> float:
+        """Holder realtime-modus i live mellom framene"""
+        if not self.twinkly.keep_alive():
+            self._show_failed()
+        return max(self.twinkly.keep_alive_due_in(), 0.5)
+
+    def _prepare_next(self):
+        """Rendrer de neste målingene i rotasjonen mens den nåværende vises"""
+        data = self._data
+        if not self._rotating or data is None or not data.readings:
+            return
+        locations = list(data.readings)
+        upcoming = [locations[(self.location_index + i) % len(locations)]
+                    for i in range(min(self.render_ahead.depth, len(locations)))]
+        self.render_ahead.prepare([data.readings[name] for name in upcoming])
+
+    def _show_animations(self, data: DisplayData):
+        """Vis væranimasjoner og strømpris-varsling"""
+        twinkly = self.twinkly
+        electricity_price = data.electricity_price
+        yr_weather = data.yr_weather
+
+        # Vis strømpris-varsling hvis pris er høy (over 100 øre)
+        if electricity_price and electricity_price > 100:
+            self.log(f"⚡ Strømpris-varsling: {electricity_price} øre/kWh")
+            twinkly.show_electricity_warning(electricity_price, threshold=100, duration=2)
+
+        # Vis væranimasjon basert på værsymbol
+        if yr_weather and yr_weather.get('symbol'):
+            symbol = yr_weather['symbol']
+            if 'thunder' in symbol:
+                self.log("⛈️ Viser torden-animasjon")
+                twinkly.show_thunder_animation(duration=3)
+            elif 'rain' in symbol or 'drizzle' in symbol:
+                self.log("🌧️ Viser regn-animasjon")
+                twinkly.show_rain_animation(duration=2)
+            elif 'snow' in symbol or 'sleet' in symbol:
+                self.log("❄️ Viser snø-animasjon")
+                twinkly.show_snow_animation(duration=2)
+            elif 'fog' in symbol:
+                self.log("🌫️ Viser tåke-animasjon")
+                twinkly.show_fog_animation(duration=2)
+            elif 'clearsky' in symbol or 'fair' in symbol:
+                self.log("☀️ Viser sol-animasjon")
+                twinkly.show_sun_animation(duration=2)
+
+    def run(self):
+        self.supervisor.start()
+        try:
+            self._render_timer = self.scheduler.call_at(time.time(), self._timed_render, name='render')
+            self.scheduler.call_later(self.twinkly.keep_alive_due_in(), self._keep_alive, name='keep-alive')
+            self.scheduler.run()
+        except Exception as e:
+            self.log(f"✗ Uventet feil: {e}")
+        finally:
+            self.twinkly.clear()
+
+    def _timed_render(self) -> Optional[float]:
+        start = time.perf_counter()
+        try:
+            return self._render()
+        finally:
+            self._render_seconds.observe(time.perf_counter() - start)
+
+    def _render(self) -> Optional[float]:
+        """
+        Tegner én frame
+
+        Returns:
+            Sekunder til neste frame (klokken tegnes igjen ved neste minuttskifte)
+        """
+        twinkly = self.twinkly
+        self._rotating = False
+        self._shown = None
+        # Les state på nytt for å få oppdateringer
+        scene = self.current_scene()
+        update_interval = scene.get('interval', 10)
+        display_mode = scene.get('mode', 'single')
+        single_location = scene.get('location')
+        show_clock = scene.get('show_clock', False)
+        # Nattdemping og lysstyrke er bare et bytte av fargetabell
+        twinkly.set_brightness(scene_brightness(scene, datetime.now()))
+
+        # Sjekk om mode eller location har endret seg
+        scene_key = (display_mode, single_location, show_clock)
+        mode_changed = self.last_scene is not None and scene_key != self.last_scene
+        self.last_scene = scene_key
+
+        # Hvis klokke er aktivert, vis klokke
+        if show_clock:
+            now = datetime.now()
+            # Med clock_location vises verdien for lokasjonen under klokken
+            clock_location = scene.get('clock_location')
+            data = self._data
+            reading = data.readings.get(clock_location) if clock_location and data is not None else None
+            if reading is not None:
+                self._shown = (reading.name, reading.value, reading.stale)
+                shown = twinkly.show_clock_with_temperature(
+                    now.hour, now.minute, reading.value, reading.name, reading.metric, reading.stale)
+            else:
+                shown = twinkly.show_clock(now.hour, now.minute)
+            if shown:
+                if self.first_run or mode_changed:
+                    self.log(f"✓ Viser klokke: {now.hour:02d}:{now.minute:02d}")
+                    self.first_run = False
+            else:
+                self._show_failed()
+
+            # Tegnes igjen nøyaktig når minuttet skifter (ny verdi under klokken tegnes via publish)
+            return next_minute() - time.time()
+
+        data = self._data
+        if data is None:
+            # publish() tegner med en gang første datasett kommer
+            return update_interval
+
+        readings = data.readings
+
+        if display_mode == 'forecast' and data.forecast is not None:
+            # Tidslinjen tegnes bare på nytt når prognosen eller timen endres
+            hours = scene.get('forecast_hours', 24)
+            if twinkly.show_forecast_timeline(data.forecast, hours):
+                if self.first_run or mode_changed:
+                    self.log(f"✓ Viser værprognose for de neste {hours} timene")
+                    self.first_run = False
+            else:
+                self._show_failed()
+            return update_interval
+
+        if display_mode == 'prices' and data.price_profile is not None:
+            # Dagsprofilen er ferdig tegnet - bare uthevingen flytter seg
+            if twinkly.show_price_profile(data.price_profile):
+                if self.first_run or mode_changed:
+                    self.log(f"✓ Viser strømpriser for i dag{describe_cheapest(data.price_profile)}")
+                    self.first_run = False
+            else:
+                self._show_failed()
+            return update_interval
+
+        # Vis væranimasjoner og strømpris-varsling hver 5. iterasjon
+        if self.location_index % 5 == 0:
+            self._show_animations(data)
+
+        if not readings:
+            self.log("✗ Kunne ikke hente temperaturdata")
+            return update_interval
+
+        # Oppdater locations liste
+        locations = list(readings.keys())
+        self.location_index %= len(locations)
+
+        if display_mode == 'trend' and data.history is not None:
+            # Sparkline for valgt lokasjon, eller roter mellom alle
+            rotating = single_location not in readings
+            reading = readings[locations[self.location_index] if rotating else single_location]
+            series = data.history.series(reading.name)
+            if twinkly.show_trend(reading.name, series, reading.value, scene.get('trend_hours', 6),
+                                  reading.metric):
+                self.log(f"✓ Viser trend {reading.name}: {reading.describe()}")
+            else:
+                self._show_failed()
+
+            if mode_changed or self.first_run:
+                if mode_changed:
+                    self.log("  [Byttet til trend mode]")
+                self.first_run = False
+                return 1.0  # Kort pause
+
+            if rotating:
+                self.location_index = (self.location_index + 1) % len(locations)
+
+        elif display_mode == 'single' and single_location:
+            # Vis kun én lokasjon - sjekk om lokasjon finnes
+            reading = readings.get(single_location)
+            if reading is not None:
+                self._shown = (reading.name, reading.value, reading.stale)
+                if twinkly.show_reading(reading):
+                    self.log(f"✓ Viser {reading.name}: {reading.describe()}")
+                else:
+                    self._show_failed()
+            else:
+                self.log(f"✗ Lokasjon {single_location} ikke funnet")
+
+            # Hvis mode/location endret eller første kjøring, ikke vent - vis umiddelbart
+            if mode_changed or self.first_run:
+                if mode_changed:
+                    self.log(f"  [Byttet til single mode: {single_location}]")
+                self.first_run = False
+                return 1.0  # Kort pause for å unngå spam
+
+        else:
+            # Roter mellom lokasjoner (default eller når mode == 'rotate')
+            reading = readings[locations[self.location_index]]
+            self._rotating = True
+
+            # Vis målingen med ikon på Twinkly Square - framen er som regel rendret på forhånd
+            start = time.perf_counter()
+            frame = self.render_ahead.take(reading)
+            shown = frame is not None and twinkly.send_frame(frame)
+            self._switch_seconds.observe(time.perf_counter() - start)
+            if shown:
+                self.log(f"✓ Viser {reading.name}: {reading.describe()}")
+            else:
+                self._show_failed()
+
+            # Hvis mode endret til rotate eller første kjøring, ikke vent - start rotasjon umiddelbart
+            if mode_changed or self.first_run:
+                if mode_changed:
+                    self.log("  [Byttet til rotate mode]")
+                self.first_run = False
+                return 1.0  # Kort pause
+
+            # Gå til neste lokasjon, og render den mens denne vises
+            self.location_index = (self.location_index + 1) % len(locations)
+            self.scheduler.call_later(0, self._prepare_next, name='render-ahead')
+
+            # Neste bytte regnes fra fristen for dette, ikke fra når sendingen ble ferdig
+            boundary = self._render_timer.deadline + update_interval
+            remaining = boundary - time.time()
+            return remaining if remaining > 0 else update_interval
+
+        # Vent før neste oppdatering
+        return update_interval
@@ -0,0 +1,254 @@
+"""
+Væranimasjoner som deterministiske frame-generatorer
+Samme effekt og størrelse gir alltid samme frames - de kan derfor både
+strømmes direkte og kompileres til film som lagres på Twinkly (movies.py)
+"""
+import math
+import random
+from typing import Callable, Dict, Iterator
+
+
+class Effect:
+    """En animasjon med fast bildefrekvens og lengde når den lagres som film"""
+
+    def __init__(self, name: str, generator: Callable[..., Iterator[list]], fps: float,
+                 loop_frames: int):
+        """
+        Args:
+            name: Navn på effekten
+            generator: Funksjon (width, height, seed) som gir canvas for canvas i det uendelige
+            fps: Bilder per sekund
+            loop_frames: Antall frames i filmen som loopes på enheten
+        """
+        self.name = name
+        self.generator = generator
+        self.fps = fps
+        self.loop_frames = loop_frames
+
+    def frames(self, width: int, height: int, seed: int = 0) -> Iterator[list]:
+        """Uendelig sekvens av 2D canvas (height x width) med RGB tupler"""
+        return self.generator(width, height, seed)
+
+
+def sun_frames(width: int, height: int, seed: int = 0) -> Iterator[list]:
+    """Sol-animasjon med pulserende sol"""
+    frame = 0
+    while True:
+        canvas = [[(0, 0, 20) for _ in range(width)] for _ in range(height)]  # Blå himmel
+
+        # Sol i midten
+        center_x, center_y = width // 2, height // 2
+        pulse = 0.8 + 0.2 * math.sin(frame * 0.5)  # Pulsering
+
+        # Sol-sirkel
+        for y in range(height):
+            for x in range(width):
+                dist = ((x - center_x) ** 2 + (y - center_y) ** 2) ** 0.5
+                if dist < 3 * pulse:
+                    # Gul sol
+                    canvas[y][x] = (255, 255, 0)
+                elif dist < 3.5 * pulse:
+                    # Orange kant
+                    canvas[y][x] = (255, 150, 0)
+
+        # Stråler
+        if frame % 5 < 3:
+            for angle in range(0, 360, 45):
+                rad = math.radians(angle)
+                for r in range(4, 8):
+                    x = int(center_x + r * math.cos(rad))
+                    y = int(center_y + r * math.sin(rad))
+                    if 0 <= x < width and 0 <= y < height:
+                        canvas[y][x] = (255, 255, 100)
+
+        yield canvas
+        frame += 1
+
+
+def rain_frames(width: int, height: int, seed: int = 0) -> Iterator[list]:
+    """Regn-animasjon med fallende dråper"""
+    rng = random.Random(seed)
+
+    # Initialiser dråper
+    drops = []
+    for _ in range(15):
+        drops.append({
+            'x': rng.randint(0, width - 1),
+            'y': rng.randint(-10, height - 1),
+            'speed': rng.uniform(0.5, 1.5)
+        })
+
+    while True:
+        canvas = [[(20, 20, 40) for _ in range(width)] for _ in range(height)]  # Mørk himmel
+
+        # Oppdater og tegn dråper
+        for drop in drops:
+            drop['y'] += drop['speed']
+
+            # Reset dråpe som faller ut
+            if drop['y'] >= height:
+                drop['y'] = -2
+                drop['x'] = rng.randint(0, width - 1)
+
+            # Tegn dråpe
+            y = int(drop['y'])
+            x = int(drop['x'])
+            if 0 <= y < height and 0 <= x < width:
+                canvas[y][x] = (100, 100, 255)  # Blå dråpe
+                # Liten hale
+                if y > 0:
+                    canvas[y - 1][x] = (50, 50, 150)
+
+        yield canvas
+
+
+def snow_frames(width: int, height: int, seed: int = 0) -> Iterator[list]:
+    """Snø-animasjon med fallende snøfnugg"""
+    rng = random.Random(seed)
+
+    # Initialiser snøfnugg
+    flakes = []
+    for _ in range(20):
+        flakes.append({
+            'x': rng.randint(0, width - 1),
+            'y': rng.randint(-15, height - 1),
+            'speed': rng.uniform(0.2, 0.6),
+            'drift': rng.uniform(-0.2, 0.2)
+        })
+
+    while True:
+        canvas = [[(10, 10, 30) for _ in range(width)] for _ in range(height)]  # Mørkeblå himmel
+
+        # Oppdater og tegn snøfnugg
+        for flake in flakes:
+            flake['y'] += flake['speed']
+            flake['x'] += flake['drift']
+
+            # Reset snøfnugg som faller ut
+            if flake['y'] >= height:
+                flake['y'] = -2
+                flake['x'] = rng.randint(0, width - 1)
+
+            # Wrap rundt kantene
+            if flake['x'] < 0:
+                flake['x'] = width - 1
+            elif flake['x'] >= width:
+                flake['x'] = 0
+
+            # Tegn snøfnugg
+            y = int(flake['y'])
+            x = int(flake['x'])
+            if 0 <= y < height and 0 <= x < width:
+                canvas[y][x] = (255, 255, 255)  # Hvit
+
+        yield canvas
+
+
+def thunder_frames(width: int, height: int, seed: int = 0) -> Iterator[list]:
+    """Torden-animasjon med lyn og regn"""
+    rng = random.Random(seed)
+
+    # Initialiser regndråper
+    drops = []
+    for _ in range(20):
+        drops.append({
+            'x': rng.randint(0, width - 1),
+            'y': rng.randint(-10, height - 1),
+            'speed': rng.uniform(1.0, 2.0)  # Raskere regn under tordenvær
+        })
+
+    while True:
+        # Mørk himmel
+        canvas = [[(10, 10, 20) for _ in range(width)] for _ in range(height)]
+
+        # Oppdater og tegn regndråper
+        for drop in drops:
+            drop['y'] += drop['speed']
+            if drop['y'] >= height:
+                drop['y'] = -2
+                drop['x'] = rng.randint(0, width - 1)
+
+            y = int(drop['y'])
+            x = int(drop['x'])
+            if 0 <= y < height and 0 <= x < width:
+                canvas[y][x] = (100, 100, 255)
+
+        # Lyn-effekt (tilfeldig)
+        if rng.random() < 0.15:  # 15% sjanse for lyn
+            # Hvit flash over hele skjermen
+            canvas = [[(255, 255, 255) for _ in range(width)] for _ in range(height)]
+        elif rng.random() < 0.1:  # 10% sjanse for lyn-bolt
+            # Tegn lyn-bolt
+            mid_x = rng.randint(width // 4, 3 * width // 4)
+            for y in range(0, height, 2):
+                x_offset = rng.choice([-1, 0, 1])
+                x = mid_x + x_offset
+                if 0 <= x < width:
+                    canvas[y][x] = (255, 255, 100)  # Gult lyn
+                    if y + 1 < height:
+                        canvas[y + 1][x] = (255, 255, 200)  # Hvitt lyn
+
+        yield canvas
+
+
+def fog_frames(width: int, height: int, seed: int = 0) -> Iterator[list]:
+    """Tåke-animasjon med bevegelige tåkebanker"""
+    frame = 0
+    while True:
+        canvas = [[(40, 40, 50) for _ in range(width)] for _ in range(height)]
+
+        # Bevegelige tåkebanker
+        for y in range(height):
+            for x in range(width):
+                # Bruk sinus-bølge for tåke-effekt
+                wave1 = math.sin((x + frame * 0.3) * 0.5) * 0.5 + 0.5
+                wave2 = math.sin((y + frame * 0.2) * 0.7) * 0.5 + 0.5
+                fog_intensity = (wave1 + wave2) / 2
+
+                # Grå tåke med varierende intensitet
+                gray = int(100 + fog_intensity * 100)
+                canvas[y][x] = (gray, gray, gray + 10)
+
+        yield canvas
+        frame += 1
+
+
+def electricity_warning_frames(width: int, height: int, seed: int = 0) -> Iterator[list]:
+    """Strømpris-varsling: blinkende rødt med lyn-symbol"""
+    # Rød bakgrunn med lyn-symbol
+    warning = [[(255, 0, 0) for _ in range(width)] for _ in range(height)]
+
+    # Tegn lyn-symbol i midten (forenklet)
+    mid_x = width // 2
+    lyn_pattern = [
+        (mid_x, 3),
+        (mid_x, 4),
+        (mid_x - 1, 5),
+        (mid_x - 1, 6),
+        (mid_x, 7),
+        (mid_x, 8),
+        (mid_x + 1, 9),
+        (mid_x + 1, 10),
+        (mid_x, 11),
+        (mid_x, 12)
+    ]
+    for x, y in lyn_pattern:
+        if 0 <= x < width and 0 <= y < height:
+            warning[y][x] = (255, 255, 0)  # Gul lyn
+
+    # Svart skjerm (av)
+    black = [[(0, 0, 0) for _ in range(width)] for _ in range(height)]
+
+    while True:
+        yield [row[:] for row in warning]
+        yield [row[:] for row in black]
+
+
+EFFECTS: Dict[str, Effect] = {
+    'sun': Effect('sun', sun_frames, fps=10, loop_frames=40),
+    'rain': Effect('rain', rain_frames, fps=10, loop_frames=50),
+    'snow': Effect('snow', snow_frames, fps=10, loop_frames=50),
+    'thunder': Effect('thunder', thunder_frames, fps=10, loop_frames=50),
+    'fog': Effect('fog', fog_frames, fps=10, loop_frames=50),
+    'electricity_warning': Effect('electricity_warning', electricity_warning_frames, fps=4, loop_frames=2),
+}
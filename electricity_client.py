@@ -3,86 +3,186 @@ Strømpris API Client
 Bruker Hvakosterstrommen.no API for norske strømpriser
 """
 import requests
-from datetime import datetime, timezone
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import metrics
+from price_profile import CHEAPEST_WINDOW_HOURS, PriceProfile
+from readings import ELECTRICITY, PRICE, Reading
+
+
+# Prisene publiseres per norsk dato - URL og dagsskifte følger lokal tid
+OSLO = ZoneInfo('Europe/Oslo')
+
+# Svartid og resultat per kall (cached = dagens tabell var allerede hentet)
+FETCH_SECONDS, FETCHES = metrics.fetch_metrics('strømpris', ('ok', 'cached', 'error'))
 
 
 class ElectricityClient:
     """Klient for å hente strømpriser"""
     
-    def __init__(self, region='NO2'):
+    BASE_URL = "https://www.hvakosterstrommen.no/api/v1/prices"
+    
+    def __init__(self, region='NO2', base_url=None, window_hours=CHEAPEST_WINDOW_HOURS):
         """
         Args:
             region: Prisområde (NO1-NO5)
                    NO2 = Sør-Norge (Kristiansand)
+            base_url: Overstyrer API-adressen (f.eks. fake_upstream.py)
+            window_hours: Lengde på billigste periode i dagsprofilen
         """
         self.region = region
-        self.base_url = "https://www.hvakosterstrommen.no/api/v1/prices"
+        self.base_url = base_url or self.BASE_URL
+        self.window_hours = window_hours
+        # Dagens pristabell hentes og tolkes én gang - prisene endres ikke i løpet av dagen
+        self._day_key = None
+        self._profile = None
+        self._resampled = {}
     
-    def get_current_price(self):
+    def _get_day(self, now=None):
         """
-        Hent nåværende strømpris (øre/kWh inkl mva)
+        Henter og tolker pristabellen for dagen (cachet til den norske datoen skifter)
+        
+        Args:
+            now: Unix-tid i dagen (standard nå)
         
         Returns:
-            float: Pris i øre/kWh, eller None ved feil
+            PriceProfile med API-ets oppløsning (60 eller 15 minutter), eller None ved feil
         """
+        now = time.time() if now is None else now
+        date_str = datetime.fromtimestamp(now, OSLO).strftime('%Y/%m-%d')
+        if self._day_key == date_str and self._profile is not None:
+            FETCHES['cached'].inc()
+            return self._profile
+        
+        url = f"{self.base_url}/{date_str}_{self.region}.json"
+        start = time.perf_counter()
         try:
-            # Format: YYYY/MM-DD
-            now = datetime.now(timezone.utc)
-            date_str = now.strftime('%Y/%m-%d')
-            url = f"{self.base_url}/{date_str}_{self.region}.json"
-            
             response = requests.get(url, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                current_hour = now.hour
-                
-                # Finn pris for nåværende time
-                for entry in data:
-                    time_start = datetime.fromisoformat(entry['time_start'])
-                    if time_start.hour == current_hour:
-                        # NOK_per_kWh er inkludert mva
-                        price = entry['NOK_per_kWh'] * 100  # Konverter til øre
-                        return round(price, 2)
-                
-                return None
-            else:
-                print(f"Strømpris API feil: {response.status_code}")
-                return None
-                
-        except Exception as e:
-            print(f"Feil ved henting av strømpris: {e}")
+        finally:
+            FETCH_SECONDS.observe(time.perf_counter() - start)
+        if response.status_code != 200:
+            print(f"Strømpris API feil: {response.status_code}")
+            FETCHES['error'].inc()
             return None
+        
+        entries = response.json()
+        if not entries:
+            # Priser for dagen er ikke publisert ennå - prøv igjen neste gang
+            print(f"Strømpris API: ingen priser for {date_str}")
+            FETCHES['error'].inc()
+            return None
+        
+        self._profile = PriceProfile.from_entries(entries, self.window_hours)
+        self._resampled = {}
+        self._day_key = date_str
+        FETCHES['ok'].inc()
+        return self._profile
     
-    def get_todays_prices(self):
+    def get_price_table(self, resolution=None, now=None):
         """
-        Hent alle dagens priser
+        Dagens priser med valgt oppløsning
+        
+        Args:
+            resolution: Minutter per pris (60 = time, 15 = kvarter, None = som API-et)
+            now: Unix-tid i dagen (standard nå)
         
         Returns:
-            list: Liste med priser per time, eller None ved feil
+            PriceProfile, eller None ved feil
         """
         try:
-            now = datetime.now(timezone.utc)
-            date_str = now.strftime('%Y/%m-%d')
-            url = f"{self.base_url}/{date_str}_{self.region}.json"
-            
-            response = requests.get(url, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                prices = []
-                for entry in data:
-                    prices.append({
-                        'hour': datetime.fromisoformat(entry['time_start']).hour,
-                        'price': round(entry['NOK_per_kWh'] * 100, 2)  # øre/kWh
-                    })
-                return prices
-            
-            return None
-                
+            profile = self._get_day(now)
+            if profile is None or resolution is None or resolution == profile.resolution:
+                return profile
+            if resolution not in self._resampled:
+                self._resampled[resolution] = profile.resample(resolution)
+            return self._resampled[resolution]
+        
         except Exception as e:
-            print(f"Feil ved henting av dagens priser: {e}")
+            print(f"Feil ved henting av pristabell: {e}")
+            FETCHES['error'].inc()
+            return None
+    
+    def get_current_price(self, resolution=None):
+        """
+        Hent nåværende strømpris (øre/kWh inkl mva)
+        
+        Args:
+            resolution: 60 for timepris, 15 for kvarterspris (None = som API-et)
+        
+        Returns:
+            float: Pris i øre/kWh, eller None ved feil
+        """
+        now = time.time()
+        table = self.get_price_table(resolution, now)
+        return table.price_at(now) if table is not None else None
+    
+    @property
+    def reading_name(self):
+        """Visningsnavnet for strømprisen (f.eks. 'Strømpris NO2')"""
+        return f"Strømpris {self.region}"
+    
+    def get_current_reading(self, resolution=None):
+        """
+        Nåværende strømpris som Reading (tidsstempel = start på prisperioden)
+        
+        Returns:
+            Reading, eller None ved feil
+        """
+        now = time.time()
+        table = self.get_price_table(resolution, now)
+        return self.reading_from(table, now) if table is not None else None
+    
+    def reading_from(self, table, now=None):
+        """
+        Prisen på et tidspunkt fra en pristabell som allerede er hentet
+        
+        Args:
+            table: PriceProfile (f.eks. siste gode tabell fra data_layer)
+            now: Unix-tid (standard nå)
+        
+        Returns:
+            Reading, eller None hvis tidspunktet er utenfor tabellens dag
+        """
+        now = time.time() if now is None else now
+        slot = table.slot_at(now)
+        if slot is None:
             return None
+        return Reading(ELECTRICITY, self.region, self.reading_name, PRICE, table.prices[slot], table.starts[slot])
+    
+    def get_todays_prices(self, resolution=60):
+        """
+        Hent alle dagens priser
+        
+        Args:
+            resolution: 60 for timepriser, 15 for kvarterspriser
+        
+        Returns:
+            list: Liste med {'hour', 'minute', 'price'} i lokal tid, eller None ved feil
+        """
+        table = self.get_price_table(resolution)
+        if table is None:
+            return None
+        
+        prices = []
+        for start, price in zip(table.starts, table.prices):
+            local = datetime.fromtimestamp(start, OSLO)
+            prices.append({
+                'hour': local.hour,
+                'minute': local.minute,
+                'price': price  # øre/kWh
+            })
+        return prices
+    
+    def get_price_profile(self):
+        """
+        Dagsprofil for strømprisen (samme tabell som get_price_table)
+        
+        Returns:
+            PriceProfile, eller None ved feil
+        """
+        return self.get_price_table()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Lokale stand-in servere for Netatmo, met.no (Yr) og hvakosterstrommen.no
+Serverer innspilte fixtures med justerbar forsinkelse og feilinjeksjon
+"""
+import argparse
+import copy
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlparse
+from zoneinfo import ZoneInfo
+
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+OSLO = ZoneInfo('Europe/Oslo')
+
+UPSTREAMS = ('netatmo', 'yr', 'electricity')
+
+# Tidsfelter i Netatmo-svaret som flyttes frem til "nå"
+NETATMO_TIME_KEYS = {
+    'time_utc', 'last_status_store', 'last_message', 'last_seen',
+    'time_server', 'date_max_temp', 'date_min_temp',
+}
+
+# Sekunder per måling for getmeasure-skalaene
+MEASURE_SCALES = {'max': 300, '5min': 300, '30min': 1800, '1hour': 3600, '3hours': 10800, '1day': 86400}
+
+PRICE_PATH = re.compile(r'^/api/v1/prices/(\d{4})/(\d{2})-(\d{2})_(NO[1-5])\.json$')
+
+
+def _load_fixture(name: str):
+    with open(FIXTURES_DIR / name, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _shift_times(node, delta: int):
+    """Flytter alle kjente Netatmo tidsfelter med delta sekunder (rekursivt)"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in NETATMO_TIME_KEYS and isinstance(value, (int, float)):
+                node[key] = value + delta
+            else:
+                _shift_times(value, delta)
+    elif isinstance(node, list):
+        for item in node:
+            _shift_times(item, delta)
+
+
+class FaultConfig:
+    """Forsinkelse og feilinjeksjon for én upstream"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, errors=(500,), fail_next: int = 0):
+        """
+        Args:
+            latency: Forsinkelse i sekunder før svar
+            jitter: Tilfeldig ekstra forsinkelse (0 til jitter sekunder)
+            error_rate: Andel forespørsler som får en feilkode (0.0-1.0)
+            errors: Feilkoder å velge fra (f.eks. 403, 429, 500, 503)
+            fail_next: Antall neste forespørsler som garantert feiler
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.errors = list(errors)
+        self.fail_next = fail_next
+
+    def update(self, values: dict):
+        for key in ('latency', 'jitter', 'error_rate'):
+            if key in values:
+                setattr(self, key, float(values[key]))
+        if 'errors' in values:
+            self.errors = [int(code) for code in values['errors']]
+        if 'fail_next' in values:
+            self.fail_next = int(values['fail_next'])
+
+    def as_dict(self) -> dict:
+        return {
+            'latency': self.latency,
+            'jitter': self.jitter,
+            'error_rate': self.error_rate,
+            'errors': self.errors,
+            'fail_next': self.fail_next,
+        }
+
+
+class FakeUpstream:
+    """Én HTTP-server som etterligner alle tre API-ene"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8090, price_resolution: int = 60):
+        """
+        Args:
+            host: Adresse å lytte på
+            port: Port (0 = tilfeldig ledig port)
+            price_resolution: Minutter per strømpris (60 eller 15)
+        """
+        self.host = host
+        self.port = port
+        self.price_resolution = price_resolution
+        self.faults: Dict[str, FaultConfig] = {name: FaultConfig() for name in UPSTREAMS}
+
+        self._netatmo = _load_fixture('netatmo_stationsdata.json')
+        self._yr = _load_fixture('yr_compact.json')
+        self._prices = _load_fixture('hvakosterstrommen_NO2.json')
+
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.counters = {
+                name: {'requests': 0, 'errors_injected': 0, 'responses': 0}
+                for name in UPSTREAMS
+            }
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def client_urls(self) -> Dict[str, str]:
+        """Miljøvariabler som peker klientene mot denne serveren"""
+        return {
+            'NETATMO_API_URL': self.url,
+            'YR_API_URL': f"{self.url}/weatherapi/locationforecast/2.0/compact",
+            'STROMPRIS_API_URL': f"{self.url}/api/v1/prices",
+        }
+
+    # --- Feilinjeksjon ---
+
+    def _inject(self, upstream: str):
+        """
+        Venter simulert forsinkelse og avgjør om forespørselen skal feile
+
+        Returns:
+            HTTP feilkode, eller None hvis forespørselen skal lykkes
+        """
+        fault = self.faults[upstream]
+        with self._lock:
+            self.counters[upstream]['requests'] += 1
+
+        delay = fault.latency + (random.uniform(0, fault.jitter) if fault.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        with self._lock:
+            fail = False
+            if fault.fail_next > 0:
+                fault.fail_next -= 1
+                fail = True
+            elif fault.error_rate and random.random() < fault.error_rate:
+                fail = True
+            if fail:
+                self.counters[upstream]['errors_injected'] += 1
+                return random.choice(fault.errors or [500])
+            self.counters[upstream]['responses'] += 1
+        return None
+
+    # --- Svar ---
+
+    def netatmo_token(self) -> dict:
+        return {
+            'access_token': 'fake-access-token',
+            'refresh_token': 'fake-refresh-token',
+            'expires_in': 10800,
+            'expire_in': 10800,
+            'scope': ['read_station'],
+        }
+
+    def netatmo_stations(self) -> dict:
+        data = copy.deepcopy(self._netatmo)
+        _shift_times(data, int(time.time()) - data['time_server'])
+        return data
+
+    def netatmo_measure(self, params: dict):
+        """
+        Historikk for én modul i samme format som getmeasure (optimize=false)
+
+        Verdiene svinger rundt modulens nåværende temperatur i fixturen med
+        en døgnvariasjon, slik at samme tidspunkt alltid gir samme verdi.
+
+        Returns:
+            Tuple med (status, JSON-svar)
+        """
+        device = self._netatmo['body']['devices'][0]
+        module_id = params.get('module_id')
+        if module_id:
+            module = next((m for m in device.get('modules', []) if m['_id'] == module_id), None)
+        else:
+            module = device if params.get('device_id') == device['_id'] else None
+        base = (module or {}).get('dashboard_data', {}).get('Temperature')
+        if base is None:
+            return 400, {'error': {'code': 21, 'message': 'Invalid device_id or module_id'}}
+
+        step = MEASURE_SCALES.get(params.get('scale', '5min'), 300)
+        now = int(time.time())
+        end = min(int(params.get('date_end') or now), now)
+        limit = min(int(params.get('limit') or 1024), 1024)
+        t = (int(params.get('date_begin') or end - step * limit) // step + 1) * step
+
+        body = {}
+        while t <= end and len(body) < limit:
+            value = base + 3 * math.sin(2 * math.pi * (t % 86400) / 86400)
+            body[str(t)] = [round(value, 1)]
+            t += step
+        return 200, {'body': body, 'status': 'ok', 'time_server': now}
+
+    def yr_forecast(self):
+        """Yr-fixture flyttet slik at første time er inneværende time"""
+        data = copy.deepcopy(self._yr)
+        series = data['properties']['timeseries']
+        first = datetime.strptime(series[0]['time'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+        now = datetime.now(timezone.utc)
+        delta = now.replace(minute=0, second=0, microsecond=0) - first
+
+        for entry in series:
+            t = datetime.strptime(entry['time'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+            entry['time'] = (t + delta).strftime('%Y-%m-%dT%H:%M:%SZ')
+        data['properties']['meta']['updated_at'] = (now - timedelta(minutes=15)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        headers = {
+            'Expires': _http_date(now + timedelta(minutes=30)),
+            'Last-Modified': _http_date(now - timedelta(minutes=15)),
+        }
+        return data, headers
+
+    def prices(self, year: int, month: int, day: int) -> list:
+        """
+        Priser for en dato i samme format som hvakosterstrommen.no
+
+        Fixture-prisene brukes per lokal time. Dager med sommertid-skifte
+        får 23 eller 25 timer, akkurat som det ekte API-et.
+        """
+        hourly = [entry['NOK_per_kWh'] for entry in self._prices]
+        exr = self._prices[0]['EXR']
+        step = timedelta(minutes=self.price_resolution)
+
+        # Aritmetikk på lokal tid gir neste midnatt uansett sommertid
+        midnight = datetime(year, month, day, tzinfo=OSLO)
+        start = midnight.astimezone(timezone.utc)
+        end = (midnight + timedelta(days=1)).astimezone(timezone.utc)
+
+        entries = []
+        t = start
+        while t < end:
+            local = t.astimezone(OSLO)
+            price = hourly[local.hour % len(hourly)]
+            if self.price_resolution < 60:
+                # Litt variasjon innen timen så kvartersprisene ikke er like
+                quarter = local.minute // 15
+                price = round(price + (quarter - 1.5) * 0.01, 4)
+            entries.append({
+                'NOK_per_kWh': price,
+                'EUR_per_kWh': round(price / exr, 5),
+                'EXR': exr,
+                'time_start': local.isoformat(),
+                'time_end': (t + step).astimezone(OSLO).isoformat(),
+            })
+            t += step
+        return entries
+
+    def handle(self, method: str, url: str, body: bytes):
+        """
+        Behandler én forespørsel
+
+        Returns:
+            Tuple med (status, JSON-svar, ekstra headere)
+        """
+        parsed = urlparse(url)
+        path = parsed.path
+
+        if path.startswith('/fake/'):
+            return self._handle_fake(method, path, body)
+
+        if path == '/oauth2/token':
+            upstream = 'netatmo'
+        elif path.startswith('/api/v1/prices/'):
+            upstream = 'electricity'
+        elif path.startswith('/api/'):
+            upstream = 'netatmo'
+        elif path.startswith('/weatherapi/'):
+            upstream = 'yr'
+        else:
+            return 404, {'error': 'ukjent endepunkt'}, {}
+
+        error = self._inject(upstream)
+        if error is not None:
+            headers = {'Retry-After': '30'} if error == 429 else {}
+            return error, {'error': {'code': error, 'message': 'Injisert feil fra fake_upstream'}}, headers
+
+        if path == '/oauth2/token':
+            return 200, self.netatmo_token(), {}
+        if path == '/api/getstationsdata':
+            return 200, self.netatmo_stations(), {}
+        if path == '/api/getmeasure':
+            params = dict(parse_qsl(parsed.query))
+            params.update(parse_qsl(body.decode('utf-8', 'replace')))
+            status, payload = self.netatmo_measure(params)
+            return status, payload, {}
+        if path == '/weatherapi/locationforecast/2.0/compact':
+            data, headers = self.yr_forecast()
+            return 200, data, headers
+
+        match = PRICE_PATH.match(path)
+        if match:
+            year, month, day, _region = match.groups()
+            return 200, self.prices(int(year), int(month), int(day)), {}
+
+        return 404, {'error': 'ukjent endepunkt'}, {}
+
+    def _handle_fake(self, method: str, path: str, body: bytes):
+        """Kontroll-endepunkter for selve serveren"""
+        if path == '/fake/stats':
+            with self._lock:
+                return 200, {
+                    'counters': copy.deepcopy(self.counters),
+                    'faults': {name: fault.as_dict() for name, fault in self.faults.items()},
+                }, {}
+        if path == '/fake/reset' and method == 'POST':
+            self.reset_stats()
+            return 200, {'ok': True}, {}
+        if path == '/fake/config' and method == 'POST':
+            try:
+                config = json.loads(body or b'{}')
+            except ValueError:
+                return 400, {'error': 'ugyldig JSON'}, {}
+            for name, values in config.items():
+                if name in self.faults:
+                    self.faults[name].update(values)
+            return 200, {'ok': True}, {}
+        return 404, {'error': 'ukjent endepunkt'}, {}
+
+    # --- Start/stopp ---
+
+    def _make_handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, payload, headers = upstream.handle(method, self.path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Starter serveren i en bakgrunnstråd"""
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-upstream', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stopper serveren"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+
+def _http_date(dt: datetime) -> str:
+    """Formaterer tidspunkt som HTTP-dato (RFC 7231)"""
+    return dt.astimezone(timezone.utc).strftime('%a, %d %b %Y %H:%M:%S GMT')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokale stand-in servere for Netatmo, Yr og strømpris")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--price-resolution', type=int, choices=(15, 60), default=60,
+                        help="Minutter per strømpris (15 = kvartersoppløsning)")
+    for name in UPSTREAMS:
+        parser.add_argument(f'--{name}-latency', type=float, default=0.0)
+        parser.add_argument(f'--{name}-error-rate', type=float, default=0.0)
+        parser.add_argument(f'--{name}-errors', default='500',
+                            help="Kommaseparerte feilkoder, f.eks. 403,429,503")
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(host=args.host, port=args.port, price_resolution=args.price_resolution)
+    for name in UPSTREAMS:
+        upstream.faults[name].update({
+            'latency': getattr(args, f'{name}_latency'),
+            'error_rate': getattr(args, f'{name}_error_rate'),
+            'errors': getattr(args, f'{name}_errors').split(','),
+        })
+    upstream.start()
+
+    print("=" * 50)
+    print("Fake upstream (Netatmo / Yr / Strømpris)")
+    print("=" * 50)
+    print("Legg dette i .env for å bruke serveren:")
+    for key, value in upstream.client_urls().items():
+        print(f"  {key}={value}")
+    print("\nFeil kan endres underveis, f.eks.:")
+    print(f"  curl -X POST {upstream.url}/fake/config -d '{{\"netatmo\": {{\"error_rate\": 0.5, \"errors\": [429]}}}}'")
+    print("Trykk Ctrl+C for å stoppe\n")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\nStopper...")
+    finally:
+        upstream.stop()
+
+
+if __name__ == '__main__':
+    main()
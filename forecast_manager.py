@@ -0,0 +1,218 @@
+"""
+Yr-prognoser for flere steder
+Alle steder hentes samtidig over én delt HTTP-sesjon (gjenbrukte
+forbindelser). Hvert sted fornyes når sitt eget Expires går ut, men alle
+deler én planleggertråd med en heap - ingen tråd per sted.
+"""
+import heapq
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from data_layer import CircuitBreaker
+from readings import TEMPERATURE, YR, Reading
+from yr_client import Forecast, YrClient
+
+
+# Standardsted når YR_LOCATIONS ikke er satt
+DEFAULT_LOCATIONS = [('Sokndal', 58.35, 6.63)]
+
+# Aldri oftere enn dette per sted, selv om Expires allerede er passert (klokkeavvik, feil)
+MIN_REFRESH = 60
+
+# Maks samtidige forespørsler (og forbindelser i sesjonen)
+MAX_WORKERS = 4
+
+Location = Tuple[str, float, float]
+
+
+def parse_locations(value: str) -> List[Location]:
+    """
+    Tolker steder på formen "Sokndal:58.35,6.63;Oslo:59.91,10.75"
+
+    Returns:
+        Liste med (navn, lat, lon) - ugyldige oppføringer hoppes over
+    """
+    locations = []
+    for part in value.split(';'):
+        name, _, coords = part.strip().rpartition(':')
+        try:
+            lat, lon = (float(c) for c in coords.split(','))
+        except ValueError:
+            if part.strip():
+                print(f"⚠ Ugyldig sted i YR_LOCATIONS: '{part.strip()}'")
+            continue
+        locations.append((name.strip() or f"{lat},{lon}", lat, lon))
+    return locations
+
+
+def load_locations() -> List[Location]:
+    """Steder fra YR_LOCATIONS, ellers Sokndal"""
+    return parse_locations(os.getenv('YR_LOCATIONS', '')) or list(DEFAULT_LOCATIONS)
+
+
+def temperature_key(name: str) -> str:
+    """Navnet utetemperaturen for et sted vises med (samme som før: 'Ute (Sokndal)')"""
+    return f"Ute ({name})"
+
+
+class ForecastManager(threading.Thread):
+    """Holder prognosen for alle steder oppdatert fra én planleggertråd"""
+
+    def __init__(self, locations: Optional[List[Location]] = None, base_url: Optional[str] = None,
+                 max_workers: int = MAX_WORKERS):
+        """
+        Args:
+            locations: (navn, lat, lon) - første sted er hovedstedet (standard load_locations())
+            base_url: Overstyrer API-adressen (f.eks. fake_upstream.py)
+            max_workers: Maks samtidige forespørsler
+        """
+        super().__init__(name='forecast-manager', daemon=True)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.clients: Dict[str, YrClient] = {}
+        for name, lat, lon in locations or load_locations():
+            self.clients[name] = YrClient(lat=lat, lon=lon, base_url=base_url, session=self.session)
+        self.fetches = 0
+        # Felles for alle steder - det er samme API som er nede
+        self.breaker = CircuitBreaker('Yr')
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='yr')
+        self._heap: List[Tuple[float, str]] = []  # (neste henting, sted)
+        self._due: Dict[str, float] = {}  # Gjeldende tid per sted - eldre heap-oppføringer hoppes over
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._running = False  # Heapen brukes bare når planleggertråden kjører
+
+    @property
+    def primary(self) -> str:
+        """Hovedstedet (vær og tidslinje på displayet)"""
+        return next(iter(self.clients))
+
+    def forecast(self, name: Optional[str] = None) -> Optional[Forecast]:
+        """Siste prognose for et sted (standard hovedstedet) - henter aldri selv"""
+        client = self.clients.get(name or self.primary)
+        return client.forecast if client is not None else None
+
+    def forecasts(self) -> Dict[str, Forecast]:
+        """Siste prognose for alle steder som har en"""
+        return {name: client.forecast for name, client in self.clients.items()
+                if client.forecast is not None}
+
+    def current_readings(self, now: Optional[float] = None,
+                         max_staleness: Optional[float] = None) -> List[Reading]:
+        """
+        Utetemperatur per sted som Reading (tidsstempel = når prognosen ble hentet)
+
+        Args:
+            now: Unix-tid (standard nå)
+            max_staleness: Sekunder uten vellykket kall (200 eller 304) før målingen merkes som gammel
+        """
+        now = time.time() if now is None else now
+        readings = []
+        for name, forecast in self.forecasts().items():
+            weather = forecast.current(now)
+            if weather and weather['temperature'] is not None:
+                client = self.clients[name]
+                stale = max_staleness is not None and now - client.last_success > max_staleness
+                readings.append(Reading(YR, f"{client.lat},{client.lon}", temperature_key(name), TEMPERATURE,
+                                        weather['temperature'], forecast.updated_at, stale))
+        return readings
+
+    def current_temperatures(self, now: Optional[float] = None) -> Dict[str, float]:
+        """Utetemperatur per sted, med samme navn som displayet bruker"""
+        return {reading.name: reading.value for reading in self.current_readings(now)}
+
+    def _schedule(self, name: str, due: float):
+        with self._lock:
+            self._due[name] = due
+            # Uten planleggertråd (f.eks. web_server.py) ville ingen tømt heapen
+            if not self._running:
+                return
+            heapq.heappush(self._heap, (due, name))
+        self._wake.set()
+
+    def refresh(self, names: Optional[List[str]] = None) -> Dict[str, Optional[Forecast]]:
+        """
+        Henter steder samtidig og planlegger neste henting ut fra Expires
+
+        Steder som fortsatt er ferske koster ingenting (YrClient cacher til Expires).
+
+        Args:
+            names: Steder som skal hentes (standard alle)
+
+        Returns:
+            Prognose per sted (None hvis stedet aldri er hentet)
+        """
+        names = list(self.clients) if names is None else names
+        started = time.time()
+        # Bare steder med utløpt prognose koster et kall
+        expired = [name for name in names
+                   if self.clients[name].forecast is None or started >= self.clients[name].expires_at]
+        if expired and self.breaker.allow(started):
+            with self._refresh_lock:
+                list(self._executor.map(lambda n: self.clients[n].get_forecast(), expired))
+            self.fetches += 1
+            if any(self.clients[name].last_success >= started for name in expired):
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+        now = time.time()
+        for name in names:
+            # Med åpen kretsbryter venter alle steder til neste prøvekall
+            self._schedule(name, max(self.clients[name].expires_at, now + MIN_REFRESH, self.breaker.retry_at))
+        return {name: self.clients[name].forecast for name in names}
+
+    def refresh_due(self, now: Optional[float] = None) -> List[str]:
+        """
+        Henter alle steder som har passert sitt Expires
+
+        Returns:
+            Stedene som ble hentet
+        """
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                at, name = heapq.heappop(self._heap)
+                if self._due.get(name) == at and name not in due:
+                    due.append(name)
+        if due:
+            self.refresh(due)
+        return due
+
+    def run(self):
+        # Steder som aldri er hentet er forfalt med en gang
+        with self._lock:
+            self._running = True
+            for name in self.clients:
+                due = self._due.setdefault(name, 0)
+                heapq.heappush(self._heap, (due, name))
+
+        while not self._stop_event.is_set():
+            self._wake.clear()
+            try:
+                self.refresh_due()
+            except Exception as e:
+                print(f"⚠ Yr-planlegger feil: {e}")
+            with self._lock:
+                wait = self._heap[0][0] - time.time() if self._heap else None
+            if wait is None or wait > 0:
+                self._wake.wait(wait)
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        self._executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,377 @@
+"""
+Historikk for alle målinger (Netatmo-moduler, Yr og strømpris)
+Én ringbuffer med fast størrelse per sensor, lagret i en minnemappet fil
+slik at de siste dagene overlever omstart uten å hente alt på nytt
+"""
+import hashlib
+import mmap
+import re
+import struct
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+HISTORY_DIR = Path(__file__).parent / 'history'
+
+# Sekunder per lagret måling - en nyere måling i samme intervall erstatter
+# den forrige. Samme oppløsning som Netatmo '5min'
+HISTORY_RESOLUTION = 300
+# Antall målinger per sensor: 4 døgn med 5 minutters oppløsning (~9 KB)
+HISTORY_CAPACITY = 4 * 24 * 3600 // HISTORY_RESOLUTION
+
+# Filformat: magic, kapasitet, start (fysisk indeks for eldste), antall, sensornavn.
+# Deretter kapasitet x uint32 tidspunkter og kapasitet x float32 verdier
+_HEADER = struct.Struct('<4sIII64s')
+_MAGIC = b'TSH1'
+
+Point = Tuple[int, float]
+
+
+class _Timestamps:
+    """Tidspunktene i en ringbuffer i logisk rekkefølge (eldste først) - for bisect"""
+
+    def __init__(self, series: 'SeriesBuffer'):
+        self.series = series
+
+    def __len__(self) -> int:
+        return self.series.count
+
+    def __getitem__(self, index: int) -> int:
+        series = self.series
+        return series.times[(series.start + index) % series.capacity]
+
+
+class SeriesBuffer:
+    """Ringbuffer med (tidspunkt, verdi) for én sensor, sortert på tid"""
+
+    def __init__(self, name: str, path: Optional[Path] = None, capacity: int = HISTORY_CAPACITY,
+                 resolution: int = HISTORY_RESOLUTION):
+        """
+        Args:
+            name: Sensornavn (f.eks. "Stue" eller "Strømpris NO2")
+            path: Fil bufferen minnemappes til (None = bare i minnet)
+            capacity: Maks antall målinger
+            resolution: Sekunder per lagret måling
+        """
+        self.name = name
+        self.path = Path(path) if path else None
+        self.resolution = resolution
+        self._lock = threading.Lock()
+        self._mmap: Optional[mmap.mmap] = None
+
+        old_points: List[Point] = []
+        if self.path and self.path.exists():
+            old_points, old_capacity = self._read_existing()
+            if old_capacity != capacity:
+                # Ny kapasitet - filen lages på nytt med de nyeste målingene
+                self.path.unlink()
+
+        size = _HEADER.size + capacity * 8
+        if self.path:
+            if not self.path.exists():
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, 'wb') as f:
+                    f.write(_HEADER.pack(_MAGIC, capacity, 0, 0, name.encode()[:64]))
+                    f.truncate(size)
+            with open(self.path, 'r+b') as f:
+                self._mmap = mmap.mmap(f.fileno(), size)
+            self._buffer = self._mmap
+        else:
+            self._buffer = bytearray(size)
+            _HEADER.pack_into(self._buffer, 0, _MAGIC, capacity, 0, 0, name.encode()[:64])
+
+        view = memoryview(self._buffer)
+        self.capacity = capacity
+        self.times = view[_HEADER.size:_HEADER.size + capacity * 4].cast('I')
+        self.values = view[_HEADER.size + capacity * 4:size].cast('f')
+        _, _, self.start, self.count, _ = _HEADER.unpack_from(self._buffer, 0)
+        self._timestamps = _Timestamps(self)
+
+        if old_points and self.count == 0:
+            self.extend(old_points)
+
+    def _read_existing(self) -> Tuple[List[Point], int]:
+        """Leser målinger fra en eksisterende fil (brukes når kapasiteten endres)"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            magic, capacity, start, count, _ = _HEADER.unpack_from(data, 0)
+            if magic != _MAGIC or len(data) < _HEADER.size + capacity * 8:
+                raise ValueError("ugyldig historikkfil")
+            view = memoryview(data)
+            times = view[_HEADER.size:_HEADER.size + capacity * 4].cast('I')
+            values = view[_HEADER.size + capacity * 4:_HEADER.size + capacity * 8].cast('f')
+            points = [(times[(start + i) % capacity], values[(start + i) % capacity]) for i in range(count)]
+            return points, capacity
+        except (OSError, ValueError, struct.error) as e:
+            print(f"⚠ Kunne ikke lese historikk for {self.name}: {e}")
+            return [], -1
+
+    def _store_header(self):
+        struct.pack_into('<II', self._buffer, 8, self.start, self.count)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _index(self, logical: int) -> int:
+        return (self.start + logical) % self.capacity
+
+    def latest(self) -> Optional[Point]:
+        """Nyeste måling, eller None hvis bufferen er tom"""
+        with self._lock:
+            if not self.count:
+                return None
+            i = self._index(self.count - 1)
+            return self.times[i], self.values[i]
+
+    def oldest(self) -> Optional[Point]:
+        """Eldste måling, eller None hvis bufferen er tom"""
+        with self._lock:
+            if not self.count:
+                return None
+            return self.times[self.start], self.values[self.start]
+
+    def append(self, timestamp: float, value: float) -> bool:
+        """
+        Legger til en måling
+
+        En måling i samme intervall som forrige erstatter den. Eldre
+        målinger enn den nyeste må legges inn med extend().
+
+        Args:
+            timestamp: Unix-tid i sekunder
+            value: Verdien
+
+        Returns:
+            True hvis målingen ble lagret
+        """
+        timestamp = int(timestamp)
+        with self._lock:
+            if self.count:
+                last = self._index(self.count - 1)
+                last_time = self.times[last]
+                if timestamp < last_time:
+                    return False
+                if timestamp // self.resolution == last_time // self.resolution:
+                    self.times[last] = timestamp
+                    self.values[last] = value
+                    return True
+
+            if self.count < self.capacity:
+                i = self._index(self.count)
+                self.count += 1
+            else:
+                # Full - overskriv eldste
+                i = self.start
+                self.start = (self.start + 1) % self.capacity
+            self.times[i] = timestamp
+            self.values[i] = value
+            self._store_header()
+            return True
+
+    def extend(self, points: Iterable[Point]) -> int:
+        """
+        Fletter inn målinger i vilkårlig rekkefølge (f.eks. fra backfill)
+
+        Bygger bufferen på nytt, så den brukes for store bolker - ikke per måling.
+
+        Args:
+            points: (tidspunkt, verdi)
+
+        Returns:
+            Antall målinger i bufferen etterpå
+        """
+        points = sorted((int(t), v) for t, v in points)
+        if not points:
+            return self.count
+        with self._lock:
+            existing = [(self.times[self._index(i)], self.values[self._index(i)]) for i in range(self.count)]
+            merged: List[Point] = []
+            for timestamp, value in sorted(existing + points, key=lambda p: p[0]):
+                if merged and timestamp // self.resolution == merged[-1][0] // self.resolution:
+                    # Samme intervall - behold den nyeste
+                    merged[-1] = (timestamp, value)
+                else:
+                    merged.append((timestamp, value))
+            merged = merged[-self.capacity:]
+
+            for i, (timestamp, value) in enumerate(merged):
+                self.times[i] = timestamp
+                self.values[i] = value
+            self.start = 0
+            self.count = len(merged)
+            self._store_header()
+            return self.count
+
+    def range(self, start: float, end: float) -> List[Point]:
+        """
+        Målinger med start <= tidspunkt <= end (binærsøk, O(log n) + antall treff)
+
+        Args:
+            start: Fra og med (Unix-tid)
+            end: Til og med (Unix-tid)
+
+        Returns:
+            Liste med (tidspunkt, verdi), eldste først
+        """
+        with self._lock:
+            lo = bisect_left(self._timestamps, start)
+            hi = bisect_right(self._timestamps, end)
+            return [(self.times[self._index(i)], self.values[self._index(i)]) for i in range(lo, hi)]
+
+    def since(self, seconds: float, now: Optional[float] = None) -> List[Point]:
+        """Målinger de siste sekundene"""
+        now = time.time() if now is None else now
+        return self.range(now - seconds, now)
+
+    def flush(self):
+        """Skriver endringer til disk"""
+        if self._mmap is not None:
+            self._mmap.flush()
+
+    def close(self):
+        """Skriver til disk og frigjør filen (venter på en pågående extend/append)"""
+        with self._lock:
+            if self._mmap is not None:
+                # memoryview-ene må frigjøres før mmap kan lukkes
+                self.times.release()
+                self.values.release()
+                self._mmap.flush()
+                self._mmap.close()
+                self._mmap = None
+
+
+def _file_name(name: str) -> str:
+    """Filnavn for en sensor - lesbart, men unikt også for æøå og spesialtegn"""
+    slug = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')[:32]
+    digest = hashlib.sha1(name.encode()).hexdigest()[:8]
+    return f"{slug}-{digest}.bin" if slug else f"{digest}.bin"
+
+
+class History:
+    """Historikk for alle sensorer, én minnemappet fil per sensor"""
+
+    def __init__(self, directory: Optional[Path] = HISTORY_DIR, capacity: int = HISTORY_CAPACITY,
+                 resolution: int = HISTORY_RESOLUTION):
+        """
+        Args:
+            directory: Mappe filene lagres i (None = bare i minnet)
+            capacity: Maks antall målinger per sensor
+            resolution: Sekunder per lagret måling
+        """
+        self.directory = Path(directory) if directory else None
+        self.capacity = capacity
+        self.resolution = resolution
+        self._series: Dict[str, SeriesBuffer] = {}
+        self._lock = threading.Lock()
+        if self.directory and self.directory.exists():
+            self._open_existing()
+
+    def _open_existing(self):
+        for path in sorted(self.directory.glob('*.bin')):
+            try:
+                with open(path, 'rb') as f:
+                    magic, _, _, _, raw_name = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != _MAGIC:
+                    continue
+                name = raw_name.rstrip(b'\0').decode('utf-8', 'replace')
+                self._series[name] = SeriesBuffer(name, path, self.capacity, self.resolution)
+            except (OSError, ValueError, struct.error) as e:
+                print(f"⚠ Hopper over historikkfil {path.name}: {e}")
+
+    def series(self, name: str) -> SeriesBuffer:
+        """Bufferen for en sensor (lages første gang)"""
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                path = self.directory / _file_name(name) if self.directory else None
+                series = SeriesBuffer(name, path, self.capacity, self.resolution)
+                self._series[name] = series
+            return series
+
+    def names(self) -> List[str]:
+        """Sensorer med historikk"""
+        with self._lock:
+            return list(self._series)
+
+    def record(self, readings: Iterable, timestamp: Optional[float] = None):
+        """
+        Lagrer ett sett med målinger
+
+        Alle lagres på samme tid (hentetiden) - kildenes egne tidsstempler
+        endres sjeldnere enn intervallene og ville gitt hull i grafen.
+
+        Args:
+            readings: readings.Reading for hver sensor (lagres under visningsnavnet)
+            timestamp: Unix-tid (standard nå)
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        for reading in readings:
+            if reading.value is not None:
+                self.series(reading.name).append(timestamp, float(reading.value))
+
+    def range(self, name: str, start: float, end: float) -> List[Point]:
+        """Målinger for en sensor i et tidsrom (tom liste for ukjent sensor)"""
+        with self._lock:
+            series = self._series.get(name)
+        return series.range(start, end) if series else []
+
+    def flush(self):
+        """Skriver alle buffere til disk"""
+        with self._lock:
+            series = list(self._series.values())
+        for buffer in series:
+            buffer.flush()
+
+    def close(self):
+        """Lukker alle filer"""
+        with self._lock:
+            series = list(self._series.values())
+            self._series = {}
+        for buffer in series:
+            buffer.close()
+
+
+def backfill_netatmo(history: History, netatmo, max_age: float = HISTORY_CAPACITY * HISTORY_RESOLUTION,
+                     stop: Optional[threading.Event] = None) -> int:
+    """
+    Fyller hull i historikken for Netatmo-modulene med getmeasure
+
+    Henter bare tiden etter siste lagrede måling per modul, i bolker på
+    opptil 1024 målinger per kall.
+
+    Args:
+        history: Historikken som fylles
+        netatmo: NetatmoClient
+        max_age: Hvor langt tilbake det hentes (sekunder)
+        stop: Avbryter mellom modulene når den settes (før history.close())
+
+    Returns:
+        Antall målinger som ble hentet
+    """
+    now = int(time.time())
+    total = 0
+    for module in netatmo.get_modules():
+        if stop is not None and stop.is_set():
+            break
+        latest = history.series(module['name']).latest()
+        begin = now - int(max_age)
+        if latest is not None:
+            if now - latest[0] < 2 * history.resolution:
+                continue
+            begin = max(begin, latest[0] + 1)
+
+        points = netatmo.get_measure(module['device_id'], module.get('module_id'), begin, now)
+        if stop is not None and stop.is_set():
+            # Historikken kan være lukket mens getmeasure ventet på svar
+            break
+        if points:
+            history.series(module['name']).extend(points)
+            total += len(points)
+    if total and not (stop is not None and stop.is_set()):
+        history.flush()
+        print(f"✓ Hentet {total} historiske målinger fra Netatmo")
+    return total
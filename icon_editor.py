@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Icon Editor for Twinkly Square
-Web-based editor for creating and editing 24x16 icons
+Web-based editor for creating and editing icons (grid size from TWINKLY_GRID, default 24x16)
 """
 from flask import Flask, render_template, request, jsonify
 import json
@@ -15,6 +15,32 @@ app.config['TEMPLATES_AUTO_RELOAD'] = True
 ICONS_FILE = Path(__file__).parent / 'icons.py'
 
 
+def grid_size():
+    """
+    Rutenett-størrelse for nye ikoner
+    
+    Leses fra TWINKLY_GRID (f.eks. "48x16", se debug_coords.py for din
+    enhet). Standard er 24x16 (3x2 paneler).
+    
+    Returns:
+        (bredde, høyde)
+    """
+    try:
+        width, height = (int(v) for v in os.getenv('TWINKLY_GRID', '24x16').lower().split('x'))
+        if width > 0 and height > 0:
+            return width, height
+    except ValueError:
+        pass
+    return 24, 16
+
+
+def is_rectangular(icon_data):
+    """Sjekker at alle rader har samme (ikke-null) lengde"""
+    return bool(icon_data) and bool(icon_data[0]) and all(
+        isinstance(row, list) and len(row) == len(icon_data[0]) for row in icon_data
+    )
+
+
 def parse_icons_from_file():
     """Parser eksisterende ikoner fra icons.py"""
     with open(ICONS_FILE, 'r', encoding='utf-8') as f:
@@ -68,10 +94,10 @@ def parse_icons_from_file():
                 numbers_str = re.search(r'\[([0-9,\s]+)\]', line)
                 if numbers_str:
                     row = [int(x.strip()) for x in numbers_str.group(1).split(',') if x.strip()]
-                    if len(row) == 24:
+                    if row:
                         rows.append(row)
         
-        if len(rows) == 16:
+        if is_rectangular(rows):
             icons[icon_name] = rows
     
     return icons
@@ -163,7 +189,8 @@ def save_icon_to_file(icon_name, icon_data):
 @app.route('/')
 def index():
     """Hovedside for icon editor"""
-    return render_template('icon_editor.html')
+    width, height = grid_size()
+    return render_template('icon_editor.html', grid_width=width, grid_height=height)
 
 
 @app.route('/api/icons', methods=['GET'])
@@ -197,12 +224,10 @@ def save_icon(icon_name):
         icon_data = data.get('icon')
         
         # Valider data
-        if not icon_data or len(icon_data) != 16:
-            return jsonify({'success': False, 'error': 'Invalid icon data: must be 16 rows'}), 400
+        if not isinstance(icon_data, list) or not is_rectangular(icon_data):
+            return jsonify({'success': False, 'error': 'Invalid icon data: rows must be non-empty and equally long'}), 400
         
         for row in icon_data:
-            if len(row) != 24:
-                return jsonify({'success': False, 'error': 'Invalid icon data: each row must have 24 columns'}), 400
             if not all(x in [0, 1] for x in row):
                 return jsonify({'success': False, 'error': 'Invalid icon data: values must be 0 or 1'}), 400
         
@@ -0,0 +1,168 @@
+"""
+Ikonlager med hot-reload
+Overvåker icons.py og bytter inn nye ikonmasker uten å restarte displayet
+"""
+import importlib.util
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Set, Tuple
+
+
+ICONS_FILE = Path(__file__).parent / 'icons.py'
+
+# En kompilert ikonmaske er en tuple med (x, y) for alle tente piksler
+IconMask = Tuple[Tuple[int, int], ...]
+
+EMPTY_MASK: IconMask = ()
+
+
+def compile_mask(icon: list) -> IconMask:
+    """
+    Kompilerer et 0/1 ikon-array til en liste med tente piksler
+
+    Args:
+        icon: 2D liste med 0/1 verdier
+
+    Returns:
+        Tuple med (x, y) koordinater der ikonet er tent
+    """
+    return tuple(
+        (x, y)
+        for y, row in enumerate(icon)
+        for x, pixel in enumerate(row)
+        if pixel == 1
+    )
+
+
+def _default_resolver(location_name: str) -> str:
+    """Brukes hvis icons.py ikke har get_icon_name_for_location"""
+    return 'default'
+
+
+class IconStore:
+    """Holder kompilerte ikonmasker og laster dem på nytt når icons.py endres"""
+
+    def __init__(self, path: Path = ICONS_FILE, poll_interval: float = 2.0):
+        """
+        Initialiserer ikonlageret og laster ikonene
+
+        Args:
+            path: Sti til icons.py
+            poll_interval: Sekunder mellom hver sjekk av filen
+        """
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        # (masker, resolver, oppslag) byttes ut som ett objekt slik at lesere
+        # aldri ser en halvveis oppdatert tilstand. Oppslaget husker ikonnavnet
+        # per lokasjon, så resolveren (strengsøk) bare kjøres én gang per navn.
+        self._current: Tuple[Dict[str, IconMask], Callable[[str], str], Dict[str, str]] = \
+            ({}, _default_resolver, {})
+        self._mtime_ns: Optional[int] = None
+        self._listeners = []
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reload()
+
+    def add_listener(self, callback: Callable[[Set[str]], None]):
+        """
+        Registrerer en callback som kalles med navnene på endrede ikoner
+
+        Args:
+            callback: Funksjon som tar et sett med ikonnavn
+        """
+        self._listeners.append(callback)
+
+    def lookup(self, location_name: str, icon: Optional[str] = None) -> Tuple[str, IconMask]:
+        """
+        Finner ikonet for en lokasjon
+
+        Args:
+            location_name: Navn på lokasjonen
+            icon: Fast ikon fra måletypen (f.eks. 'strøm') - brukes hvis det finnes
+
+        Returns:
+            Tuple med (ikonnavn, kompilert maske)
+        """
+        masks, resolver, resolved = self._current
+        if icon is not None and icon in masks:
+            return icon, masks[icon]
+        name = resolved.get(location_name)
+        if name is None:
+            name = resolver(location_name)
+            if name not in masks:
+                name = 'default'
+            resolved[location_name] = name
+        return name, masks.get(name, EMPTY_MASK)
+
+    def _load_module(self):
+        """Laster icons.py som en frittstående modul (påvirker ikke sys.modules)"""
+        spec = importlib.util.spec_from_file_location('_icons_hot_reload', self.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    def reload(self) -> Set[str]:
+        """
+        Laster icons.py på nytt hvis filen er endret
+
+        Returns:
+            Sett med navn på ikoner som ble lagt til, endret eller fjernet
+        """
+        with self._reload_lock:
+            try:
+                mtime_ns = self.path.stat().st_mtime_ns
+            except OSError as e:
+                print(f"⚠ Kunne ikke lese {self.path.name}: {e}")
+                return set()
+
+            if mtime_ns == self._mtime_ns:
+                return set()
+
+            try:
+                module = self._load_module()
+                new_masks = {
+                    name: compile_mask(icon)
+                    for name, icon in module.LOCATION_ICONS.items()
+                }
+                resolver = getattr(module, 'get_icon_name_for_location', _default_resolver)
+            except Exception as e:
+                # Ikon-editoren kan være midt i en skriving - behold gamle ikoner
+                # og prøv igjen ved neste sjekk
+                print(f"⚠ Kunne ikke laste ikoner på nytt: {e}")
+                return set()
+
+            old_masks = self._current[0]
+            changed = {
+                name for name in set(old_masks) | set(new_masks)
+                if old_masks.get(name) != new_masks.get(name)
+            }
+
+            self._current = (new_masks, resolver, {})
+            self._mtime_ns = mtime_ns
+
+        if changed and self._thread is not None:
+            print(f"✓ Ikoner lastet på nytt: {', '.join(sorted(changed))}")
+        for callback in self._listeners:
+            callback(changed)
+        return changed
+
+    def _watch(self):
+        """Tråd som sjekker icons.py for endringer"""
+        while not self._stop.wait(self.poll_interval):
+            self.reload()
+
+    def start_watching(self):
+        """Starter bakgrunnstråd som overvåker icons.py"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='icon-watcher', daemon=True)
+        self._thread.start()
+
+    def stop_watching(self):
+        """Stopper overvåkingen"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
@@ -133,35 +133,49 @@ LOCATION_ICONS = {
 }
 
 
-def get_icon_for_location(location_name: str):
+def get_icon_name_for_location(location_name: str) -> str:
     """
-    Henter ikon basert på lokasjonsnavn
+    Finner navnet på ikonet som hører til en lokasjon
     
     Args:
         location_name: Navn på lokasjonen
     
     Returns:
-        24x16 ikon-array
+        Nøkkel i LOCATION_ICONS
     """
     # Normaliser navn
     name_lower = location_name.lower()
     
     # Sjekk om navn inneholder nøkkelord
     if 'stue' in name_lower or 'living' in name_lower:
-        return LOCATION_ICONS['stue']
+        return 'stue'
     elif 'kjøkken' in name_lower or 'kitchen' in name_lower:
-        return LOCATION_ICONS['kjøkken']
+        return 'kjøkken'
     elif 'kjeller' in name_lower or 'basement' in name_lower or 'keller' in name_lower:
-        return LOCATION_ICONS['kjeller']
+        return 'kjeller'
     elif 'loft' in name_lower or 'attic' in name_lower:
-        return LOCATION_ICONS['loft']
+        return 'loft'
     elif 'soverom' in name_lower or 'bedroom' in name_lower:
-        return LOCATION_ICONS['soverom']
+        return 'soverom'
     elif 'bad' in name_lower or 'bathroom' in name_lower:
-        return LOCATION_ICONS['bad']
+        return 'bad'
     elif 'ute' in name_lower or 'outdoor' in name_lower or 'yr' in name_lower:
-        return LOCATION_ICONS['ute']
+        return 'ute'
     elif 'strøm' in name_lower or 'electricity' in name_lower or 'power' in name_lower:
-        return LOCATION_ICONS['strøm']
+        return 'strøm'
     else:
-        return LOCATION_ICONS['default']
+        return 'default'
+
+
+def get_icon_for_location(location_name: str):
+    """
+    Henter ikon basert på lokasjonsnavn
+    
+    Args:
+        location_name: Navn på lokasjonen
+    
+    Returns:
+        24x16 ikon-array
+    """
+    # Ikoner kan slettes i ikon-editoren, fall tilbake til standardikonet
+    return LOCATION_ICONS.get(get_icon_name_for_location(location_name), LOCATION_ICONS['default'])
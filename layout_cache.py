@@ -0,0 +1,102 @@
+"""
+Cache over kompilerte LED layouts på disk
+Lagrer indekskartet per enhet (MAC) og layout-sjekksum slik at reconnect
+slipper å laste ned og tolke hele koordinatlisten på nytt
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from led_layout import LedLayout
+
+
+LAYOUT_CACHE_DIR = Path(__file__).parent / 'layout_cache'
+
+# Layout kan endres i Twinkly-appen uten at gestalt endrer seg -
+# last ned på nytt når cachen er eldre enn dette
+LAYOUT_MAX_AGE = 24 * 3600
+
+# Gestalt-felter som må være like for at cachet layout kan brukes
+IDENTITY_FIELDS = ('number_of_led', 'led_profile', 'product_code', 'hw_id', 'fw_family')
+
+
+def layout_identity(device_info: dict) -> str:
+    """
+    Identitet for LED-oppsettet slik enheten rapporterer det i gestalt
+
+    Args:
+        device_info: Svar fra get_device_info()
+
+    Returns:
+        Streng som endres når antall LEDs eller produkt endres
+    """
+    return '|'.join(str(device_info.get(field, '')) for field in IDENTITY_FIELDS)
+
+
+class LayoutCache:
+    """Kompilerte LED layouts lagret som én JSON-fil per enhet og sjekksum"""
+
+    def __init__(self, directory: Path = LAYOUT_CACHE_DIR, max_age: float = LAYOUT_MAX_AGE):
+        """
+        Args:
+            directory: Mappe filene lagres i
+            max_age: Sekunder før et cachet layout lastes ned på nytt
+        """
+        self.directory = Path(directory)
+        self.max_age = max_age
+
+    def _path(self, mac: str, checksum: str) -> Path:
+        return self.directory / f"{mac.replace(':', '')}-{checksum}.json"
+
+    def load(self, mac: str, checksum: str, identity: str) -> Optional[LedLayout]:
+        """
+        Henter cachet layout hvis enheten rapporterer samme oppsett
+
+        Args:
+            mac: Enhetens MAC-adresse
+            checksum: Layout-sjekksum fra enhetscachen
+            identity: layout_identity() for enheten nå
+
+        Returns:
+            LedLayout, eller None hvis det må lastes ned på nytt
+        """
+        try:
+            with open(self._path(mac, checksum), 'r') as f:
+                data = json.load(f)
+            if data.get('identity') != identity:
+                return None
+            if time.time() - data.get('saved_at', 0) > self.max_age:
+                return None
+            return LedLayout.from_dict(data['layout'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, mac: str, checksum: str, identity: str, layout: LedLayout):
+        """
+        Lagrer kompilert layout og fjerner eldre layouts for samme enhet
+
+        Args:
+            mac: Enhetens MAC-adresse
+            checksum: Sjekksum av koordinatene layoutet ble kompilert fra
+            identity: layout_identity() for enheten
+            layout: Kompilert layout
+        """
+        path = self._path(mac, checksum)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for old in self.directory.glob(f"{mac.replace(':', '')}-*.json"):
+                if old != path:
+                    old.unlink()
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    'identity': identity,
+                    'checksum': checksum,
+                    'saved_at': int(time.time()),
+                    'layout': layout.to_dict(),
+                }, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠ Kunne ikke lagre LED layout: {e}")
@@ -0,0 +1,238 @@
+"""
+LED layout for Twinkly arrays
+Utleder logisk rutenett og paneloppsett fra koordinatene i get_led_layout()
+og kompilerer et gjenbrukbart indekskart fra LED til piksel
+"""
+import hashlib
+from collections import Counter
+from itertools import chain
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+PANEL_SIZE = 8  # Hvert Square-panel er 8x8 LEDs
+
+# Standard oppsett før layout er hentet: 3x2 paneler
+DEFAULT_WIDTH = 24
+DEFAULT_HEIGHT = 16
+
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+
+
+def layout_checksum(coordinates: List[Dict[str, float]]) -> str:
+    """
+    Sjekksum for et sett LED-koordinater
+
+    Lik sjekksum betyr samme layout, uavhengig av flyttallsstøy i JSON.
+
+    Returns:
+        Hex-streng (16 tegn)
+    """
+    digest = hashlib.sha1()
+    for c in coordinates:
+        digest.update(f"{c['x']:.5f},{c['y']:.5f};".encode())
+    return digest.hexdigest()[:16]
+
+
+def _fit_axis(distinct: List[float], threshold: float) -> Optional[Tuple[float, float]]:
+    """
+    Prøver å legge verdiene på et jevnt rutenett
+
+    Verdier med mindre avstand enn threshold slås sammen til én gruppe.
+
+    Returns:
+        (første posisjon, pitch) hvis alle verdier ligger nær et rutenettpunkt, ellers None
+    """
+    groups = [[distinct[0]]]
+    for a, b in zip(distinct, distinct[1:]):
+        if b - a >= threshold:
+            groups.append([])
+        groups[-1].append(b)
+    centers = [sum(group) / len(group) for group in groups]
+    if len(centers) == 1:
+        return centers[0], 1.0
+
+    steps = sorted(b - a for a, b in zip(centers, centers[1:]))
+    pitch = steps[len(steps) // 2]
+    if all(abs((v - centers[0]) / pitch - round((v - centers[0]) / pitch)) < 0.25 for v in distinct):
+        return centers[0], pitch
+    return None
+
+
+def _grid_positions(values: Sequence[float]) -> Tuple[List[int], int]:
+    """
+    Avbilder koordinatverdier på én akse til heltallsposisjoner
+
+    Avstanden mellom nabo-LEDs (pitch) er medianen av avstandene mellom
+    kolonnene/radene. Små avvik i koordinatene fra enheten slås sammen
+    til samme kolonne/rad, og hver verdi avrundes til nærmeste steg fra
+    første kolonne. Hull i oppsettet (manglende paneler) gir dermed tomme
+    kolonner i stedet for at alt forskyves.
+
+    Args:
+        values: Koordinater langs aksen, én per LED
+
+    Returns:
+        (posisjon per LED, antall posisjoner langs aksen)
+    """
+    distinct = sorted(set(values))
+    gaps = sorted(set(b - a for a, b in zip(distinct, distinct[1:])))
+    if not gaps or gaps[-1] <= 1e-9:
+        return [0] * len(values), 1
+
+    # Minste sammenslåing som gir et jevnt rutenett
+    fit = None
+    for threshold in gaps:
+        fit = _fit_axis(distinct, threshold)
+        if fit is not None:
+            break
+    origin, pitch = fit or (distinct[0], gaps[len(gaps) // 2])
+
+    positions = [int(round((v - origin) / pitch)) for v in values]
+    lowest = min(positions)
+    positions = [p - lowest for p in positions]
+    return positions, max(positions) + 1
+
+
+class LedLayout:
+    """Kompilert LED layout: rutenett-størrelse og LED -> piksel indekskart"""
+
+    def __init__(self, width: int, height: int, index_map: Sequence[int]):
+        """
+        Args:
+            width: Antall piksler i bredden
+            height: Antall piksler i høyden
+            index_map: Pikselindeks (y * width + x) for hver LED i Twinkly sin rekkefølge
+        """
+        self.width = width
+        self.height = height
+        self.index_map = tuple(index_map)
+        self.led_count = len(self.index_map)
+
+        # LEDs som deler piksel med en annen LED
+        counts = Counter(self.index_map)
+        self.collisions: Dict[Tuple[int, int], List[int]] = {}
+        for led, pixel in enumerate(self.index_map):
+            if counts[pixel] > 1:
+                self.collisions.setdefault(divmod(pixel, width)[::-1], []).append(led)
+        self.unused_pixels = width * height - len(counts)
+
+        # Hvilke paneler som faktisk har LEDs (kolonne, rad)
+        self.panels = sorted({((pixel % width) // PANEL_SIZE, (pixel // width) // PANEL_SIZE)
+                              for pixel in counts})
+
+        self._pick = itemgetter(*self.index_map) if self.led_count > 1 else None
+
+    @classmethod
+    def from_coordinates(cls, coordinates: List[Dict[str, float]]) -> 'LedLayout':
+        """
+        Kompilerer layout fra Twinkly-koordinater
+
+        Twinkly-koordinater: x går fra -1 til 1, y fra 0 (bunn) til 1 (topp).
+        Rad 0 i rutenettet er øverst.
+
+        Args:
+            coordinates: Liste med {'x', 'y', ...} fra get_led_layout()
+
+        Returns:
+            LedLayout med bredde/høyde utledet fra koordinatene
+        """
+        if not coordinates:
+            raise ValueError("Tomt LED layout")
+
+        columns, width = _grid_positions([c['x'] for c in coordinates])
+        rows, height = _grid_positions([-c['y'] for c in coordinates])
+        return cls(width, height, [y * width + x for x, y in zip(columns, rows)])
+
+    @classmethod
+    def row_major(cls, width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT,
+                  led_count: Optional[int] = None) -> 'LedLayout':
+        """
+        Enkel rad-for-rad mapping når koordinater mangler
+
+        Args:
+            width: Antall piksler i bredden
+            height: Antall piksler i høyden
+            led_count: Antall LEDs (standard width * height)
+        """
+        pixels = width * height
+        count = pixels if led_count is None else led_count
+        return cls(width, height, [i if i < pixels else pixels - 1 for i in range(count)])
+
+    @staticmethod
+    def truncation_collisions(coordinates: List[Dict[str, float]], width: int, height: int) -> int:
+        """
+        Teller LEDs som havner på samme piksel med int()-avkutting
+
+        Den gamle mappingen skalerte koordinatene rett til en fast
+        rutenettstørrelse. Brukes av debug_coords.py for å vise forskjellen.
+
+        Returns:
+            Antall LEDs som deler piksel med en annen LED
+        """
+        counts = Counter(
+            (max(0, min(int((c['x'] + 1.0) / 2.0 * width), width - 1)),
+             max(0, min(int((1.0 - c['y']) * height), height - 1)))
+            for c in coordinates
+        )
+        return sum(n for n in counts.values() if n > 1)
+
+    def to_dict(self) -> dict:
+        """Kompilert layout som JSON-vennlig dict (for layout-cachen)"""
+        return {'width': self.width, 'height': self.height, 'index_map': list(self.index_map)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'LedLayout':
+        """Gjenoppretter layout lagret med to_dict()"""
+        return cls(int(data['width']), int(data['height']), [int(i) for i in data['index_map']])
+
+    @property
+    def panels_x(self) -> int:
+        return -(-self.width // PANEL_SIZE)
+
+    @property
+    def panels_y(self) -> int:
+        return -(-self.height // PANEL_SIZE)
+
+    def describe(self) -> str:
+        """Kort beskrivelse for logg, f.eks. '24x16 (3x2 paneler)'"""
+        text = f"{self.width}x{self.height} ({self.panels_x}x{self.panels_y} paneler)"
+        if len(self.panels) != self.panels_x * self.panels_y:
+            text += f", {len(self.panels)} paneler i bruk"
+        return text
+
+    def _fit(self, pattern: list) -> list:
+        """Flater ut et mønster med feil størrelse eller 0/1 verdier til RGB per piksel"""
+        flat = []
+        for y in range(self.height):
+            row = pattern[y] if y < len(pattern) else ()
+            for x in range(self.width):
+                pixel = row[x] if x < len(row) else 0
+                if isinstance(pixel, (tuple, list)):
+                    flat.append(pixel)
+                else:
+                    flat.append(WHITE if pixel == 1 else BLACK)
+        return flat
+
+    def frame_bytes(self, pattern: list) -> bytes:
+        """
+        Lager en ferdig RGB-frame fra et 2D mønster
+
+        Args:
+            pattern: 2D liste (height x width) med RGB tupler eller 0/1 verdier
+
+        Returns:
+            3 bytes per LED i Twinkly sin rekkefølge
+        """
+        flat = [pixel for row in pattern for pixel in row]
+        if len(flat) != self.width * self.height:
+            flat = self._fit(pattern)
+        if self._pick is None:
+            return bytes(chain.from_iterable(flat[i] for i in self.index_map))
+
+        try:
+            return bytes(chain.from_iterable(self._pick(flat)))
+        except TypeError:
+            # Mønster med 0/1 verdier i stedet for RGB tupler
+            return bytes(chain.from_iterable(self._pick(self._fit(pattern))))
@@ -1,51 +1,95 @@
 #!/usr/bin/env python3
 """
 Netatmo til Twinkly Square Display
-Viser temperatur fra Netatmo værstasjon på Twinkly Square
+Viser temperatur fra Netatmo værstasjon på én eller flere Twinkly Square
 """
 import os
+import threading
 import time
-import json
-from datetime import datetime
-from pathlib import Path
 from dotenv import load_dotenv
 from netatmo_client import NetatmoClient
 from twinkly_client import TwinklySquare
-from yr_client import YrClient
+from icon_store import IconStore
+from forecast_manager import ForecastManager, temperature_key
 from electricity_client import ElectricityClient
+from display_worker import (STATE_FILE, DisplayData, DisplayWorker, describe_cheapest, get_state,
+                            load_device_configs)
+from history import History, backfill_netatmo
+from readings import ELECTRICITY, by_name
+from data_layer import DataLayer
+from scheduler import Scheduler
+import metrics
 
 
-def get_state():
-    """Hent nåværende state fra fil"""
-    state_file = Path(__file__).parent / 'display_state.json'
-    if state_file.exists():
-        try:
-            with open(state_file, 'r') as f:
-                return json.load(f)
-        except:
-            pass
-    return {
-        'mode': 'rotate',
-        'location': None,
-        'interval': int(os.getenv('UPDATE_SECONDS', 60)),
-        'show_clock': False
-    }
+# Hvor ofte display_state.json sjekkes for endringer (sekunder) - en stat() er billig
+STATE_POLL = 2.0
 
+# Takt for henting når alle enheter bare viser klokke uten data
+IDLE_INTERVAL = 60
 
-def reconnect_twinkly(twinkly, max_retries=5, retry_delay=2):
-    """Prøv å koble til Twinkly på nytt med retry-logikk"""
+
+def state_version():
+    """Endringstidspunkt for display_state.json (None hvis filen ikke finnes)"""
+    try:
+        return STATE_FILE.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def connect_twinkly(twinkly, name, max_retries=10, retry_delay=3):
+    """Koble til Twinkly med retry - Twinkly kan ta tid å starte opp"""
     for attempt in range(1, max_retries + 1):
-        if twinkly.connect() and twinkly.set_mode_rt():
-            print(f"✓ Koblet til Twinkly på nytt (forsøk {attempt}/{max_retries})")
+        if twinkly.connect():
+            print(f"✓ Koblet til {name} (forsøk {attempt}/{max_retries})")
             return True
         if attempt < max_retries:
-            print(f"  Reconnect forsøk {attempt}/{max_retries} feilet, prøver igjen om {retry_delay}s...")
+            print(f"  Kunne ikke koble til {name} (forsøk {attempt}/{max_retries}), prøver igjen om {retry_delay}s...")
             time.sleep(retry_delay)
-    
-    print(f"✗ Kunne ikke koble til Twinkly etter {max_retries} forsøk")
+        else:
+            print(f"✗ Kunne ikke koble til {name} etter {max_retries} forsøk")
     return False
 
 
+def fetch_display_data(data_layer, history=None):
+    """
+    Henter alle data én gang - deles av alle Twinkly-enhetene
+    
+    Returnerer med en gang: datalaget gir siste gode verdier og henter nye
+    i bakgrunnen, så et tregt eller nede API forsinker ikke displayet.
+    
+    Args:
+        data_layer: DataLayer med Netatmo, Yr og strømpris
+        history: Historikk alle målinger lagres i (valgfri)
+    
+    Returns:
+        DisplayData med målinger (Reading), Netatmo-snapshot, værdata og strømpris
+    """
+    readings = data_layer.readings()
+    
+    # Prognosen tolkes én gang - temperatur, symbol og tidslinje leser fra samme tabell
+    forecast = data_layer.forecasts.forecast()
+    yr_weather = forecast.current() if forecast is not None else None
+    
+    price = next((r for r in readings if r.source == ELECTRICITY), None)
+    electricity_price = price.value if price is not None and not price.stale else None
+    
+    data = DisplayData(by_name(readings), yr_weather, electricity_price, history,
+                       data_layer.price_profile, forecast, netatmo=data_layer.snapshot)
+    if history is not None:
+        # Gamle verdier lagres ikke - de ville gitt en flat linje i grafen
+        history.record([r for r in readings if not r.stale], data.fetched_at)
+    return data
+
+
+def publish_interval(workers):
+    """Sekunder til neste publisering - raskeste enhet bestemmer takten"""
+    # Enheter som bare viser klokke trenger ingen data
+    scenes = [worker.current_scene() for worker in workers]
+    intervals = [scene.get('interval', 10) for scene in scenes
+                 if not scene.get('show_clock', False) or scene.get('clock_location')]
+    return min(intervals) if intervals else IDLE_INTERVAL
+
+
 def main():
     """Hovedfunksjon"""
     print("=" * 50)
@@ -62,9 +106,6 @@ def main():
     netatmo_password = os.getenv('NETATMO_PASSWORD')
     netatmo_refresh_token = os.getenv('NETATMO_REFRESH_TOKEN')
     
-    # Hent Twinkly IP
-    twinkly_ip = os.getenv('TWINKLY_IP')
-    
     # Valider at alle nødvendige credentials er satt
     if not netatmo_client_id or not netatmo_client_secret:
         print("✗ Mangler Netatmo Client ID eller Client Secret!")
@@ -81,64 +122,64 @@ def main():
         client_secret=netatmo_client_secret,
         username=netatmo_username,
         password=netatmo_password,
-        refresh_token=netatmo_refresh_token
+        refresh_token=netatmo_refresh_token,
+        api_url=os.getenv('NETATMO_API_URL')
     )
     
     print("\n2. Kobler til Twinkly Square...")
-    twinkly = TwinklySquare(ip_address=twinkly_ip)
-    
-    # Prøv å koble til med retry - Twinkly kan ta tid å starte opp
-    max_retries = 10
-    retry_delay = 3
-    connected = False
+    # Ikoner lagret i ikon-editoren tas i bruk uten omstart
+    icon_store = IconStore()
+    icon_store.start_watching()
     
-    for attempt in range(1, max_retries + 1):
-        if twinkly.connect():
-            connected = True
-            print(f"✓ Koblet til Twinkly (forsøk {attempt}/{max_retries})")
-            break
-        else:
-            if attempt < max_retries:
-                print(f"  Kunne ikke koble til Twinkly (forsøk {attempt}/{max_retries}), prøver igjen om {retry_delay}s...")
-                time.sleep(retry_delay)
-            else:
-                print(f"✗ Kunne ikke koble til Twinkly etter {max_retries} forsøk")
+    # Én arbeidertråd per enhet - hver med eget LED layout og egen scene
+    workers = []
+    for device in load_device_configs():
+        twinkly = TwinklySquare(ip_address=device['ip'], icon_store=icon_store)
+        if not connect_twinkly(twinkly, device['name']):
+            continue
+        if not twinkly.set_mode_rt():
+            print(f"✗ Kunne ikke sette {device['name']} til realtime modus")
+            continue
+        workers.append(DisplayWorker(device['name'], twinkly, scene=device))
     
-    if not connected:
+    if not workers:
         print("✗ Kunne ikke koble til Twinkly Square")
         return
     
-    if not twinkly.set_mode_rt():
-        print("✗ Kunne ikke sette Twinkly til realtime modus")
-        return
-    
     # Initialiser Yr og Strømpris klienter
     print("\n2b. Initialiserer Yr og Strømpris...")
-    yr_client = YrClient(lat=58.35, lon=6.63)  # Sokndal
-    electricity_client = ElectricityClient(region='NO2')  # Sør-Norge
+    # Alle steder i YR_LOCATIONS hentes samtidig, deretter fornyes hvert sted ved sitt Expires
+    forecasts = ForecastManager(base_url=os.getenv('YR_API_URL'))
+    forecasts.refresh()
+    forecasts.start()
+    electricity_client = ElectricityClient(region='NO2', base_url=os.getenv('STROMPRIS_API_URL'))  # Sør-Norge
+    
+    # Siste gode verdier vises mens nye hentes i bakgrunnen - også når et API er nede
+    data_layer = DataLayer(netatmo, forecasts, electricity_client)
+    
+    # Historikk for alle målinger - overlever omstart, hull fylles fra Netatmo i bakgrunnen
+    history = History()
+    stop_backfill = threading.Event()
+    backfill = threading.Thread(target=backfill_netatmo, args=(history, netatmo),
+                                kwargs={'stop': stop_backfill}, name='history-backfill', daemon=True)
+    backfill.start()
     
     # Hent alle tilgjengelige temperaturer
     print("\n3. Henter tilgjengelige moduler...")
-    all_temps = netatmo.get_all_temperatures()
+    data = fetch_display_data(data_layer, history)
     
-    if not all_temps:
-        print("✗ Kunne ikke hente noen temperaturdata")
-        return
+    if not data.temperatures:
+        # Datalaget prøver igjen i bakgrunnen - displayet starter likevel
+        print("⚠ Kunne ikke hente noen temperaturdata ennå - vises når API-ene svarer")
     
-    # Legg til Yr og Strømpris
-    yr_temp = yr_client.get_current_temperature()
-    if yr_temp is not None:
-        all_temps['Ute (Sokndal)'] = yr_temp
-        print(f"✓ Yr utetemperatur: {yr_temp}°C")
+    for name in forecasts.clients:
+        if temperature_key(name) in data.temperatures:
+            print(f"✓ Yr utetemperatur {name}: {data.temperatures[temperature_key(name)]}°C")
+    if data.electricity_price is not None:
+        print(f"✓ Strømpris: {data.electricity_price} øre/kWh{describe_cheapest(data.price_profile)}")
     
-    electricity_price = electricity_client.get_current_price()
-    if electricity_price is not None:
-        all_temps['Strømpris NO2'] = electricity_price
-        print(f"✓ Strømpris: {electricity_price} øre/kWh")
-    
-    locations = list(all_temps.keys())
+    locations = list(data.temperatures.keys())
     print(f"✓ Fant {len(locations)} lokasjoner: {', '.join(locations)}")
-
     
     # Hent state fra fil
     state = get_state()
@@ -147,175 +188,74 @@ def main():
     single_location = state.get('location')
     show_clock = state.get('show_clock', False)
     
-    if show_clock:
-        print(f"\n4. Starter klokke-visning...")
-        print(f"(Oppdaterer hvert sekund. Trykk Ctrl+C for å stoppe)\n")
+    if len(workers) > 1:
+        print(f"\n4. Starter visning på {len(workers)} enheter: {', '.join(w.device_name for w in workers)}")
+        print("(Data hentes én gang og deles. Trykk Ctrl+C for å stoppe)\n")
+    elif show_clock:
+        print("\n4. Starter klokke-visning...")
+        print("(Oppdaterer hvert minuttskifte. Trykk Ctrl+C for å stoppe)\n")
     elif display_mode == 'single' and single_location:
         print(f"\n4. Starter visning av {single_location}...")
         print(f"(Oppdaterer hvert {update_interval} sekund. Trykk Ctrl+C for å stoppe)\n")
     else:
-        print(f"\n4. Starter visning av temperatur...")
+        print("\n4. Starter visning av temperatur...")
         print(f"(Roterer mellom lokasjoner hvert {update_interval} sekund. Trykk Ctrl+C for å stoppe)\n")
     
-    location_index = 0
-    last_rt_reset = time.time()
-    last_mode = display_mode
-    last_location = single_location
-    last_clock_state = show_clock
-    first_run = True
+    for worker in workers:
+        worker.publish(data)
+        worker.start()
+    
+    # Hovedtråden sover til neste frist: henting per kilde, publisering og state-sjekk
+    scheduler = Scheduler('main')
+    for source in data_layer.sources:
+        scheduler.every(source.refresh_interval, source.revalidate, name=f"refresh-{source.name}",
+                        first=time.time() + source.refresh_interval)
+    
+    publish_seconds = metrics.histogram('twinkly_publish_seconds', 'Tid for å samle og dele data med enhetene')
+    
+    def publish():
+        """Deler siste data med alle enheter"""
+        start = time.perf_counter()
+        data = fetch_display_data(data_layer, history)
+        for worker in workers:
+            worker.publish(data)
+        publish_seconds.observe(time.perf_counter() - start)
+        return publish_interval(workers)
+    
+    publish_timer = scheduler.call_later(publish_interval(workers), publish, name='publish')
+    last_version = [state_version()]
+    
+    def watch_state():
+        """Ny scene vises med en gang i stedet for etter neste intervall"""
+        version = state_version()
+        if version != last_version[0]:
+            last_version[0] = version
+            for worker in workers:
+                worker.render_now()
+            scheduler.reschedule(publish_timer)
+    
+    scheduler.every(STATE_POLL, watch_state, name='state')
+    # Øyeblikksbilde for /metrics og /api/metrics i web_server.py
+    scheduler.every(metrics.METRICS_INTERVAL, metrics.REGISTRY.write, name='metrics')
     
     try:
-        while True:
-            # Resett realtime modus hvert 30. sekund for å holde den aktiv
-            current_time = time.time()
-            if current_time - last_rt_reset >= 30:
-                print("  [Resetter realtime-modus]")
-                twinkly.set_mode_rt()
-                last_rt_reset = current_time
-            
-            # Les state på nytt for å få oppdateringer
-            state = get_state()
-            update_interval = state.get('interval', 10)
-            display_mode = state.get('mode', 'single')
-            single_location = state.get('location')
-            show_clock = state.get('show_clock', False)
-            
-            # Sjekk om mode eller location har endret seg
-            mode_changed = (display_mode != last_mode or single_location != last_location or show_clock != last_clock_state)
-            last_mode = display_mode
-            last_location = single_location
-            last_clock_state = show_clock
-            
-            # Hvis klokke er aktivert, vis klokke
-            if show_clock:
-                now = datetime.now()
-                if twinkly.show_clock(now.hour, now.minute):
-                    if first_run or mode_changed:
-                        print(f"✓ Viser klokke: {now.hour:02d}:{now.minute:02d}")
-                        first_run = False
-                else:
-                    print("✗ Kunne ikke oppdatere Twinkly display - prøver å koble til på nytt...")
-                    if not reconnect_twinkly(twinkly):
-                        print("⚠ Kunne ikke gjenopprette tilkobling, venter...")
-                        time.sleep(10)
-                
-                # Oppdater klokken hvert sekund
-                time.sleep(1)
-                continue
-            
-            # Hent alle temperaturer
-            all_temps = netatmo.get_all_temperatures()
-            
-            # Legg til Yr og Strømpris
-            yr_temp = yr_client.get_current_temperature()
-            yr_weather = yr_client.get_weather_data()
-            
-            if yr_temp is not None:
-                all_temps['Ute (Sokndal)'] = yr_temp
-            
-            electricity_price = electricity_client.get_current_price()
-            if electricity_price is not None:
-                all_temps['Strømpris NO2'] = electricity_price
-            
-            # Vis væranimajoner og strømpris-varsling
-            show_animations = False  # Vis animasjoner hver 5. iterasjon
-            if location_index % 5 == 0:
-                show_animations = True
-            
-            if show_animations:
-                # Vis strømpris-varsling hvis pris er høy (over 100 øre)
-                if electricity_price and electricity_price > 100:
-                    print(f"⚡ Strømpris-varsling: {electricity_price} øre/kWh")
-                    twinkly.show_electricity_warning(electricity_price, threshold=100, duration=2)
-                
-                # Vis væranimasjon basert på værsymbol
-                if yr_weather and yr_weather.get('symbol'):
-                    symbol = yr_weather['symbol']
-                    if 'thunder' in symbol:
-                        print("⛈️ Viser torden-animasjon")
-                        twinkly.show_thunder_animation(duration=3)
-                    elif 'rain' in symbol or 'drizzle' in symbol:
-                        print("🌧️ Viser regn-animasjon")
-                        twinkly.show_rain_animation(duration=2)
-                    elif 'snow' in symbol or 'sleet' in symbol:
-                        print("❄️ Viser snø-animasjon")
-                        twinkly.show_snow_animation(duration=2)
-                    elif 'fog' in symbol:
-                        print("🌫️ Viser tåke-animasjon")
-                        twinkly.show_fog_animation(duration=2)
-                    elif 'clearsky' in symbol or 'fair' in symbol:
-                        print("☀️ Viser sol-animasjon")
-                        twinkly.show_sun_animation(duration=2)
-
-            
-            if all_temps:
-                # Oppdater locations liste
-                locations = list(all_temps.keys())
-                
-                if display_mode == 'single' and single_location:
-                    # Vis kun én lokasjon - sjekk om lokasjon finnes
-                    if single_location in all_temps:
-                        temperature = all_temps[single_location]
-                        if twinkly.show_temperature_with_icon(temperature, single_location):
-                            print(f"✓ Viser {single_location}: {temperature}°C")
-                        else:
-                            print("✗ Kunne ikke oppdatere Twinkly display - prøver å koble til på nytt...")
-                            if not reconnect_twinkly(twinkly):
-                                print("⚠ Kunne ikke gjenopprette tilkobling, venter...")
-                                time.sleep(10)
-                    else:
-                        print(f"✗ Lokasjon {single_location} ikke funnet")
-                    
-                    # Hvis mode/location endret eller første kjøring, ikke vent - vis umiddelbart
-                    if mode_changed or first_run:
-                        if mode_changed:
-                            print(f"  [Byttet til single mode: {single_location}]")
-                        first_run = False
-                        time.sleep(1)  # Kort pause for å unngå spam
-                        continue  # Gå til neste iterasjon uten å vente
-                        
-                else:
-                    # Roter mellom lokasjoner (default eller når mode == 'rotate')
-                    if locations:
-                        current_location = locations[location_index]
-                        
-                        if current_location in all_temps:
-                            temperature = all_temps[current_location]
-                            
-                            # Vis temperaturen med ikon på Twinkly Square
-                            if twinkly.show_temperature_with_icon(temperature, current_location):
-                                print(f"✓ Viser {current_location}: {temperature}°C")
-                            else:
-                                print("✗ Kunne ikke oppdatere Twinkly display - prøver å koble til på nytt...")
-                                if not reconnect_twinkly(twinkly):
-                                    print("⚠ Kunne ikke gjenopprette tilkobling, venter...")
-                                    time.sleep(10)
-                        else:
-                            print(f"✗ Kunne ikke hente temperatur fra {current_location}")
-                        
-                        # Hvis mode endret til rotate eller første kjøring, ikke vent - start rotasjon umiddelbart
-                        if mode_changed or first_run:
-                            if mode_changed:
-                                print(f"  [Byttet til rotate mode]")
-                            first_run = False
-                            time.sleep(1)  # Kort pause
-                            continue  # Gå til neste iterasjon uten å vente
-                        
-                        # Gå til neste lokasjon
-                        location_index = (location_index + 1) % len(locations)
-            else:
-                print("✗ Kunne ikke hente temperaturdata")
-            
-            # Vent før neste oppdatering
-            time.sleep(update_interval)
-            
+        scheduler.run()
     except KeyboardInterrupt:
         print("\n\nStopper...")
-        twinkly.clear()
-        print("✓ Display slettet")
     except Exception as e:
         print(f"\n✗ Uventet feil: {e}")
-        twinkly.clear()
+    finally:
+        scheduler.stop()
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            worker.join(timeout=15)
+        forecasts.stop()
+        # Backfill skriver i historikken - må være ferdig før filene lukkes
+        stop_backfill.set()
+        backfill.join(timeout=15)
+        history.close()
+        print("✓ Display slettet")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,247 @@
+"""
+Driftsmålinger (counters, gauges og histogrammer)
+Render-, sende- og hentetider samles i prosessen uten låser - en måling er
+bare en addisjon (og et bisect for histogrammer). main.py skriver et
+øyeblikksbilde til metrics.json, og web_server.py viser det som
+Prometheus-tekst på /metrics og som JSON på /api/metrics.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+METRICS_FILE = Path(__file__).parent / 'metrics.json'
+
+# Sekunder mellom hver gang main.py skriver metrics.json
+METRICS_INTERVAL = 15
+
+# Øvre grenser (sekunder) - fra en ferdig frame (~10 µs) til et tregt API-kall
+TIME_BUCKETS = (0.00001, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Tall som bare øker (antall frames, feil, kall)"""
+
+    __slots__ = ('name', 'labels', 'value', 'fn')
+    kind = 'counter'
+
+    def __init__(self, name: str, labels: Dict[str, str], fn: Optional[Callable[[], float]] = None):
+        """
+        Args:
+            name: Navn i Prometheus-format, f.eks. 'twinkly_frames_sent_total'
+            labels: Faste labels, f.eks. {'source': 'yr'}
+            fn: Leser verdien fra et annet objekt i stedet for inc() (f.eks. Scheduler.wakeups)
+        """
+        self.name = name
+        self.labels = labels
+        self.value = 0
+        self.fn = fn
+
+    def inc(self, amount: float = 1):
+        # Ingen lås - += på et attributt kan i verste fall miste en sjelden samtidig økning
+        self.value += amount
+
+    def read(self) -> Optional[float]:
+        return self.fn() if self.fn is not None else self.value
+
+
+class Gauge(Counter):
+    """Verdi som kan gå opp og ned (alder på data, åpen kretsbryter)"""
+
+    __slots__ = ()
+    kind = 'gauge'
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Histogram:
+    """Fordeling av verdier i faste bøtter (tider i sekunder)"""
+
+    __slots__ = ('name', 'labels', 'buckets', 'counts', 'sum', 'count')
+    kind = 'histogram'
+
+    def __init__(self, name: str, labels: Dict[str, str], buckets: Tuple[float, ...] = TIME_BUCKETS):
+        """
+        Args:
+            name: Navn i Prometheus-format, f.eks. 'twinkly_frame_send_seconds'
+            labels: Faste labels
+            buckets: Sorterte øvre grenser (siste bøtte er +Inf)
+        """
+        self.name = name
+        self.labels = labels
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Alle målinger i prosessen"""
+
+    def __init__(self):
+        self._metrics: Dict[Tuple[str, tuple], object] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()  # Bare for registrering - aldri på målingene
+
+    def _get(self, factory, name: str, help: str, labels: Dict[str, str]):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = factory()
+                self._metrics[key] = metric
+                self._help.setdefault(name, help)
+            return metric
+
+    def counter(self, name: str, help: str = '', fn: Optional[Callable[[], float]] = None,
+                **labels) -> Counter:
+        """
+        Counter med gitte labels (samme objekt hver gang - hent den én gang og behold den)
+
+        Args:
+            name: Navn, f.eks. 'twinkly_frames_sent_total'
+            help: Beskrivelse
+            fn: Leser verdien fra et annet objekt (erstatter tidligere fn)
+            **labels: Labels, f.eks. source='yr'
+        """
+        metric = self._get(lambda: Counter(name, labels, fn), name, help, labels)
+        if fn is not None:
+            metric.fn = fn
+        return metric
+
+    def gauge(self, name: str, help: str = '', fn: Optional[Callable[[], Optional[float]]] = None,
+              **labels) -> Gauge:
+        """Gauge med gitte labels - fn leses når øyeblikksbildet lages (None = ingen verdi)"""
+        metric = self._get(lambda: Gauge(name, labels, fn), name, help, labels)
+        if fn is not None:
+            metric.fn = fn
+        return metric
+
+    def histogram(self, name: str, help: str = '', buckets: Tuple[float, ...] = TIME_BUCKETS,
+                  **labels) -> Histogram:
+        """Histogram med gitte labels"""
+        return self._get(lambda: Histogram(name, labels, buckets), name, help, labels)
+
+    def snapshot(self) -> dict:
+        """
+        Alle verdier akkurat nå
+
+        Returns:
+            {'time': Unix-tid, 'metrics': {navn: {'type', 'help', 'samples': [...]}}}
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        families: Dict[str, dict] = {}
+        for metric in metrics:
+            family = families.setdefault(metric.name, {
+                'type': metric.kind,
+                'help': self._help.get(metric.name, ''),
+                'samples': [],
+            })
+            if isinstance(metric, Histogram):
+                cumulative, buckets = 0, []
+                for bound, count in zip(list(metric.buckets) + ['+Inf'], list(metric.counts)):
+                    cumulative += count
+                    buckets.append([bound, cumulative])
+                family['samples'].append({'labels': metric.labels, 'buckets': buckets,
+                                          'sum': metric.sum, 'count': metric.count})
+                continue
+            try:
+                value = metric.read()
+            except Exception:
+                value = None
+            if value is not None:
+                family['samples'].append({'labels': metric.labels, 'value': value})
+        return {'time': time.time(), 'metrics': families}
+
+    def write(self, path: Path = METRICS_FILE):
+        """Skriver øyeblikksbildet til fil (for web_server.py)"""
+        # Skriv til midlertidig fil først slik at en halvskrevet fil aldri leses
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠ Kunne ikke skrive {path.name}: {e}")
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+def fetch_metrics(source: str, results: Iterable[str] = ('ok', 'error')) -> Tuple[Histogram, Dict[str, Counter]]:
+    """
+    Svartid og antall kall per resultat for én API-klient (felles navn for alle kildene)
+
+    Args:
+        source: Kildenavn, f.eks. 'yr'
+        results: Mulige resultater, f.eks. ('ok', 'not_modified', 'cached', 'error')
+
+    Returns:
+        (histogram for svartid, counter per resultat)
+    """
+    seconds = histogram('twinkly_fetch_seconds', 'Svartid per API-kall', source=source)
+    counts = {result: counter('twinkly_fetch_total', 'API-kall etter resultat', source=source, result=result)
+              for result in results}
+    return seconds, counts
+
+
+def load_snapshot(path: Path = METRICS_FILE) -> Optional[dict]:
+    """Siste øyeblikksbilde fra main.py (None hvis det ikke finnes)"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Dict[str, str], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels.items()) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+def to_prometheus(snapshot: dict) -> str:
+    """
+    Øyeblikksbildet i Prometheus-tekstformat
+
+    Args:
+        snapshot: Fra Registry.snapshot() eller load_snapshot()
+
+    Returns:
+        Tekst for /metrics
+    """
+    lines: List[str] = []
+    for name, family in sorted(snapshot['metrics'].items()):
+        if family['help']:
+            lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for sample in family['samples']:
+            labels = sample['labels']
+            if family['type'] == 'histogram':
+                for bound, count in sample['buckets']:
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', str(bound)))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {sample['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels)} {sample['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {sample['value']}")
+    return '\n'.join(lines) + '\n'
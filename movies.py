@@ -0,0 +1,219 @@
+"""
+Filmer som lagres og spilles av på selve Twinkly-enheten
+Kompilerer en effekt fra effects.py til enhetens filmformat (rå RGB per LED),
+laster den opp én gang og bytter til movie-modus for avspilling
+"""
+import hashlib
+import io
+import uuid
+from itertools import islice
+from typing import Dict, Optional, Tuple
+
+from requests import HTTPError
+from xled.exceptions import ApplicationError
+
+from effects import EFFECTS
+
+
+# Film-id for filmen i det gamle led/movie-API-et
+LEGACY_MOVIE = 'legacy'
+
+# Første firmware med movies-API-et (flere filmer på enheten)
+MOVIES_API_FIRMWARE = (2, 5, 6)
+
+# Enheten avviste kallet (404 eller feilkode fra API-et) - ikke en nettverksfeil
+REJECTED = (ApplicationError, HTTPError)
+
+
+def parse_firmware(version: Optional[str]) -> Optional[Tuple[int, ...]]:
+    """'2.8.11' -> (2, 8, 11) (None hvis versjonen er ukjent eller ikke kan tolkes)"""
+    try:
+        return tuple(int(part) for part in version.split('.'))
+    except (AttributeError, ValueError):
+        return None
+
+
+class Movie:
+    """En kompilert film klar for opplasting"""
+
+    def __init__(self, name: str, data: bytes, frames_number: int, leds: int, fps: float):
+        """
+        Args:
+            name: Effektnavn
+            data: Alle frames etter hverandre, 3 bytes per LED
+            frames_number: Antall frames
+            leds: Antall LEDs per frame
+            fps: Bilder per sekund
+        """
+        self.name = name
+        self.data = data
+        self.frames_number = frames_number
+        self.leds = leds
+        self.fps = fps
+        # Innholdshash som unik id - samme film lastes aldri opp to ganger
+        digest = hashlib.sha1(data + f"|{fps}|{leds}".encode()).digest()
+        self.uid = str(uuid.UUID(bytes=digest[:16]))
+
+    @property
+    def device_name(self) -> str:
+        """Navn på enheten (Twinkly tillater korte navn)"""
+        return f"{self.name[:20]}-{self.uid[:8]}"
+
+
+def compile_movie(twinkly, effect_name: str) -> Movie:
+    """
+    Renderer en effekt til film for twinkly sitt LED layout
+
+    Args:
+        twinkly: TwinklySquare (gir størrelse og LED-rekkefølge)
+        effect_name: Nøkkel i effects.EFFECTS
+
+    Returns:
+        Kompilert Movie
+    """
+    effect = EFFECTS[effect_name]
+    canvases = islice(effect.frames(twinkly.width, twinkly.height), effect.loop_frames)
+    frames = [twinkly.create_frame(canvas) for canvas in canvases]
+    return Movie(effect_name, b''.join(frames), len(frames), twinkly.layout.led_count, effect.fps)
+
+
+class MovieLibrary:
+    """Holder styr på hvilke filmer som er kompilert og lastet opp til én enhet"""
+
+    def __init__(self, twinkly):
+        """
+        Args:
+            twinkly: TwinklySquare filmene lages for
+        """
+        self.twinkly = twinkly
+        self.supported: Optional[bool] = None  # None = ikke prøvd ennå
+        self._compiled: Dict[str, Movie] = {}
+        self._compiled_for = None  # (layout, fargetabell) filmene er kompilert for
+        self._uploaded: Dict[tuple, object] = {}  # (mac, uid) -> film-id på enheten
+        self._movies_api: Dict[Optional[str], bool] = {}  # mac -> har movies-API-et
+
+    def movie(self, effect_name: str) -> Movie:
+        """Kompilert film for effekten (kompileres på nytt hvis layout eller lysstyrke er byttet)"""
+        target = (self.twinkly.layout, self.twinkly.colors.table)
+        if self._compiled_for is None or any(a is not b for a, b in zip(self._compiled_for, target)):
+            self._compiled = {}
+            self._compiled_for = target
+        movie = self._compiled.get(effect_name)
+        if movie is None:
+            movie = compile_movie(self.twinkly, effect_name)
+            self._compiled[effect_name] = movie
+        return movie
+
+    def _has_movies_api(self) -> bool:
+        """
+        Om enheten har movies-API-et - avgjøres av firmwareversjonen
+
+        xled har metodene for begge API-ene uansett, så det sier ingenting
+        om hva enheten støtter. Ukjent versjon prøver movies-API-et først.
+        """
+        mac = self.twinkly.mac
+        if mac not in self._movies_api:
+            try:
+                version = parse_firmware(self.twinkly.control.firmware_version().get('version'))
+            except REJECTED:
+                version = None
+            self._movies_api[mac] = version is None or version >= MOVIES_API_FIRMWARE
+        return self._movies_api[mac]
+
+    def _find_on_device(self, movie: Movie):
+        """Film-id hvis filmen allerede ligger på enheten (f.eks. fra før omstart)"""
+        try:
+            listing = self.twinkly.control.get_movies()
+        except REJECTED:
+            # Eldre firmware uten movies-API - bruk det gamle
+            self._movies_api[self.twinkly.mac] = False
+            return None
+        for entry in listing.get('movies', []):
+            if entry.get('unique_id') == movie.uid:
+                return entry.get('id')
+        return None
+
+    def _upload(self, movie: Movie):
+        """
+        Laster opp filmen og returnerer id-en den fikk
+
+        Bruker movies-API-et (firmware 2.5.6+) og faller tilbake til det
+        gamle led/movie-API-et som bare har plass til én film.
+        Avviser enheten også det gamle API-et, spilles ingen flere filmer
+        (supported=False) og effektene strømmes.
+        """
+        control = self.twinkly.control
+        if self._has_movies_api():
+            try:
+                listing = control.get_movies()
+                available = listing.get('available_frames')
+                if available is not None and available < movie.frames_number:
+                    print(f"⚠ Ikke plass til film '{movie.name}' på Twinkly ({available} frames ledig)")
+                    return None
+                response = control.set_movies_new(movie.device_name, movie.uid, 'rgb_raw',
+                                                  movie.leds, movie.frames_number, movie.fps)
+                control.set_movies_full(io.BytesIO(movie.data))
+                return response.get('id')
+            except REJECTED as e:
+                print(f"⚠ Twinkly avviste movies-API-et ({e}) - bruker det gamle film-API-et")
+                self._movies_api[self.twinkly.mac] = False
+
+        try:
+            control.set_led_movie_config(int(1000 / movie.fps), movie.frames_number, movie.leds)
+            control.set_led_movie_full(io.BytesIO(movie.data))
+        except REJECTED as e:
+            print(f"⚠ Twinkly støtter ikke filmer ({e}) - animasjoner strømmes")
+            self.supported = False
+            return None
+        return LEGACY_MOVIE
+
+    def play(self, effect_name: str) -> bool:
+        """
+        Spiller en effekt som film på enheten
+
+        Lastes opp første gang; senere avspillinger er bare et modusbytte.
+
+        Returns:
+            True hvis filmen spilles, False hvis effekten må strømmes
+        """
+        twinkly = self.twinkly
+        if self.supported is False or twinkly.control is None or not twinkly.link_up:
+            return False
+
+        control = twinkly.control
+        key = None
+        try:
+            movie = self.movie(effect_name)
+            key = (twinkly.mac, movie.uid)
+            movie_id = self._uploaded.get(key)
+            if movie_id is None and self._has_movies_api():
+                movie_id = self._find_on_device(movie)
+
+            if movie_id is None:
+                movie_id = self._upload(movie)
+                if movie_id is None:
+                    return False
+                print(f"✓ Lastet opp film '{movie.name}' ({movie.frames_number} frames) til Twinkly")
+
+            if movie_id == LEGACY_MOVIE:
+                # Det gamle API-et har bare plass til én film
+                self._uploaded = {k: v for k, v in self._uploaded.items() if v != LEGACY_MOVIE}
+            else:
+                control.set_movies_current(movie_id)
+            self._uploaded[key] = movie_id
+
+            control.set_mode('movie')
+            self.supported = True
+            # Neste frame må sette realtime-modus igjen
+            twinkly.rt_mode_lost()
+            return True
+
+        except AttributeError:
+            # Kontrolleren har ikke film-API (f.eks. eldre xled)
+            self.supported = False
+            return False
+        except Exception as e:
+            print(f"⚠ Kunne ikke spille film '{effect_name}' på Twinkly: {e}")
+            # Filmen kan være slettet fra enheten (f.eks. via appen) - last opp på nytt neste gang
+            self._uploaded.pop(key, None)
+            return False
@@ -1,19 +1,35 @@
 """
 Netatmo API Client
-Henter temperaturdata fra Netatmo værstasjon
+Henter målinger fra Netatmo værstasjoner
 """
 import requests
 import time
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
+
+import metrics
+from netatmo_snapshot import StationSnapshot
+
+
+# Sekunder før et kall gis opp - et hengende kall ville ellers holdt datalaget fast
+REQUEST_TIMEOUT = 10
+
+# Svartid og resultat per API-kall (getstationsdata og getmeasure)
+FETCH_SECONDS, FETCHES = metrics.fetch_metrics('netatmo', ('ok', 'token_refreshed', 'error'))
 
 
 class NetatmoClient:
     """Klient for å kommunisere med Netatmo API"""
     
-    AUTH_URL = "https://api.netatmo.com/oauth2/token"
-    STATION_URL = "https://api.netatmo.com/api/getstationsdata"
+    API_URL = "https://api.netatmo.com"
+    AUTH_URL = API_URL + "/oauth2/token"
+    STATION_URL = API_URL + "/api/getstationsdata"
+    MEASURE_URL = API_URL + "/api/getmeasure"
+    
+    # Maks antall målinger Netatmo returnerer per getmeasure-kall
+    MEASURE_LIMIT = 1024
     
-    def __init__(self, client_id: str, client_secret: str, username: str = None, password: str = None, refresh_token: str = None):
+    def __init__(self, client_id: str, client_secret: str, username: str = None, password: str = None, refresh_token: str = None,
+                 api_url: str = None):
         """
         Initialiserer Netatmo klienten
         
@@ -23,7 +39,14 @@ class NetatmoClient:
             username: Netatmo bruker e-post (valgfri hvis refresh_token er gitt)
             password: Netatmo bruker passord (valgfri hvis refresh_token er gitt)
             refresh_token: Netatmo refresh token (valgfri hvis username/password er gitt)
+            api_url: Overstyrer API-adressen (f.eks. fake_upstream.py), standard api.netatmo.com
         """
+        if api_url:
+            api_url = api_url.rstrip('/')
+            self.API_URL = api_url
+            self.AUTH_URL = api_url + "/oauth2/token"
+            self.STATION_URL = api_url + "/api/getstationsdata"
+            self.MEASURE_URL = api_url + "/api/getmeasure"
         self.client_id = client_id
         self.client_secret = client_secret
         self.username = username
@@ -31,6 +54,7 @@ class NetatmoClient:
         self.access_token: Optional[str] = None
         self.refresh_token: Optional[str] = refresh_token
         self.token_expires_at: float = 0
+        self.snapshot: Optional[StationSnapshot] = None  # Siste getstationsdata-svar
     
     def _authenticate(self) -> bool:
         """
@@ -49,7 +73,7 @@ class NetatmoClient:
                 'scope': 'read_station'
             }
             
-            response = requests.post(self.AUTH_URL, data=payload)
+            response = requests.post(self.AUTH_URL, data=payload, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             
             data = response.json()
@@ -80,7 +104,7 @@ class NetatmoClient:
                 'refresh_token': self.refresh_token
             }
             
-            response = requests.post(self.AUTH_URL, data=payload)
+            response = requests.post(self.AUTH_URL, data=payload, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             
             data = response.json()
@@ -103,6 +127,22 @@ class NetatmoClient:
                 return self._authenticate()
         return True
     
+    def get_snapshot(self) -> Optional[StationSnapshot]:
+        """
+        Henter alle målinger fra alle stasjoner med ett getstationsdata-kall
+        
+        Siste vellykkede svar ligger også i self.snapshot, slik at andre
+        visninger kan bruke det uten nye kall.
+        
+        Returns:
+            StationSnapshot, eller None hvis feil
+        """
+        data = self._api_post(self.STATION_URL)
+        if data is None:
+            return None
+        self.snapshot = StationSnapshot.from_response(data)
+        return self.snapshot
+    
     def get_temperature(self, module_name: str = None) -> Optional[float]:
         """
         Henter gjeldende temperatur fra værstasjonen
@@ -113,6 +153,39 @@ class NetatmoClient:
         Returns:
             Temperatur i grader Celsius, eller None hvis feil
         """
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return None
+        if not snapshot.modules:
+            print("✗ Ingen værstasjoner funnet")
+            return None
+        
+        # Hvis ingen modul spesifisert, bruk hovedmodulen
+        module = snapshot.modules[0] if module_name is None else snapshot.module(module_name)
+        if module is not None and module.temperature is not None:
+            print(f"✓ Temperatur hentet ({module_name or module.name}): {module.temperature}°C")
+            return module.temperature
+        
+        print(f"✗ Ingen temperaturdata funnet for {module_name or 'hovedmodul'}")
+        return None
+    
+    def get_all_temperatures(self) -> Dict[str, float]:
+        """
+        Henter temperatur fra alle tilgjengelige moduler (alle stasjoner)
+        
+        Returns:
+            Dictionary med modulnavn -> temperatur
+        """
+        snapshot = self.get_snapshot()
+        return snapshot.temperatures() if snapshot is not None else {}
+    
+    def get_station_data(self) -> Optional[Dict]:
+        """
+        Henter full stasjondata inkludert alle moduler
+        
+        Returns:
+            Dictionary med all stasjondata, eller None hvis feil
+        """
         if not self._ensure_authenticated():
             return None
         
@@ -121,144 +194,120 @@ class NetatmoClient:
                 'Authorization': f'Bearer {self.access_token}'
             }
             
-            response = requests.post(self.STATION_URL, headers=headers)
-            
-            # Hvis 403, prøv å fornye token og prøv igjen
-            if response.status_code == 403:
-                print("  [Token utløpt, fornyer...]")
-                if self._refresh_access_token():
-                    headers['Authorization'] = f'Bearer {self.access_token}'
-                    response = requests.post(self.STATION_URL, headers=headers)
-                else:
-                    print("✗ Kunne ikke fornye token")
-                    return None
-            
+            response = requests.post(self.STATION_URL, headers=headers, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             
-            data = response.json()
-            
-            if 'body' not in data or 'devices' not in data['body']:
-                print("✗ Ingen enheter funnet i Netatmo responsen")
-                return None
-            
-            devices = data['body']['devices']
-            if not devices:
-                print("✗ Ingen værstasjoner funnet")
-                return None
-            
-            device = devices[0]
-            
-            # Hvis ingen modul spesifisert, bruk hovedmodulen
-            if module_name is None:
-                if 'dashboard_data' in device and 'Temperature' in device['dashboard_data']:
-                    temperature = device['dashboard_data']['Temperature']
-                    location = device.get('module_name', device.get('station_name', 'Ukjent'))
-                    print(f"✓ Temperatur hentet ({location}): {temperature}°C")
-                    return temperature
-            else:
-                # Søk i moduler
-                if 'modules' in device:
-                    for module in device['modules']:
-                        if module.get('module_name', '').lower() == module_name.lower():
-                            if 'dashboard_data' in module and 'Temperature' in module['dashboard_data']:
-                                temperature = module['dashboard_data']['Temperature']
-                                print(f"✓ Temperatur hentet ({module_name}): {temperature}°C")
-                                return temperature
-                
-                # Sjekk også hovedmodulen hvis navn matcher
-                device_name = device.get('module_name', device.get('station_name', ''))
-                if device_name.lower() == module_name.lower():
-                    if 'dashboard_data' in device and 'Temperature' in device['dashboard_data']:
-                        temperature = device['dashboard_data']['Temperature']
-                        print(f"✓ Temperatur hentet ({module_name}): {temperature}°C")
-                        return temperature
-            
-            print(f"✗ Ingen temperaturdata funnet for {module_name or 'hovedmodul'}")
-            return None
+            return response.json()
             
         except requests.exceptions.RequestException as e:
-            print(f"✗ Feil ved henting av data: {e}")
+            print(f"✗ Feil ved henting av stasjondata: {e}")
             return None
     
-    def get_all_temperatures(self) -> Dict[str, float]:
+    def _api_post(self, url: str, data: Optional[dict] = None) -> Optional[Dict]:
         """
-        Henter temperatur fra alle tilgjengelige moduler
+        POST mot API-et med token, og én ny runde med fornyet token ved 403
+        
+        Args:
+            url: Endepunkt
+            data: Skjemadata
         
         Returns:
-            Dictionary med modulnavn -> temperatur
+            JSON-svaret, eller None hvis feil
         """
         if not self._ensure_authenticated():
-            return {}
+            return None
         
+        start = time.perf_counter()
         try:
             headers = {
                 'Authorization': f'Bearer {self.access_token}'
             }
-            
-            response = requests.post(self.STATION_URL, headers=headers)
+            response = requests.post(url, headers=headers, data=data, timeout=REQUEST_TIMEOUT)
             
             # Hvis 403, prøv å fornye token og prøv igjen
             if response.status_code == 403:
                 print("  [Token utløpt, fornyer...]")
-                if self._refresh_access_token():
-                    headers['Authorization'] = f'Bearer {self.access_token}'
-                    response = requests.post(self.STATION_URL, headers=headers)
-                else:
+                FETCHES['token_refreshed'].inc()
+                if not self._refresh_access_token():
                     print("✗ Kunne ikke fornye token")
-                    return {}
+                    FETCHES['error'].inc()
+                    return None
+                headers['Authorization'] = f'Bearer {self.access_token}'
+                response = requests.post(url, headers=headers, data=data, timeout=REQUEST_TIMEOUT)
             
             response.raise_for_status()
+            result = response.json()
+            FETCHES['ok'].inc()
+            return result
             
-            data = response.json()
-            
-            if 'body' not in data or 'devices' not in data['body']:
-                return {}
-            
-            devices = data['body']['devices']
-            if not devices:
-                return {}
-            
-            device = devices[0]
-            temperatures = {}
-            
-            # Hovedmodul
-            if 'dashboard_data' in device and 'Temperature' in device['dashboard_data']:
-                name = device.get('module_name', device.get('station_name', 'Hovedmodul'))
-                temperatures[name] = device['dashboard_data']['Temperature']
-            
-            # Andre moduler
-            if 'modules' in device:
-                for module in device['modules']:
-                    if 'dashboard_data' in module and 'Temperature' in module['dashboard_data']:
-                        name = module.get('module_name', f"Modul {module.get('_id', 'ukjent')}")
-                        temperatures[name] = module['dashboard_data']['Temperature']
-            
-            return temperatures
-            
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             print(f"✗ Feil ved henting av data: {e}")
-            return {}
+            FETCHES['error'].inc()
+            return None
+        finally:
+            FETCH_SECONDS.observe(time.perf_counter() - start)
     
-    def get_station_data(self) -> Optional[Dict]:
+    def get_modules(self) -> List[Dict]:
         """
-        Henter full stasjondata inkludert alle moduler
+        Henter modulene som måler temperatur
         
         Returns:
-            Dictionary med all stasjondata, eller None hvis feil
+            Liste med {'name', 'device_id', 'module_id'} (module_id er None for hovedmodulen)
         """
-        if not self._ensure_authenticated():
-            return None
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return []
+        return [
+            {'name': module.label, 'device_id': module.station_id, 'module_id': module.module_id}
+            for module in snapshot
+            if 'Temperature' in (module.data_type or ['Temperature'])
+        ]
+    
+    def get_measure(self, device_id: str, module_id: Optional[str], date_begin: int, date_end: int,
+                    scale: str = '5min', measure_type: str = 'Temperature') -> List[Tuple[int, float]]:
+        """
+        Henter historiske målinger med getmeasure
         
-        try:
-            headers = {
-                'Authorization': f'Bearer {self.access_token}'
+        Henter i bolker på MEASURE_LIMIT målinger til hele perioden er dekket.
+        
+        Args:
+            device_id: Stasjonens id (MAC)
+            module_id: Modulens id (None for hovedmodulen)
+            date_begin: Fra (Unix-tid)
+            date_end: Til (Unix-tid)
+            scale: Oppløsning ('max', '5min', '30min', '1hour', ...)
+            measure_type: Måletype
+        
+        Returns:
+            Liste med (tidspunkt, verdi), eldste først
+        """
+        points = []
+        begin = date_begin
+        while begin < date_end:
+            payload = {
+                'device_id': device_id,
+                'scale': scale,
+                'type': measure_type,
+                'date_begin': begin,
+                'date_end': date_end,
+                'limit': self.MEASURE_LIMIT,
+                'optimize': 'false',
+                'real_time': 'true',
             }
-            
-            response = requests.post(self.STATION_URL, headers=headers)
-            response.raise_for_status()
-            
-            return response.json()
-            
-        except requests.exceptions.RequestException as e:
-            print(f"✗ Feil ved henting av stasjondata: {e}")
-            return None
+            if module_id:
+                payload['module_id'] = module_id
+            
+            data = self._api_post(self.MEASURE_URL, payload)
+            if data is None:
+                break
+            body = data.get('body') or {}
+            batch = sorted((int(t), values[0]) for t, values in body.items()
+                           if values and values[0] is not None)
+            if not batch:
+                break
+            points.extend(batch)
+            if len(body) < self.MEASURE_LIMIT:
+                break
+            begin = batch[-1][0] + 1
+        
+        return points
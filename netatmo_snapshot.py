@@ -0,0 +1,193 @@
+"""
+Øyeblikksbilde av Netatmo-stasjonene
+Ett getstationsdata-svar tolket én gang til moduler med alle målinger
+(temperatur, fuktighet, CO2, støy, trykk, regn, vind) og tidsstempler,
+for alle stasjoner og hjem på kontoen
+"""
+import time
+from typing import Dict, Iterator, List, Optional
+
+from readings import NETATMO, NETATMO_METRICS, Reading
+
+
+# Felter i dashboard_data som er tidsstempler eller døgnstatistikk, ikke målinger
+_NOT_METRICS = {'time_utc', 'min_temp', 'max_temp', 'date_min_temp', 'date_max_temp',
+                'date_max_wind_str', 'max_wind_str', 'max_wind_angle'}
+
+
+class ModuleReading:
+    """Siste målinger fra én modul (hovedmodulen eller en tilleggsmodul)"""
+
+    def __init__(self, station: dict, module: Optional[dict] = None):
+        """
+        Args:
+            station: Stasjonen fra body.devices
+            module: Tilleggsmodulen fra station['modules'] (None = hovedmodulen)
+        """
+        source = module if module is not None else station
+        dashboard = source.get('dashboard_data') or {}
+
+        self.station_id: str = station['_id']
+        self.station_name: str = station.get('station_name', '')
+        self.home_id: Optional[str] = station.get('home_id')
+        self.home_name: str = station.get('home_name') or self.station_name
+        self.module_id: Optional[str] = module['_id'] if module is not None else None
+        self.type: str = source.get('type', '')
+        if module is not None:
+            self.name: str = module.get('module_name', f"Modul {module.get('_id', 'ukjent')}")
+        else:
+            self.name = station.get('module_name', station.get('station_name', 'Hovedmodul'))
+        self.label: str = self.name  # Unikt visningsnavn (settes av StationSnapshot)
+        self.data_type: List[str] = list(source.get('data_type', []))
+        self.reachable: bool = source.get('reachable', True)
+        self.battery_percent: Optional[int] = source.get('battery_percent')
+        self.time_utc: Optional[int] = dashboard.get('time_utc')
+        self.metrics: Dict[str, float] = {
+            key: value for key, value in dashboard.items()
+            if key not in _NOT_METRICS and isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+        self.trends: Dict[str, str] = {
+            key[:-len('_trend')]: value for key, value in dashboard.items() if key.endswith('_trend')
+        }
+        self.min_temp: Optional[float] = dashboard.get('min_temp')
+        self.max_temp: Optional[float] = dashboard.get('max_temp')
+
+    def __repr__(self) -> str:
+        return f"ModuleReading({self.name!r}, {self.metrics})"
+
+    def get(self, metric: str) -> Optional[float]:
+        """Én måling, f.eks. 'CO2' (None hvis modulen ikke måler den)"""
+        return self.metrics.get(metric)
+
+    @property
+    def temperature(self) -> Optional[float]:
+        return self.metrics.get('Temperature')
+
+    @property
+    def humidity(self) -> Optional[float]:
+        return self.metrics.get('Humidity')
+
+    @property
+    def co2(self) -> Optional[float]:
+        return self.metrics.get('CO2')
+
+    @property
+    def noise(self) -> Optional[float]:
+        return self.metrics.get('Noise')
+
+    @property
+    def pressure(self) -> Optional[float]:
+        return self.metrics.get('Pressure')
+
+    @property
+    def rain(self) -> Optional[float]:
+        return self.metrics.get('Rain')
+
+    def age(self, now: Optional[float] = None) -> Optional[float]:
+        """Sekunder siden modulen sist målte (None hvis ukjent)"""
+        if self.time_utc is None:
+            return None
+        return (time.time() if now is None else now) - self.time_utc
+
+
+class StationSnapshot:
+    """Alle moduler fra alle stasjoner i ett getstationsdata-svar"""
+
+    def __init__(self, modules: List[ModuleReading], fetched_at: Optional[float] = None):
+        """
+        Args:
+            modules: Modulene i rekkefølgen Netatmo returnerer dem
+            fetched_at: Når svaret ble hentet (Unix-tid, standard nå)
+        """
+        self.modules = modules
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self._by_label: Dict[str, ModuleReading] = {}
+
+        # Like modulnavn i flere hjem (f.eks. to "Ute") får hjemmet i parentes
+        counts: Dict[str, int] = {}
+        for module in modules:
+            counts[module.name] = counts.get(module.name, 0) + 1
+        for module in modules:
+            label = module.name
+            if counts[label] > 1:
+                label = f"{module.name} ({module.home_name})"
+                if label in self._by_label:
+                    label = f"{label} {module.module_id or module.station_id}"
+            module.label = label
+            self._by_label[label] = module
+
+    @classmethod
+    def from_response(cls, data: dict, fetched_at: Optional[float] = None) -> 'StationSnapshot':
+        """
+        Tolker svaret fra getstationsdata
+
+        Args:
+            data: JSON-svaret
+            fetched_at: Når svaret ble hentet
+
+        Returns:
+            StationSnapshot (tom hvis svaret ikke har stasjoner)
+        """
+        modules = []
+        for station in (data.get('body') or {}).get('devices') or []:
+            modules.append(ModuleReading(station))
+            for module in station.get('modules', []):
+                modules.append(ModuleReading(station, module))
+        return cls(modules, fetched_at)
+
+    def __len__(self) -> int:
+        return len(self.modules)
+
+    def __iter__(self) -> Iterator[ModuleReading]:
+        return iter(self.modules)
+
+    def module(self, name: str) -> Optional[ModuleReading]:
+        """Modul etter navn (visningsnavnet, eller modulnavnet uten å skille på store/små bokstaver)"""
+        if name in self._by_label:
+            return self._by_label[name]
+        for module in self.modules:
+            if module.name.lower() == name.lower():
+                return module
+        return None
+
+    @property
+    def stations(self) -> List[str]:
+        """Id for hver stasjon i svaret"""
+        return list(dict.fromkeys(module.station_id for module in self.modules))
+
+    def metric(self, metric: str) -> Dict[str, float]:
+        """
+        Én måling for alle moduler som har den
+
+        Args:
+            metric: Navn i dashboard_data, f.eks. 'Temperature', 'CO2' eller 'Humidity'
+
+        Returns:
+            Visningsnavn -> verdi
+        """
+        return {module.label: module.metrics[metric] for module in self.modules if metric in module.metrics}
+
+    def temperatures(self) -> Dict[str, float]:
+        """Temperatur per modul (samme navn som get_all_temperatures alltid har brukt)"""
+        return self.metric('Temperature')
+
+    def readings(self, metrics: Optional[List[str]] = None) -> List[Reading]:
+        """
+        Målingene som Reading-objekter med modulens eget tidsstempel
+
+        Args:
+            metrics: Netatmo-navn som tas med, f.eks. ['CO2', 'Humidity'] (standard bare
+                temperatur - rotasjonen kjenner målingene på visningsnavnet). Navn uten
+                måletype i NETATMO_METRICS hoppes over.
+
+        Returns:
+            Liste i samme rekkefølge som modulene
+        """
+        metrics = ['Temperature'] if metrics is None else [m for m in metrics if m in NETATMO_METRICS]
+        return [
+            Reading(NETATMO, module.module_id or module.station_id, module.label, NETATMO_METRICS[metric],
+                    module.metrics[metric], module.time_utc or self.fetched_at)
+            for module in self.modules
+            for metric in metrics
+            if metric in module.metrics
+        ]
@@ -0,0 +1,171 @@
+"""
+Dagsprofil for strømpris
+Dagens priser (24 timer eller 96 kvarter) tolket én gang til sorterte
+tabeller med starttid, med oppslag på tid (bisect), omregning mellom time-
+og kvartersoppløsning og billigste sammenhengende periode
+"""
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# Standard lengde på billigste periode (timer) - f.eks. for vaskemaskin eller elbil
+CHEAPEST_WINDOW_HOURS = 3
+
+
+class PriceProfile:
+    """Dagens strømpriser med oppslag på tid og billigste periode"""
+
+    def __init__(self, starts: Sequence[float], ends: Sequence[float], prices: Sequence[float],
+                 window_hours: float = CHEAPEST_WINDOW_HOURS):
+        """
+        Args:
+            starts: Starttid for hver periode (Unix-tid, stigende)
+            ends: Sluttid for hver periode (Unix-tid)
+            prices: Pris i øre/kWh for hver periode
+            window_hours: Lengde på billigste periode som regnes ut med en gang
+        """
+        self.starts = array('d', starts)
+        self.ends = array('d', ends)
+        self.prices = array('d', prices)
+        self.window_hours = window_hours
+        self.slot_seconds = (ends[0] - starts[0]) if starts else 3600
+        self._windows: Dict[int, Optional[Tuple[int, int, float]]] = {}
+        self._columns: Dict[int, List[float]] = {}
+        self.cheapest = self.cheapest_window(window_hours)
+
+    @classmethod
+    def from_entries(cls, entries: List[dict], window_hours: float = CHEAPEST_WINDOW_HOURS) -> 'PriceProfile':
+        """
+        Tolker svaret fra hvakosterstrommen.no (tidsstemplene tolkes bare her)
+
+        Args:
+            entries: Liste med {'time_start', 'time_end', 'NOK_per_kWh', ...}
+            window_hours: Lengde på billigste periode
+
+        Returns:
+            PriceProfile sortert på starttid, priser i øre/kWh
+        """
+        rows = sorted(
+            (datetime.fromisoformat(entry['time_start']).timestamp(),
+             datetime.fromisoformat(entry['time_end']).timestamp(),
+             round(entry['NOK_per_kWh'] * 100, 2))  # NOK -> øre/kWh (inkl. mva)
+            for entry in entries
+        )
+        return cls([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], window_hours)
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    @property
+    def resolution(self) -> int:
+        """Minutter per periode (60 eller 15)"""
+        return int(round(self.slot_seconds / 60))
+
+    def price_at(self, timestamp: float) -> Optional[float]:
+        """Pris for perioden som gjelder på tidspunktet (O(log n))"""
+        slot = self.slot_at(timestamp)
+        return None if slot is None else self.prices[slot]
+
+    def resample(self, minutes: int) -> 'PriceProfile':
+        """
+        Samme dag med en annen oppløsning
+
+        Kvarter til time gir snittet av kvarterene, time til kvarter gjentar timeprisen.
+
+        Args:
+            minutes: 60 eller 15
+
+        Returns:
+            Ny PriceProfile (eller denne hvis oppløsningen allerede stemmer)
+        """
+        step = minutes * 60
+        if step == self.slot_seconds or not self.prices:
+            return self
+        starts, ends, prices = [], [], []
+        if step > self.slot_seconds:
+            # Slå sammen perioder med samme start (sommertid-dager kan ha halve grupper)
+            groups: Dict[float, List[int]] = {}
+            for i, start in enumerate(self.starts):
+                groups.setdefault(start - start % step, []).append(i)
+            for group_start, slots in groups.items():
+                starts.append(max(group_start, self.starts[slots[0]]))
+                ends.append(self.ends[slots[-1]])
+                prices.append(round(sum(self.prices[i] for i in slots) / len(slots), 2))
+        else:
+            for start, end, price in zip(self.starts, self.ends, self.prices):
+                t = start
+                while t < end:
+                    starts.append(t)
+                    ends.append(min(t + step, end))
+                    prices.append(price)
+                    t += step
+        return PriceProfile(starts, ends, prices, self.window_hours)
+
+    @property
+    def slots_per_hour(self) -> int:
+        return max(1, int(round(3600 / self.slot_seconds)))
+
+    def slot_at(self, timestamp: float) -> Optional[int]:
+        """Indeks for perioden som gjelder på tidspunktet (None utenfor dagen)"""
+        i = bisect_right(self.starts, timestamp) - 1
+        if i < 0 or timestamp >= self.ends[i]:
+            return None
+        return i
+
+    def cheapest_window(self, hours: float) -> Optional[Tuple[int, int, float]]:
+        """
+        Billigste sammenhengende periode på et antall timer (glidende sum, O(n))
+
+        Args:
+            hours: Lengden på perioden
+
+        Returns:
+            (første indeks, antall perioder, snittpris), eller None hvis dagen er for kort
+        """
+        length = max(1, int(round(hours * self.slots_per_hour)))
+        if length not in self._windows:
+            result = None
+            if length <= len(self.prices):
+                total = sum(self.prices[:length])
+                best, best_start = total, 0
+                for i in range(length, len(self.prices)):
+                    total += self.prices[i] - self.prices[i - length]
+                    if total < best:
+                        best, best_start = total, i - length + 1
+                result = (best_start, length, best / length)
+            self._windows[length] = result
+        return self._windows[length]
+
+    def column_range(self, slot: int, width: int) -> range:
+        """Kolonnene en periode vises i når dagen fordeles på `width` kolonner (tom uten priser)"""
+        n = len(self.prices)
+        if n == 0:
+            return range(0)
+        first = slot * width // n
+        last = max(first, (slot + 1) * width // n - 1)
+        return range(first, last + 1)
+
+    def columns(self, width: int) -> List[float]:
+        """
+        Pris per kolonne - snitt når flere perioder deler kolonne
+        (96 kvarter blir 4 per kolonne på 24 bredde)
+
+        Args:
+            width: Antall kolonner
+
+        Returns:
+            Liste med width priser (tom uten priser)
+        """
+        if width not in self._columns:
+            n = len(self.prices)
+            if n == 0:
+                return []
+            columns = []
+            for c in range(width):
+                first = c * n // width
+                group = self.prices[first:max(first + 1, (c + 1) * n // width)]
+                columns.append(sum(group) / len(group))
+            self._columns[width] = columns
+        return self._columns[width]
@@ -0,0 +1,118 @@
+"""
+Målinger fra alle kilder i én felles type
+Netatmo, Yr og strømpris blir Reading-objekter med kilde, måletype og
+tidsstempel. Visningen velger farge, enhet og ikon fra måletypen i stedet
+for å lete etter ord som "strøm" i lokasjonsnavnet.
+"""
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from colors import (CO2_RAMP, HUMIDITY_RAMP, NOISE_RAMP, PRESSURE_RAMP, RAIN_RAMP, WIND_RAMP, price_color,
+                    temperature_color)
+
+Color = Tuple[int, int, int]
+
+# Kilder
+NETATMO = 'netatmo'
+YR = 'yr'
+ELECTRICITY = 'electricity'
+
+
+class Metric:
+    """Måletype - bestemmer enhet, farge og ikon når en måling vises"""
+
+    __slots__ = ('key', 'unit', 'suffix', 'color', 'icon')
+
+    def __init__(self, key: str, unit: str, suffix: str, color: Callable[[float], Color],
+                 icon: Optional[str] = None):
+        """
+        Args:
+            key: Kort navn, f.eks. 'temperature'
+            unit: Enhet for logg og web, f.eks. '°C'
+            suffix: Tegn etter tallet på displayet ('°' eller ingen)
+            color: Farge for en verdi
+            icon: Fast ikon for måletypen (None = ikon etter lokasjonsnavn)
+        """
+        self.key = key
+        self.unit = unit
+        self.suffix = suffix
+        self.color = color
+        self.icon = icon
+
+    def __repr__(self) -> str:
+        return f"Metric({self.key!r})"
+
+
+TEMPERATURE = Metric('temperature', '°C', '°', temperature_color)
+PRICE = Metric('price', 'øre/kWh', '', price_color, icon='strøm')
+HUMIDITY = Metric('humidity', '%', '', HUMIDITY_RAMP)
+CO2 = Metric('co2', 'ppm', '', CO2_RAMP)
+NOISE = Metric('noise', 'dB', '', NOISE_RAMP)
+PRESSURE = Metric('pressure', 'mbar', '', PRESSURE_RAMP)
+RAIN = Metric('rain', 'mm', '', RAIN_RAMP)
+WIND = Metric('wind', 'km/h', '', WIND_RAMP)
+
+# Netatmo-navn (dashboard_data) -> måletype (vindretning og andre felter uten måletype hoppes over)
+NETATMO_METRICS: Dict[str, Metric] = {
+    'Temperature': TEMPERATURE,
+    'Humidity': HUMIDITY,
+    'CO2': CO2,
+    'Noise': NOISE,
+    'Pressure': PRESSURE,
+    'AbsolutePressure': PRESSURE,
+    'Rain': RAIN,
+    'sum_rain_1': RAIN,
+    'sum_rain_24': RAIN,
+    'WindStrength': WIND,
+    'GustStrength': WIND,
+}
+
+
+class Reading:
+    """Én måling - kompakt (__slots__) siden det lages et sett for hver henting"""
+
+    __slots__ = ('source', 'id', 'name', 'metric', 'value', 'timestamp', 'stale')
+
+    def __init__(self, source: str, id: str, name: str, metric: Metric, value: float,
+                 timestamp: Optional[float] = None, stale: bool = False):
+        """
+        Args:
+            source: Kilde (NETATMO, YR eller ELECTRICITY)
+            id: Stabil id hos kilden (modul-id, koordinater, prisområde)
+            name: Visningsnavn, f.eks. "Stue" eller "Ute (Sokndal)"
+            metric: Måletype (TEMPERATURE, PRICE, ...)
+            value: Verdien
+            timestamp: Når verdien ble målt (Unix-tid, standard nå)
+            stale: True hvis verdien er eldre enn den burde være
+        """
+        self.source = source
+        self.id = id
+        self.name = name
+        self.metric = metric
+        self.value = value
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.stale = stale
+
+    def __repr__(self) -> str:
+        return f"Reading({self.name!r}, {self.describe()})"
+
+    @property
+    def unit(self) -> str:
+        return self.metric.unit
+
+    def age(self, now: Optional[float] = None) -> float:
+        """Sekunder siden målingen"""
+        return (time.time() if now is None else now) - self.timestamp
+
+    def describe(self) -> str:
+        """Verdi med enhet for logg (f.eks. '21.4°C' eller '87.2 øre/kWh')"""
+        separator = '' if self.metric.unit.startswith('°') else ' '
+        text = f"{self.value}{separator}{self.metric.unit}"
+        if self.stale:
+            text += f" (gammel, {self.age() / 60:.0f} min)"
+        return text
+
+
+def by_name(readings: Iterable[Reading]) -> Dict[str, Reading]:
+    """Målinger etter visningsnavn, i samme rekkefølge"""
+    return {reading.name: reading for reading in readings}
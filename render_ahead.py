@@ -0,0 +1,75 @@
+"""
+Render-ahead for rotasjonen
+Mens én måling vises, bygges framene for de neste i rotasjonen. Ved
+byttet sendes bare en ferdig frame - ikoner, sifre og fargetabell er
+allerede gjort, så byttet koster bare selve sendingen.
+"""
+from typing import Dict, List, Optional, Set, Tuple
+
+from readings import Reading
+
+
+# Antall målinger fremover i rotasjonen som holdes ferdig rendret
+RENDER_AHEAD = 2
+
+
+class RenderAhead:
+    """Ferdige frames for de neste målingene (bakbuffer) - sendt frame er frontbufferen"""
+
+    def __init__(self, twinkly, depth: int = RENDER_AHEAD):
+        """
+        Args:
+            twinkly: TwinklySquare framene bygges for
+            depth: Antall målinger fremover som rendres
+        """
+        self.twinkly = twinkly
+        self.depth = depth
+        self._frames: Dict[str, Tuple[tuple, bytes]] = {}  # Navn -> (nøkkel, frame)
+        self.hits = 0    # Bytter som bare sendte en ferdig frame
+        self.misses = 0  # Bytter som måtte rendre først (ny verdi, lysstyrke, layout eller ikon)
+        twinkly.icons.add_listener(self._icons_changed)
+
+    def _icons_changed(self, changed: Set[str]):
+        # Kalles fra ikonovervåkingen - neste bytte rendrer med nytt ikon
+        self._frames = {}
+
+    def _key(self, reading: Reading) -> tuple:
+        # Alt som påvirker framen - layout og fargetabell byttes ut, aldri endres
+        return (reading.value, reading.stale, reading.metric, self.twinkly.layout, self.twinkly.colors.table)
+
+    def _matches(self, key: tuple, cached: tuple) -> bool:
+        return key[:3] == cached[:3] and key[3] is cached[3] and key[4] is cached[4]
+
+    def prepare(self, readings: List[Reading]):
+        """
+        Rendrer målingene som kommer (kalles fra render-tråden mens forrige vises)
+
+        Args:
+            readings: De neste målingene i rotasjonen, i rekkefølge
+        """
+        frames = {}
+        for reading in readings[:self.depth]:
+            key = self._key(reading)
+            cached = self._frames.get(reading.name)
+            if cached is None or not self._matches(key, cached[0]):
+                frame = self.twinkly.render_reading(reading)
+                if frame is None:
+                    continue
+                cached = (key, frame)
+            frames[reading.name] = cached
+        self._frames = frames
+
+    def take(self, reading: Reading) -> Optional[bytes]:
+        """
+        Frame for målingen som skal vises nå
+
+        Returns:
+            Ferdig frame hvis den er rendret på forhånd og fortsatt gjelder,
+            ellers rendres den her (None ved feil)
+        """
+        cached = self._frames.pop(reading.name, None)
+        if cached is not None and self._matches(self._key(reading), cached[0]):
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        return self.twinkly.render_reading(reading)
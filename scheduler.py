@@ -0,0 +1,188 @@
+"""
+Hendelsesplanlegger for render- og hentetrådene
+Uavhengige tidtakere (henting per kilde, rotasjon, keep-alive, state og
+klokke) i én sortert kø. Tråden sover til neste frist i stedet for å våkne
+hvert sekund, og klokken tegnes nøyaktig når minuttet skifter.
+"""
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+import metrics
+
+
+def next_minute(now: Optional[float] = None) -> float:
+    """Unix-tid for neste hele minutt (norsk tid har hele minutter mot UTC)"""
+    now = time.time() if now is None else now
+    return (now // 60 + 1) * 60
+
+
+class Timer:
+    """Én tidtaker i planleggeren"""
+
+    def __init__(self, name: str, callback: Callable[[], Optional[float]], deadline: float,
+                 interval: Optional[float] = None, align: bool = False):
+        """
+        Args:
+            name: Navn (logg og status)
+            callback: Kalles ved fristen. Returnerer den et tall, er det sekunder til neste kjøring
+            deadline: Første frist (Unix-tid)
+            interval: Sekunder mellom kjøringer (None = bare én gang, med mindre callback gir ny tid)
+            align: Legg kjøringene på hele multipler av interval (f.eks. hvert minuttskifte)
+        """
+        self.name = name
+        self.callback = callback
+        self.deadline = deadline
+        self.interval = interval
+        self.align = align
+        self.runs = 0
+        self.cancelled = False
+        self._generation = 0  # Eldre køoppføringer for tidtakeren hoppes over
+
+    def __repr__(self) -> str:
+        return f"Timer({self.name!r}, om {self.deadline - time.time():.1f}s)"
+
+    def next_deadline(self, now: float, delay: Optional[float]) -> Optional[float]:
+        if delay is not None:
+            return now + max(0.0, delay)
+        if self.interval is None:
+            return None
+        if self.align:
+            return (now // self.interval + 1) * self.interval
+        return now + self.interval
+
+
+class Scheduler:
+    """Tidtakere i en heap - run() sover til neste frist"""
+
+    def __init__(self, name: str = 'scheduler'):
+        """
+        Args:
+            name: Navn (brukes i logg)
+        """
+        self.name = name
+        self.wakeups = 0  # Ganger tråden har våknet
+        self.timers_run = 0
+        self._heap: List[Tuple[float, int, int, Timer]] = []  # (frist, rekkefølge, generasjon, tidtaker)
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        metrics.counter('twinkly_scheduler_wakeups_total', 'Ganger planleggertråden har våknet',
+                        fn=lambda: self.wakeups, scheduler=name)
+        metrics.counter('twinkly_scheduler_timers_run_total', 'Tidtakere kjørt',
+                        fn=lambda: self.timers_run, scheduler=name)
+
+    def _push(self, timer: Timer):
+        heapq.heappush(self._heap, (timer.deadline, next(self._order), timer._generation, timer))
+
+    def call_at(self, deadline: float, callback: Callable[[], Optional[float]], name: str = '',
+                interval: Optional[float] = None, align: bool = False) -> Timer:
+        """Kjører callback ved en Unix-tid (se Timer for interval og align)"""
+        timer = Timer(name or getattr(callback, '__name__', 'timer'), callback, deadline, interval, align)
+        with self._lock:
+            self._push(timer)
+        self._wake.set()
+        return timer
+
+    def call_later(self, delay: float, callback: Callable[[], Optional[float]], name: str = '') -> Timer:
+        """Kjører callback én gang om delay sekunder"""
+        return self.call_at(time.time() + delay, callback, name)
+
+    def every(self, interval: float, callback: Callable[[], Optional[float]], name: str = '',
+              align: bool = False, first: Optional[float] = None) -> Timer:
+        """
+        Kjører callback hvert interval sekund
+
+        Args:
+            interval: Sekunder mellom kjøringene
+            callback: Kan returnere sekunder til neste kjøring for å overstyre interval
+            name: Navn
+            align: Legg kjøringene på hele multipler av interval (every(60, ..., align=True) = hvert minuttskifte)
+            first: Første frist (standard nå, eller neste multippel med align)
+        """
+        now = time.time()
+        if first is None:
+            first = (now // interval + 1) * interval if align else now
+        return self.call_at(first, callback, name, interval, align)
+
+    def reschedule(self, timer: Timer, deadline: Optional[float] = None):
+        """Flytter fristen til en tidtaker (standard nå) - brukes når noe har endret seg"""
+        with self._lock:
+            timer.deadline = time.time() if deadline is None else deadline
+            timer.cancelled = False
+            timer._generation += 1
+            self._push(timer)
+        self._wake.set()
+
+    def cancel(self, timer: Timer):
+        with self._lock:
+            timer.cancelled = True
+            timer._generation += 1
+
+    def next_deadline(self) -> Optional[float]:
+        """Tidligste gyldige frist (None hvis ingen tidtakere)"""
+        with self._lock:
+            while self._heap:
+                deadline, _, generation, timer = self._heap[0]
+                if timer.cancelled or generation != timer._generation:
+                    heapq.heappop(self._heap)
+                    continue
+                return deadline
+        return None
+
+    def run_pending(self, now: Optional[float] = None) -> int:
+        """
+        Kjører alle tidtakere som har passert fristen
+
+        Returns:
+            Antall tidtakere som ble kjørt
+        """
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, generation, timer = heapq.heappop(self._heap)
+                if not timer.cancelled and generation == timer._generation:
+                    due.append(timer)
+
+        for timer in due:
+            # Unntak går videre til run() - tråden stopper som før med "Uventet feil"
+            delay = timer.callback()
+            timer.runs += 1
+            self.timers_run += 1
+            with self._lock:
+                # Tidtakeren kan ha blitt flyttet eller stoppet fra callbacken
+                if timer.cancelled or timer.deadline > now:
+                    continue
+                if isinstance(delay, bool) or not isinstance(delay, (int, float)):
+                    delay = None
+                deadline = timer.next_deadline(time.time(), delay)
+                if deadline is None:
+                    timer.cancelled = True
+                    continue
+                timer.deadline = deadline
+                timer._generation += 1
+                self._push(timer)
+        return len(due)
+
+    def wake(self):
+        """Vekker run() slik at fristene sjekkes med en gang"""
+        self._wake.set()
+
+    def run(self):
+        """Kjører tidtakerne til stop() kalles - sover mellom fristene"""
+        while not self._stopped:
+            self._wake.clear()
+            self.run_pending()
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else deadline - time.time()
+            if timeout is None or timeout > 0:
+                self._wake.wait(timeout)
+                self.wakeups += 1
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
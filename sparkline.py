@@ -0,0 +1,152 @@
+"""
+Sparkline over de siste timene for én sensor
+Tegnes inkrementelt: når et nytt tidsintervall er ferdig skyves kolonnene
+ett hakk og bare den nye kolonnen tegnes. Skalaen regnes bare om når et
+nytt ytterpunkt kommer inn eller det gamle faller ut av vinduet.
+"""
+from collections import deque
+from typing import Callable, List, Optional, Tuple
+
+Color = Tuple[int, int, int]
+
+# Søylen under toppunktet tegnes med denne andelen av fargen
+BAR_DIM = 0.25
+
+
+class SlidingExtremes:
+    """Min og maks over de siste `size` verdiene med monotone køer (amortisert O(1))"""
+
+    def __init__(self, size: int):
+        """
+        Args:
+            size: Antall verdier i vinduet
+        """
+        self.size = size
+        self._index = 0
+        self._min: deque = deque()  # (indeks, verdi) med stigende verdier
+        self._max: deque = deque()  # (indeks, verdi) med synkende verdier
+
+    @property
+    def min(self) -> Optional[float]:
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max(self) -> Optional[float]:
+        return self._max[0][1] if self._max else None
+
+    def push(self, value: Optional[float]) -> bool:
+        """
+        Skyver en ny verdi inn i vinduet (None = hull)
+
+        Returns:
+            True hvis min eller maks endret seg
+        """
+        before = (self.min, self.max)
+        index = self._index
+        self._index += 1
+
+        if value is not None:
+            while self._min and self._min[-1][1] >= value:
+                self._min.pop()
+            self._min.append((index, value))
+            while self._max and self._max[-1][1] <= value:
+                self._max.pop()
+            self._max.append((index, value))
+
+        # Fjern verdier som har falt ut av vinduet
+        oldest = index - self.size
+        while self._min and self._min[0][0] <= oldest:
+            self._min.popleft()
+        while self._max and self._max[0][0] <= oldest:
+            self._max.popleft()
+
+        return (self.min, self.max) != before
+
+
+class Sparkline:
+    """Kolonnebuffer for en sparkline - én kolonne per tidsintervall"""
+
+    def __init__(self, width: int, rows: int, hours: float, color: Callable[[float], Color]):
+        """
+        Args:
+            width: Antall kolonner (displayets bredde)
+            rows: Høyde på grafen i piksler
+            hours: Antall timer grafen viser
+            color: Farge for en verdi (f.eks. colors.temperature_color)
+        """
+        self.width = width
+        self.rows = rows
+        self.hours = hours
+        self.color = color
+        self.bucket = hours * 3600 / width  # Sekunder per kolonne
+        self.values: deque = deque([None] * width, maxlen=width)
+        self.columns: deque = deque([[None] * rows] * width, maxlen=width)
+        self.extremes = SlidingExtremes(width)
+        self.last_bucket: Optional[int] = None  # Siste ferdige intervall som er tegnet
+        self.full_redraws = 0
+        self.shifts = 0
+
+    def _level(self, value: float) -> int:
+        low, high = self.extremes.min, self.extremes.max
+        if high == low:
+            return self.rows // 2
+        return int(round((value - low) / (high - low) * (self.rows - 1)))
+
+    def _draw_column(self, value: Optional[float]) -> list:
+        """Piksler for én kolonne, øverst først (None = tomt)"""
+        column = [None] * self.rows
+        if value is None:
+            return column
+        color = self.color(value)
+        bar = tuple(int(c * BAR_DIM) for c in color)
+        top = self.rows - 1 - self._level(value)
+        column[top] = color
+        for row in range(top + 1, self.rows):
+            column[row] = bar
+        return column
+
+    def update(self, series, now: float) -> bool:
+        """
+        Tar inn intervaller som er ferdige siden forrige kall
+
+        Args:
+            series: history.SeriesBuffer for sensoren
+            now: Nåværende Unix-tid
+
+        Returns:
+            True hvis grafen endret seg
+        """
+        completed = int(now // self.bucket) - 1
+        first = completed - self.width + 1
+        if self.last_bucket is not None:
+            first = max(first, self.last_bucket + 1)
+        if first > completed:
+            return False
+
+        # Én spørring for alle nye intervaller - siste måling i hvert intervall brukes
+        latest = {}
+        for timestamp, value in series.range(first * self.bucket, (completed + 1) * self.bucket - 1):
+            latest[int(timestamp // self.bucket)] = value
+
+        scale_changed = False
+        new_values = []
+        for bucket in range(first, completed + 1):
+            value = latest.get(bucket)
+            scale_changed |= self.extremes.push(value)
+            new_values.append(value)
+        self.last_bucket = completed
+
+        self.values.extend(new_values)
+        if scale_changed:
+            # Nytt ytterpunkt inn eller ut av vinduet - alle kolonner tegnes med ny skala
+            self.columns.extend(self._draw_column(value) for value in self.values)
+            self.full_redraws += 1
+        else:
+            # Skyv bufferen og tegn bare de nye kolonnene
+            self.columns.extend(self._draw_column(value) for value in new_values)
+            self.shifts += len(new_values)
+        return True
+
+    def sprite(self) -> List[list]:
+        """Grafen som 2D liste (rows x width) for Layer.paint"""
+        return [[column[row] for column in self.columns] for row in range(self.rows)]
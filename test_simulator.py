@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Test av sendeveien mot twinkly_simulator.py
+Ekte TwinklySquare (xled over HTTP og UDP) mot simulatoren på samme maskin
+
+Kjør: python3 -m unittest test_simulator
+"""
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from device_cache import DeviceCache
+from layout_cache import LayoutCache
+from twinkly_client import TwinklySquare
+from twinkly_simulator import TwinklySimulator
+
+
+class SimulatorSendTest(unittest.TestCase):
+
+    def setUp(self):
+        # Ledige porter, og egne cacher så prosjektets cachefiler ikke røres
+        self.simulator = TwinklySimulator(http_port=0, udp_port=0)
+        self.simulator.start()
+        self.addCleanup(self.simulator.stop)
+        cache_dir = Path(tempfile.mkdtemp(prefix='twinkly-test-'))
+        self.twinkly = TwinklySquare(ip_address=self.simulator.address, rt_port=self.simulator.udp_port,
+                                     device_cache=DeviceCache(cache_dir / 'devices.json'),
+                                     layout_cache=LayoutCache(cache_dir / 'layouts'),
+                                     use_movies=False)
+
+    def test_frames_reach_simulator(self):
+        self.assertTrue(self.twinkly.connect())
+        self.assertTrue(self.twinkly.set_mode_rt())
+        for temperature in (-3.0, 21.5, 8.2):
+            self.assertTrue(self.twinkly.show_temperature(temperature))
+
+        # UDP-tråden i simulatoren teller pakkene litt etter sending
+        deadline = time.time() + 2
+        while self.simulator.stats()['frames_received'] < 3 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertGreater(self.simulator.stats()['frames_received'], 0)
+        self.assertEqual(self.simulator.stats()['mode'], 'rt')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,12 +2,54 @@
 Twinkly Square Display Client
 Viser tall og mønstre på Twinkly Square
 """
-from xled.discover import discover
 from xled.control import HighControlInterface
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
+import functools
+import math
+import socket
 import time
 import io
-from icons import get_icon_for_location
+import threading
+from itertools import islice
+from icon_store import IconStore
+from led_layout import LedLayout, layout_checksum
+from device_cache import (DeviceCache, claim_device, discover_in_background, normalize_mac, release_device,
+                          verify_device, DISCOVERY_TIMEOUT)
+from layout_cache import LayoutCache, layout_identity
+from effects import EFFECTS
+from movies import MovieLibrary
+from colors import GAMMA, ColorPipeline, clock_colors, price_color, temperature_color
+from sparkline import Sparkline
+from readings import TEMPERATURE, Metric, Reading
+import metrics
+
+
+# Port xled sender realtime-frames til
+REALTIME_UDP_PORT = 7777
+
+# Twinkly går ut av realtime-modus når den ikke har fått frames på så lenge
+RT_TIMEOUT = 60.0
+# Siste frame sendes på nytt når denne andelen av timeouten har gått uten sending
+KEEP_ALIVE_FRACTION = 0.5
+# Hvor ofte modus sjekkes (fanger opp bytte fra appen eller knappen på enheten)
+MODE_CHECK_INTERVAL = 300.0
+
+# Gamle verdier (API nede lenger enn maks alder) vises dempet med grått ikon
+ICON_COLOR = (20, 20, 40)  # Mørk blå/grå for subtil bakgrunn
+STALE_ICON_COLOR = (14, 14, 14)
+STALE_DIM = 0.35
+
+# Driftsmålinger (se metrics.py) - felles for alle enheter i prosessen
+FRAME_CREATE = metrics.histogram('twinkly_frame_create_seconds',
+                                 'Tid for å bygge en frame (mapping, gamma og lysstyrke)')
+FRAME_SEND = metrics.histogram('twinkly_frame_send_seconds', 'Tid for å sende en frame over UDP')
+FRAMES_SENT = metrics.counter('twinkly_frames_sent_total', 'Frames sendt til Twinkly')
+SEND_FAILURES = metrics.counter('twinkly_send_failures_total',
+                                'Frames som ikke ble sendt (bufres til linken er oppe)')
+PATTERNS_SHOWN = metrics.counter('twinkly_patterns_shown_total', 'Mønstre vist med show_pattern')
+FRAME_CACHE = {result: metrics.counter('twinkly_frame_cache_total',
+                                       'Scene-frames gjenbrukt (hit) eller bygget på nytt (miss)', result=result)
+               for result in ('hit', 'miss')}
 
 
 # 5x7 font for siffer (0-9) og spesialtegn - kompakt for 24 pixler bredde
@@ -132,59 +174,524 @@ DIGIT_FONT = {
     ]
 }
 
+# Kolon i klokken: 1 piksel bred, prikker på rad 2 og 4 av sifrene
+COLON_GLYPH = [[0], [0], [1], [0], [1], [0], [0]]
+
+
+class RealtimeUDPClient:
+    """
+    Sender realtime-frames over UDP fra en tilfeldig lokal port
+
+    xled sin UDPClient binder den lokale socketen til samme port som den
+    sender til. Mot twinkly_simulator.py på samme maskin er den porten
+    allerede tatt av simulatoren ("Address already in use").
+    """
+
+    def __init__(self, port: int, host: str):
+        """
+        Args:
+            port: UDP-port hos enheten
+            host: IP-adressen til enheten
+        """
+        self.port = port
+        self.host = host
+        self._socket: Optional[socket.socket] = None
+
+    def send(self, message: bytes) -> int:
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.bind(('', 0))
+        return self._socket.sendto(message, (self.host, self.port))
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+def _with_state_lock(method):
+    """Holder layout og scener i ro mens metoden tegner (connect() bytter dem fra en annen tråd)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._state_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# Et rektangel (x0, y0, x1, y1) med x1/y1 eksklusive
+Region = Tuple[int, int, int, int]
+
+
+class Layer:
+    """Ett lag i en Compositor - None-piksler er gjennomsiktige"""
+    
+    def __init__(self, compositor: 'Compositor', name: str, z: int, alpha: float = 1.0,
+                 static: bool = False):
+        """
+        Args:
+            compositor: Compositor laget tilhører
+            name: Navn på laget
+            z: Rekkefølge - høyere z tegnes over lavere
+            alpha: Dekkevne 0.0-1.0 for lagets synlige piksler
+            static: Laget endres sjelden og caches sammen med statiske lag under det
+        """
+        self.compositor = compositor
+        self.name = name
+        self.z = z
+        self.alpha = alpha
+        self.static = static
+        self.pixels = [[None] * compositor.width for _ in range(compositor.height)]
+    
+    def paint(self, sprite: list, x: int = 0, y: int = 0,
+              color: Optional[Tuple[int, int, int]] = None) -> bool:
+        """
+        Tegner et utsnitt inn i laget og erstatter pikslene der
+        
+        Bare området der noe faktisk endret seg markeres som skittent -
+        å tegne det samme sifferet på nytt koster ingen rekomponering.
+        
+        Args:
+            sprite: 2D liste med RGB tupler/None, eller 0/1 verdier sammen med color
+            x: Venstre kant i laget
+            y: Øvre kant i laget
+            color: Farge for 1-verdier (0 blir gjennomsiktig)
+        
+        Returns:
+            True hvis noe endret seg
+        """
+        width, height = self.compositor.width, self.compositor.height
+        x0 = y0 = None
+        x1 = y1 = 0
+        for dy, row in enumerate(sprite):
+            py = y + dy
+            if not 0 <= py < height:
+                continue
+            line = self.pixels[py]
+            for dx, value in enumerate(row):
+                px = x + dx
+                if not 0 <= px < width:
+                    continue
+                if color is not None:
+                    value = color if value else None
+                if line[px] != value:
+                    line[px] = value
+                    x0 = px if x0 is None else min(x0, px)
+                    y0 = py if y0 is None else y0
+                    x1 = max(x1, px + 1)
+                    y1 = py + 1
+        if x0 is None:
+            return False
+        self.compositor.mark_dirty((x0, y0, x1, y1), self)
+        return True
+    
+    def clear(self) -> bool:
+        """Gjør hele laget gjennomsiktig"""
+        blank = [[None] * self.compositor.width for _ in range(self.compositor.height)]
+        return self.paint(blank)
+    
+    def set_alpha(self, alpha: float):
+        """Endrer dekkevnen (hele laget tegnes på nytt)"""
+        alpha = max(0.0, min(1.0, alpha))
+        if alpha != self.alpha:
+            self.alpha = alpha
+            self.compositor.mark_dirty(self.compositor.full_region, self)
+
+
+class Compositor:
+    """
+    Setter sammen navngitte lag til ett canvas
+    
+    Holder på forrige resultat og rekomponerer bare skitne områder. Statiske
+    lag nederst i stabelen (f.eks. ikonbakgrunnen) flates ut til en egen
+    cache som bare bygges på nytt når et av dem endres.
+    """
+    
+    def __init__(self, width: int, height: int, background: Tuple[int, int, int] = (0, 0, 0)):
+        """
+        Args:
+            width: Bredde i piksler
+            height: Høyde i piksler
+            background: Farge der ingen lag har piksler
+        """
+        self.width = width
+        self.height = height
+        self.background = background
+        self.full_region: Region = (0, 0, width, height)
+        self.layers: List[Layer] = []
+        self._by_name: Dict[str, Layer] = {}
+        self._base = [[background] * width for _ in range(height)]  # Utflatede statiske lag
+        self.canvas = [[background] * width for _ in range(height)]  # Siste resultat
+        self._dirty: List[Region] = []
+        self._base_dirty: List[Region] = []
+        self._base_count = 0  # Antall lag nederst som inngår i _base
+        self.frame: Optional[bytes] = None  # Ferdig frame for canvas (settes av TwinklySquare)
+        self.frame_key = None
+    
+    def layer(self, name: str, z: int = 0, alpha: float = 1.0, static: bool = False) -> Layer:
+        """
+        Henter et lag, og lager det første gang
+        
+        Args:
+            name: Navn på laget
+            z: Rekkefølge for nytt lag
+            alpha: Dekkevne for nytt lag
+            static: Om et nytt lag er statisk
+        
+        Returns:
+            Laget
+        """
+        layer = self._by_name.get(name)
+        if layer is None:
+            layer = Layer(self, name, z, alpha, static)
+            self._by_name[name] = layer
+            self.layers.append(layer)
+            self._restack()
+        return layer
+    
+    def remove_layer(self, name: str):
+        """Fjerner et lag"""
+        layer = self._by_name.pop(name, None)
+        if layer is not None:
+            self.layers.remove(layer)
+            self._restack()
+    
+    def _restack(self):
+        self.layers.sort(key=lambda layer: layer.z)
+        self._base_count = 0
+        for layer in self.layers:
+            if not layer.static:
+                break
+            self._base_count += 1
+        self._base_dirty = [self.full_region]
+        self._dirty = [self.full_region]
+    
+    def mark_dirty(self, region: Region, layer: Optional[Layer] = None):
+        """
+        Markerer et område som må rekomponeres
+        
+        Args:
+            region: (x0, y0, x1, y1)
+            layer: Laget som endret seg (None = ukjent, bygg også statisk cache)
+        """
+        if layer is None or self.layers.index(layer) < self._base_count:
+            self._base_dirty.append(region)
+        self._dirty.append(region)
+        self.frame = None
+    
+    @property
+    def dirty(self) -> bool:
+        """True hvis canvas må rekomponeres"""
+        return bool(self._dirty)
+    
+    def _blend(self, below: Tuple[int, int, int], layer: Layer, x: int, y: int) -> Tuple[int, int, int]:
+        value = layer.pixels[y][x]
+        if value is None:
+            return below
+        alpha = layer.alpha
+        if alpha >= 1.0:
+            return value
+        return tuple(int(b + (v - b) * alpha) for b, v in zip(below, value))
+    
+    def composite(self) -> list:
+        """
+        Rekomponerer skitne områder
+        
+        Returns:
+            Canvas (height x width) - eies av compositoren og skal ikke endres
+        """
+        base_layers = self.layers[:self._base_count]
+        for x0, y0, x1, y1 in self._base_dirty:
+            for y in range(y0, y1):
+                row = self._base[y]
+                for x in range(x0, x1):
+                    pixel = self.background
+                    for layer in base_layers:
+                        pixel = self._blend(pixel, layer, x, y)
+                    row[x] = pixel
+        
+        top_layers = self.layers[self._base_count:]
+        for x0, y0, x1, y1 in self._dirty:
+            for y in range(y0, y1):
+                base_row = self._base[y]
+                row = self.canvas[y]
+                for x in range(x0, x1):
+                    pixel = base_row[x]
+                    for layer in top_layers:
+                        pixel = self._blend(pixel, layer, x, y)
+                    row[x] = pixel
+        
+        self._base_dirty = []
+        self._dirty = []
+        return self.canvas
+
 
 class TwinklySquare:
     """Klient for å kommunisere med Twinkly Square"""
     
-    def __init__(self, ip_address: Optional[str] = None):
+    def __init__(self, ip_address: Optional[str] = None, icon_store: Optional[IconStore] = None,
+                 rt_port: int = REALTIME_UDP_PORT, device_cache: Optional[DeviceCache] = None,
+                 layout_cache: Optional[LayoutCache] = None, rt_timeout: float = RT_TIMEOUT,
+                 use_movies: bool = True, gamma: float = GAMMA, brightness: float = 1.0):
         """
         Initialiserer Twinkly Square klienten
         
         Args:
-            ip_address: IP-adressen til Twinkly Square (auto-discover hvis None)
+            ip_address: IP-adressen til Twinkly Square (auto-discover hvis None).
+                        Kan være "ip:port" for å bruke twinkly_simulator.py
+            icon_store: Delt ikonlager (lager et eget hvis None)
+            rt_port: UDP-port for realtime frames
+            device_cache: Cache over kjente enheter (brukes når ip_address er None)
+            layout_cache: Cache over kompilerte LED layouts
+            rt_timeout: Sekunder uten frames før enheten forlater realtime-modus
+            use_movies: Spill animasjoner som filmer lagret på enheten (strømmes ellers)
+            gamma: Gammakorreksjon for LEDs (1.0 = av)
+            brightness: Lysstyrke 0.0-1.0
         """
+        self.configured_ip = ip_address
         self.ip_address = ip_address
+        self.mac: Optional[str] = None  # Settes ved første tilkobling
+        self.device_cache = device_cache or DeviceCache()
+        self.layout_cache = layout_cache or LayoutCache()
+        self.rt_port = rt_port
         self.control: Optional[HighControlInterface] = None
-        self.width = 24  # 3 paneler bredt (3 x 8)
-        self.height = 16  # 2 paneler høyt (2 x 8)
-        self.led_layout = None  # LED koordinater fra Twinkly
+        self.led_layout = None  # LED koordinater fra Twinkly (None når layout kom fra cache)
+        # Rutenett og LED -> piksel mapping, utledet fra led_layout ved connect
+        self.layout = LedLayout.row_major()
+        self.layout_checksum: Optional[str] = None
+        
+        # Gamma og lysstyrke som én 256-tabell - brukes på hele framen i create_frame
+        self.colors = ColorPipeline(gamma, brightness)
+        
+        # Settes til False av ConnectionSupervisor når forbindelsen er brutt.
+        # Frames bufres da i last_frame og sendes når linken er oppe igjen
+        self.link_up = True
+        self.last_frame: Optional[bytes] = None
+        self._send_lock = threading.Lock()
+        
+        # Keep-alive: realtime-modus settes via HTTP bare når enheten faktisk
+        # har falt ut (sendefeil, for lenge siden siste frame, eller annen modus)
+        self.rt_timeout = rt_timeout
+        self.last_sent_at = 0.0  # time.monotonic() for siste frame/rt-aktivering
+        self._rt_needed = True
+        self._last_mode_check = 0.0
+        
+        # Animasjoner lastes opp som filmer og spilles av på enheten
+        self.use_movies = use_movies
+        self.movies = MovieLibrary(self)
+        
+        # Ikoner lastes på nytt når icons.py endres - bakgrunner med ikon
+        # caches per ikonnavn og kastes kun for ikonene som endret seg
+        self.icons = icon_store or IconStore()
+        self.icons.add_listener(self._invalidate_icon_backgrounds)
+        self._icon_backgrounds = {}
+        
+        # Layout, scener og ikonbakgrunner byttes av connect() i supervisor-tråden
+        # mens render-tråden tegner - begge holder denne låsen
+        self._state_lock = threading.RLock()
+        
+        # Én compositor per scene - lag og ferdig frame beholdes mellom visninger
+        self._scenes: Dict[str, Compositor] = {}
+        self._sparklines: Dict[str, Sparkline] = {}
+        self._price_bars_for = None  # (profil, bredde, høyde) søylene er tegnet for
+        self._forecast_drawn_for = None  # (prognose, første rad, timer, bredde, høyde)
+    
+    @property
+    def width(self) -> int:
+        """Antall piksler i bredden (fra LED layout)"""
+        return self.layout.width
+    
+    @property
+    def height(self) -> int:
+        """Antall piksler i høyden (fra LED layout)"""
+        return self.layout.height
+    
+    def _invalidate_icon_backgrounds(self, changed: Set[str]):
+        """Fjerner cachede ikonbakgrunner for endrede ikoner"""
+        for name in changed:
+            self._icon_backgrounds.pop(name, None)
+    
+    def _icon_background(self, location_name: str, icon_color: Tuple[int, int, int],
+                         icon: Optional[str] = None) -> list:
+        """
+        Henter canvas med bakgrunnsikon for lokasjonen (cachet per ikon)
+        
+        Args:
+            location_name: Navn på lokasjonen
+            icon_color: RGB farge for ikonet
+            icon: Fast ikon fra måletypen (None = ikon etter lokasjonsnavn)
+        
+        Returns:
+            Cachet 2D liste - skal ikke endres (tegnes inn i et lag)
+        """
+        icon_name, mask = self.icons.lookup(location_name, icon)
+        cached = self._icon_backgrounds.get(icon_name)
+        
+        # Masken er en del av nøkkelen slik at en bakgrunn bygget fra en
+        # gammel maske aldri brukes etter at ikonet er byttet ut
+        if cached is None or cached[0] is not mask or cached[1] != icon_color:
+            background = [[(0, 0, 0) for _ in range(self.width)] for _ in range(self.height)]
+            for x, y in mask:
+                if 0 <= x < self.width and 0 <= y < self.height:
+                    background[y][x] = icon_color
+            cached = (mask, icon_color, background)
+            self._icon_backgrounds[icon_name] = cached
+        
+        return cached[2]
+    
+    def _find_cached_device(self) -> Optional[str]:
+        """
+        Finner en cachet enhet som svarer på sin siste kjente IP
+        
+        Etter første tilkobling prøves bare samme enhet (MAC) igjen. Før det
+        hoppes enheter en annen TwinklySquare i prosessen har koblet til over.
+        
+        Returns:
+            IP-adressen, eller None hvis ingen cachet enhet svarte
+        """
+        for mac, entry in self.device_cache.candidates(self.mac, owner=self):
+            gestalt = verify_device(entry['ip'])
+            if gestalt and normalize_mac(gestalt.get('mac')) == mac:
+                return entry['ip']
+        return None
+    
+    def _resolve_ip(self) -> Optional[str]:
+        """
+        Finner IP-adressen til enheten når TWINKLY_IP ikke er satt
+        
+        Sjekker cachet IP med ett gestalt-kall. Fullt søk kjøres bare i
+        bakgrunnen når det feiler - neste connect() plukker opp resultatet.
+        Uten noe i cachen (første oppstart) ventes det på søket.
+        
+        Returns:
+            IP-adressen, eller None hvis enheten ikke ble funnet nå
+        """
+        ip_address = self._find_cached_device()
+        if ip_address:
+            return ip_address
+        
+        discovery = discover_in_background(self.device_cache)
+        if not self.device_cache.candidates(self.mac, owner=self):
+            discovery.join(DISCOVERY_TIMEOUT + 1)
+            return self._find_cached_device()
+        return None
+    
+    def _firmware_version(self) -> Optional[str]:
+        try:
+            return self.control.firmware_version().get('version')
+        except Exception:
+            return None
     
-    def connect(self) -> bool:
+    def _load_layout(self, device_info: dict, refresh: bool = False) -> Tuple[LedLayout, Optional[list], Optional[str]]:
+        """
+        Finner layouten - fra cachen hvis enheten rapporterer samme oppsett
+        
+        Setter ingenting selv - connect() bytter inn resultatet under låsen.
+        
+        Args:
+            device_info: Gestalt-svaret fra enheten
+            refresh: Last ned layout selv om cachet versjon finnes
+        
+        Returns:
+            (layout, LED koordinater eller None, layout-sjekksum eller None)
+        """
+        identity = layout_identity(device_info)
+        cached = self.device_cache.get(self.mac) if self.mac else None
+        if not refresh and cached and cached.get('layout_hash'):
+            layout = self.layout_cache.load(self.mac, cached['layout_hash'], identity)
+            if layout is not None:
+                print(f"✓ Bruker cachet LED layout med {layout.led_count} LEDs")
+                return layout, None, cached['layout_hash']
+        
+        # Hent LED layout (koordinater) og utled rutenettet fra det
+        try:
+            response = self.control.get_led_layout()
+            if 'coordinates' in response:
+                led_layout = response['coordinates']
+                layout = LedLayout.from_coordinates(led_layout)
+                checksum = layout_checksum(led_layout)
+                print(f"✓ Hentet LED layout med {len(led_layout)} LEDs")
+                if layout.collisions:
+                    print(f"⚠ {len(layout.collisions)} piksler har mer enn én LED")
+                if self.mac:
+                    self.layout_cache.save(self.mac, checksum, identity, layout)
+                return layout, led_layout, checksum
+        except Exception as e:
+            print(f"⚠ Kunne ikke hente LED layout: {e}")
+            print("  Bruker standard rekkefølge")
+            return LedLayout.row_major(led_count=device_info.get('number_of_led', 384)), None, None
+        # Svar uten koordinater - behold layouten vi har
+        return self.layout, self.led_layout, self.layout_checksum
+    
+    def connect(self, refresh_layout: bool = False) -> bool:
         """
         Kobler til Twinkly Square
         
+        Args:
+            refresh_layout: Last ned LED layout selv om en cachet versjon finnes
+        
         Returns:
             True hvis tilkobling var vellykket
         """
         try:
-            if not self.ip_address:
-                print("Søker etter Twinkly enheter...")
-                devices = discover()
-                if not devices:
-                    print("✗ Ingen Twinkly enheter funnet")
+            if not self.configured_ip:
+                ip_address = self._resolve_ip()
+                if not ip_address:
+                    print("✗ Fant ikke Twinkly (søker videre i bakgrunnen)")
                     return False
-                self.ip_address = devices[0].ip_address
-                print(f"✓ Fant Twinkly på {self.ip_address}")
+                if ip_address != self.ip_address:
+                    print(f"✓ Fant Twinkly på {ip_address}")
+                self.ip_address = ip_address
             
             self.control = HighControlInterface(self.ip_address)
             
+            # xled sender UDP til selve host-strengen på fast port. Med "ip:port"
+            # (simulator) eller egen rt-port må UDP-klienten settes opp selv
+            host = self.ip_address.rsplit(':', 1)[0] if ':' in self.ip_address else self.ip_address
+            if host != self.ip_address or self.rt_port != REALTIME_UDP_PORT:
+                self.control._udpclient = RealtimeUDPClient(self.rt_port, host)
+            
             # Hent enhetsinformasjon for å verifisere tilkobling
             device_info = self.control.get_device_info()
             total_leds = device_info.get('number_of_led', 384)
+            mac = normalize_mac(device_info.get('mac'))
+            if mac and not claim_device(mac, self):
+                if not self.configured_ip:
+                    # En annen enhet i oppsettet rakk å ta den - neste forsøk leter videre
+                    print(f"✗ Twinkly på {self.ip_address} brukes allerede av en annen enhet i oppsettet")
+                    self.ip_address = None
+                    self.control = None
+                    return False
+                print(f"⚠ Twinkly på {self.ip_address} er satt opp mer enn én gang")
+            if mac and self.mac and mac != self.mac:
+                release_device(self.mac, self)
+            self.mac = mac or self.mac
             
-            # Hent LED layout (koordinater)
-            try:
-                layout = self.control.get_led_layout()
-                if 'coordinates' in layout:
-                    self.led_layout = layout['coordinates']
-                    print(f"✓ Hentet LED layout med {len(self.led_layout)} LEDs")
-            except Exception as e:
-                print(f"⚠ Kunne ikke hente LED layout: {e}")
-                print(f"  Bruker standard rekkefølge")
+            layout, led_layout, checksum = self._load_layout(device_info, refresh=refresh_layout)
+            
+            # Ny layout inn, og bakgrunner og scener fra forrige tilkobling (kan ha feil
+            # størrelse) ut, i ett - render-tråden tegner aldri med en blanding
+            with self._state_lock:
+                self.layout = layout
+                self.led_layout = led_layout
+                self.layout_checksum = checksum
+                self._icon_backgrounds = {}
+                self._scenes = {}
+                self._sparklines = {}
+                self._price_bars_for = None
+                self._forecast_drawn_for = None
+            
+            # Husk enheten slik at neste tilkobling slipper å søke
+            if self.mac:
+                self.device_cache.remember(
+                    self.mac, self.ip_address,
+                    firmware=self._firmware_version(),
+                    layout_hash=self.layout_checksum,
+                    device_name=device_info.get('device_name')
+                )
             
             print(f"✓ Koblet til Twinkly array (totalt {total_leds} LEDs)")
-            print(f"  Layout: {self.width}x{self.height} ({self.width//8}x{self.height//8} paneler)")
-            print(f"  Kontrollpanel: midten nederst")
+            print(f"  Layout: {self.layout.describe()}")
+            print("  Kontrollpanel: midten nederst")
             return True
             
         except Exception as e:
@@ -200,12 +707,18 @@ class TwinklySquare:
         """
         try:
             self.control.set_mode("rt")
+            now = time.monotonic()
+            self._rt_needed = False
+            self.last_sent_at = now
+            self._last_mode_check = now
             return True
         except Exception as e:
             print(f"✗ Feil ved setting av realtime modus: {e}")
+            self._rt_needed = True
             return False
     
-    def create_frame(self, pattern: list) -> list:
+    @_with_state_lock
+    def create_frame(self, pattern: list) -> bytes:
         """
         Lager en frame fra et 2D mønster, mapper korrekt til Twinkly LEDs
         
@@ -213,57 +726,120 @@ class TwinklySquare:
             pattern: 2D liste med RGB tupler eller 0/1 verdier
         
         Returns:
-            Liste med RGB verdier for alle LEDs i Twinkly sin rekkefølge
-        """
-        if self.led_layout is None:
-            # Fallback til enkel rad-for-rad mapping
-            frame = []
-            for row in pattern:
-                for pixel in row:
-                    if isinstance(pixel, tuple):
-                        frame.extend(pixel)
-                    elif pixel == 1:
-                        frame.extend([255, 255, 255])
-                    else:
-                        frame.extend([0, 0, 0])
-            
-            total_pixels = self.width * self.height
-            while len(frame) < total_pixels * 3:
-                frame.extend([0, 0, 0])
-            return frame[:total_pixels * 3]
-        
-        # Bruk LED layout for korrekt mapping
-        frame = [(0, 0, 0)] * len(self.led_layout)
-        
-        for led_idx, coord in enumerate(self.led_layout):
-            # Twinkly koordinater: x går fra -1 til 1, y går fra 0 til 1
-            # Konverter til pikselkoordinater:
-            # x: -1 til 1 -> 0 til 23 (24 piksler bredt)
-            # y: 0 til 1 -> 0 til 15 (16 piksler høyt)
-            x = int((coord['x'] + 1.0) / 2.0 * self.width)
-            y = int((1.0 - coord['y']) * self.height)  # Inverterer Y - Twinkly Y=0 er bunn, vi vil ha topp
-            
-            # Begrens til gyldige koordinater
-            x = max(0, min(x, self.width - 1))
-            y = max(0, min(y, self.height - 1))
-            
-            # Sjekk at koordinater er innenfor bounds
-            if 0 <= y < len(pattern) and 0 <= x < len(pattern[0]):
-                pixel = pattern[y][x]
-                if isinstance(pixel, tuple):
-                    frame[led_idx] = pixel
-                elif pixel == 1:
-                    frame[led_idx] = (255, 255, 255)
-                else:
-                    frame[led_idx] = (0, 0, 0)
+            RGB bytes for alle LEDs i Twinkly sin rekkefølge, med gamma og lysstyrke
+        """
+        start = time.perf_counter()
+        frame = self.colors.apply(self.layout.frame_bytes(pattern))
+        FRAME_CREATE.observe(time.perf_counter() - start)
+        return frame
+    
+    def set_brightness(self, brightness: float) -> bool:
+        """
+        Endrer lysstyrken (f.eks. nattdemping)
+        
+        Bytter bare fargetabellen - neste frame får den nye lysstyrken.
+        
+        Args:
+            brightness: Lysstyrke 0.0-1.0
+        
+        Returns:
+            True hvis lysstyrken endret seg
+        """
+        return self.colors.set_brightness(brightness)
+    
+    def send_frame(self, frame: bytes) -> bool:
+        """
+        Sender en ferdig frame, eller bufrer den mens linken er nede
+        
+        Args:
+            frame: RGB bytes fra create_frame()
+        
+        Returns:
+            True hvis framen ble sendt
+        """
+        with self._send_lock:
+            self.last_frame = frame
+            if not self.link_up:
+                SEND_FAILURES.inc()
+                return False
+            try:
+                if not self.control:
+                    print("✗ Ikke koblet til Twinkly")
+                    SEND_FAILURES.inc()
+                    return False
+                
+                # Enheten har forlatt realtime-modus - sett den tilbake først
+                if self._rt_needed or time.monotonic() - self.last_sent_at >= self.rt_timeout:
+                    if not self.set_mode_rt():
+                        SEND_FAILURES.inc()
+                        return False
+                
+                # Konverter til BytesIO objekt som xled forventer
+                start = time.perf_counter()
+                frame_io = io.BytesIO(frame)
+                self.control.set_rt_frame_socket(frame_io, 3)  # version 3 for RGB
+                FRAME_SEND.observe(time.perf_counter() - start)
+                FRAMES_SENT.inc()
+                self.last_sent_at = time.monotonic()
+                return True
+                
+            except Exception as e:
+                print(f"✗ Feil ved visning av mønster: {e}")
+                SEND_FAILURES.inc()
+                # Realtime-modus settes på nytt ved neste sending
+                self._rt_needed = True
+                return False
+    
+    def rt_mode_lost(self):
+        """Markerer at enheten ikke lenger er i realtime-modus (f.eks. etter film)"""
+        self._rt_needed = True
+    
+    def flush_last_frame(self) -> bool:
+        """Sender siste bufrede frame på nytt (etter reconnect)"""
+        if self.last_frame is None:
+            return True
+        return self.send_frame(self.last_frame)
+    
+    def keep_alive_due_in(self) -> float:
+        """Sekunder til keep_alive() har noe å gjøre"""
+        if not self.link_up or self.control is None or self.last_frame is None:
+            return self.rt_timeout
+        now = time.monotonic()
+        due = min(self.last_sent_at + self.rt_timeout * KEEP_ALIVE_FRACTION,
+                  self._last_mode_check + MODE_CHECK_INTERVAL)
+        return max(0.0, due - now)
+    
+    def keep_alive(self) -> bool:
+        """
+        Holder realtime-modus i live mellom oppdateringer
+        
+        Sender siste frame på nytt over UDP før enheten ville gått ut av
+        realtime-modus, og sjekker av og til at ingen har byttet modus.
+        Kalles ofte fra render-løkken - gjør ingenting før det trengs.
         
-        # Konverter til flat liste
-        result = []
-        for r, g, b in frame:
-            result.extend([r, g, b])
+        Returns:
+            False hvis enheten ikke svarte
+        """
+        if not self.link_up or self.control is None or self.last_frame is None:
+            return True
         
-        return result
+        now = time.monotonic()
+        if now - self._last_mode_check >= MODE_CHECK_INTERVAL:
+            self._last_mode_check = now
+            try:
+                mode = self.control.get_mode().get('mode')
+            except Exception as e:
+                print(f"✗ Kunne ikke hente modus fra Twinkly: {e}")
+                return False
+            if mode and mode != 'rt':
+                print(f"⚠ Twinkly er i modus '{mode}' - setter realtime-modus igjen")
+                self._rt_needed = True
+        
+        if self._rt_needed or now - self.last_sent_at >= self.rt_timeout * KEEP_ALIVE_FRACTION:
+            return self.flush_last_frame()
+        return True
     
+    @_with_state_lock
     def show_pattern(self, pattern: list) -> bool:
         """
         Viser et mønster på Twinkly Square
@@ -274,25 +850,121 @@ class TwinklySquare:
         Returns:
             True hvis vellykket
         """
+        PATTERNS_SHOWN.inc()
         try:
-            if not self.control:
-                print("✗ Ikke koblet til Twinkly")
-                return False
-            
             frame = self.create_frame(pattern)
-            # Konverter til BytesIO objekt som xled forventer
-            frame_io = io.BytesIO(bytes(frame))
-            self.control.set_rt_frame_socket(frame_io, 3)  # version 3 for RGB
-            return True
-            
         except Exception as e:
             print(f"✗ Feil ved visning av mønster: {e}")
-            # Prøv å reaktivere realtime-modus
-            try:
-                self.set_mode_rt()
-            except:
-                pass
             return False
+        return self.send_frame(frame)
+    
+    def scene(self, name: str) -> Compositor:
+        """
+        Compositor for en scene (lages første gang, og på nytt hvis størrelsen endres)
+        
+        Args:
+            name: Navn på scenen
+        
+        Returns:
+            Compositor med scenens lag
+        """
+        compositor = self._scenes.get(name)
+        if compositor is None or (compositor.width, compositor.height) != (self.width, self.height):
+            compositor = Compositor(self.width, self.height)
+            self._scenes[name] = compositor
+        return compositor
+    
+    @_with_state_lock
+    def render_compositor(self, compositor: Compositor) -> Optional[bytes]:
+        """
+        Ferdig frame for en scene - bare skitne områder rekomponeres
+        
+        Framen caches i compositoren, så en uendret scene bygges ikke på
+        nytt (med mindre layout eller lysstyrke er byttet).
+        
+        Args:
+            compositor: Scenen
+        
+        Returns:
+            RGB bytes, eller None ved feil
+        """
+        key = (self.layout, self.colors.table)
+        if compositor.dirty or compositor.frame is None or \
+                any(a is not b for a, b in zip(compositor.frame_key, key)):
+            FRAME_CACHE['miss'].inc()
+            try:
+                compositor.frame = self.create_frame(compositor.composite())
+            except Exception as e:
+                print(f"✗ Feil ved visning av mønster: {e}")
+                return None
+            compositor.frame_key = key
+        else:
+            FRAME_CACHE['hit'].inc()
+        return compositor.frame
+    
+    def show_compositor(self, compositor: Compositor) -> bool:
+        """
+        Viser en scene (se render_compositor)
+        
+        Args:
+            compositor: Scenen som skal vises
+        
+        Returns:
+            True hvis vellykket
+        """
+        frame = self.render_compositor(compositor)
+        return frame is not None and self.send_frame(frame)
+    
+    def _text_sprite(self, chars: list, color: Tuple[int, int, int], start_y: int) -> list:
+        """
+        Tekst sentrert i bredden som et lag-utsnitt i full størrelse (None = tomt)
+        
+        Args:
+            chars: Tegn fra DIGIT_FONT
+            color: RGB farge for teksten
+            start_y: Øvre kant for teksten
+        
+        Returns:
+            2D liste (height x width)
+        """
+        sprite = [[None] * self.width for _ in range(self.height)]
+        
+        # Beregn total bredde av teksten
+        total_width = 0
+        for i, char in enumerate(chars):
+            if char in DIGIT_FONT:
+                if char == '.':
+                    total_width += 3  # Punktum: bare 2 bred + 1 mellomrom
+                else:
+                    # Sjekk om neste tegn er punktum
+                    next_char = chars[i + 1] if i + 1 < len(chars) else None
+                    if next_char == '.':
+                        total_width += 5  # Kutt 1 piksel før punktum
+                    else:
+                        total_width += 6  # 5 piksler bred font + 1 mellomrom
+        
+        x_offset = (self.width - total_width) // 2 + 1
+        for i, char in enumerate(chars):
+            if char in DIGIT_FONT:
+                for y, row in enumerate(DIGIT_FONT[char]):
+                    for x, pixel in enumerate(row):
+                        if pixel == 1:
+                            canvas_y = start_y + y
+                            canvas_x = x_offset + x
+                            if 0 <= canvas_x < self.width and 0 <= canvas_y < self.height:
+                                sprite[canvas_y][canvas_x] = color
+                
+                # Juster offset basert på tegntype og neste tegn
+                if char == '.':
+                    x_offset += 3  # Punktum får mindre plass
+                else:
+                    next_char = chars[i + 1] if i + 1 < len(chars) else None
+                    if next_char == '.':
+                        x_offset += 5  # Kun 5 piksler før punktum (kutt 1 piksel mellomrom)
+                    else:
+                        x_offset += 6  # 5 bred + 1 mellomrom
+        
+        return sprite
     
     def render_temperature(self, temperature: float, color: Tuple[int, int, int] = (255, 100, 0)) -> list:
         """
@@ -305,7 +977,7 @@ class TwinklySquare:
         Returns:
             2D liste med mønsteret for displayet
         """
-        # Lag tomt canvas (24x16)
+        # Lag tomt canvas
         canvas = [[(0, 0, 0) for _ in range(self.width)] for _ in range(self.height)]
         
         # Formater temperatur (avrund til heltall)
@@ -328,7 +1000,7 @@ class TwinklySquare:
                     else:
                         total_width += 6  # 5 piksler + 1 mellomrom
         
-        # Sentrer teksten horisontalt og vertikalt på 24x16 displayet
+        # Sentrer teksten horisontalt og vertikalt på displayet
         start_x = (self.width - total_width) // 2 + 1  # +1 for å flytte 1 piksel til høyre
         start_y = (self.height - 7) // 2  # 7 høyt nå
         
@@ -359,6 +1031,7 @@ class TwinklySquare:
         
         return canvas
     
+    @_with_state_lock
     def show_temperature(self, temperature: float) -> bool:
         """
         Viser temperaturen på Twinkly Square
@@ -369,122 +1042,218 @@ class TwinklySquare:
         Returns:
             True hvis vellykket
         """
-        # Velg farge basert på temperatur
-        if temperature < 0:
-            color = (0, 100, 255)  # Blå for kaldt
-        elif temperature < 10:
-            color = (0, 200, 255)  # Lyseblå
-        elif temperature < 20:
-            color = (255, 200, 0)  # Gul
-        else:
-            color = (255, 50, 0)  # Rød/oransje for varmt
-        
-        pattern = self.render_temperature(temperature, color)
+        # Farge fra temperaturskalaen (blå - lyseblå - gul - rød)
+        pattern = self.render_temperature(temperature, temperature_color(temperature))
         return self.show_pattern(pattern)
     
-    def show_temperature_with_icon(self, temperature: float, location_name: str) -> bool:
+    @_with_state_lock
+    def show_temperature_with_icon(self, temperature: float, location_name: str,
+                                   metric: Metric = TEMPERATURE, stale: bool = False) -> bool:
         """
         Viser temperaturen med et lokasjon-ikon på Twinkly Square
-        For strømpris vises tall uten °C
+        For strømpris (metric=PRICE) vises tall uten °C
         
         Args:
             temperature: Temperaturen (eller strømprisen) som skal vises
             location_name: Navn på lokasjonen
+            metric: Måletype - gir farge, tegn etter tallet og eventuelt fast ikon
+            stale: Verdien er gammel - vises dempet med grått ikon
         
         Returns:
             True hvis vellykket
         """
-        # Sjekk om det er strømpris
-        is_electricity = 'strøm' in location_name.lower() or 'electricity' in location_name.lower()
-        
-        # Velg farge basert på verdi
-        if is_electricity:
-            # Fargekoding for strømpris (øre/kWh)
-            if temperature < 50:
-                temp_color = (0, 255, 0)  # Grønn (billig)
-            elif temperature < 100:
-                temp_color = (255, 200, 0)  # Gul (middels)
-            else:
-                temp_color = (255, 0, 0)  # Rød (dyrt)
-        else:
-            # Fargekoding for temperatur
-            if temperature < 0:
-                temp_color = (0, 100, 255)  # Blå for kaldt
-            elif temperature < 10:
-                temp_color = (0, 200, 255)  # Lyseblå
-            elif temperature < 20:
-                temp_color = (255, 200, 0)  # Gul
-            else:
-                temp_color = (255, 50, 0)  # Rød/oransje for varmt
-        
-        # Hent bakgrunnsikon for lokasjonen (24x16)
-        icon = get_icon_for_location(location_name)
-        
-        # Lag canvas med bakgrunnsikon
-        canvas = [[(0, 0, 0) for _ in range(self.width)] for _ in range(self.height)]
-        icon_color = (20, 20, 40)  # Mørk blå/grå for subtil bakgrunn
+        compositor = self.scene('temperature')
+        self._paint_value(compositor, temperature, location_name, metric, stale)
+        return self.show_compositor(compositor)
+    
+    def _paint_value(self, compositor: Compositor, temperature: float, location_name: str,
+                     metric: Metric, stale: bool):
+        """Tegner ikon og verdi inn i en scene (se show_temperature_with_icon)"""
+        # Farge fra måletypens skala (temperatur: blå - rød, strømpris: grønn - gul - rød)
+        temp_color = metric.color(temperature)
+        icon_color = ICON_COLOR
+        if stale:
+            temp_color = tuple(int(c * STALE_DIM) for c in temp_color)
+            icon_color = STALE_ICON_COLOR
         
-        # Tegn bakgrunnsikon over hele skjermen
-        for y in range(len(icon)):
-            for x in range(len(icon[0])):
-                if icon[y][x] == 1:
-                    canvas[y][x] = icon_color
+        # Ikonet er et statisk lag under verdien - det bygges bare på nytt
+        # når lokasjonen (ikonet) byttes, og bare sifre som endres tegnes om
+        compositor.layer('icon', z=0, static=True).paint(
+            self._icon_background(location_name, icon_color, metric.icon))
         
-        # Formater verdi - vis 1 desimal for både temp og strømpris
-        display_str = f"{temperature:.1f}"
+        # Formater verdi - vis 1 desimal for både temp og strømpris, ° bare for temperatur
+        chars_to_display = list(f"{temperature:.1f}{metric.suffix}")
         
-        # Beregn total bredde av teksten
-        if is_electricity:
-            # For strømpris: bare tall (med eventuell desimal)
-            chars_to_display = list(display_str)
-        else:
-            # For temperatur: tall + °
-            chars_to_display = list(display_str) + ['°']
+        # Sentrer verdien på skjermen
+        start_y = (self.height - 7) // 2
+        compositor.layer('value', z=10).paint(self._text_sprite(chars_to_display, temp_color, start_y))
+    
+    def show_reading(self, reading: Reading) -> bool:
+        """
+        Viser en måling med ikon - farge og enhet følger måletypen
         
-        total_width = 0
-        for i, char in enumerate(chars_to_display):
-            if char in DIGIT_FONT:
-                if char == '.':
-                    total_width += 3  # Punktum: bare 2 bred + 1 mellomrom
-                else:
-                    # Sjekk om neste tegn er punktum
-                    next_char = chars_to_display[i + 1] if i + 1 < len(chars_to_display) else None
-                    if next_char == '.':
-                        total_width += 5  # Kutt 1 piksel før punktum
-                    else:
-                        total_width += 6  # 5 piksler bred font + 1 mellomrom
+        Args:
+            reading: readings.Reading
         
-        # Sentrer temperatur på skjermen
-        start_x = (self.width - total_width) // 2 + 1
-        start_y = (self.height - 7) // 2
+        Returns:
+            True hvis vellykket
+        """
+        return self.show_temperature_with_icon(reading.value, reading.name, reading.metric, reading.stale)
+    
+    @_with_state_lock
+    def render_reading(self, reading: Reading) -> Optional[bytes]:
+        """
+        Ferdig frame for en måling uten å sende den (render-ahead i rotasjonen)
         
-        # Tegn temperatur OVER bakgrunnen
-        x_offset = start_x
-        for i, char in enumerate(chars_to_display):
-            if char in DIGIT_FONT:
-                digit = DIGIT_FONT[char]
-                
-                for y, row in enumerate(digit):
-                    for x, pixel in enumerate(row):
-                        if pixel == 1:
-                            canvas_y = start_y + y
-                            canvas_x = x_offset + x
-                            if 0 <= canvas_x < self.width and 0 <= canvas_y < self.height:
-                                canvas[canvas_y][canvas_x] = temp_color
+        Hver lokasjon har sin egen scene, så ikonlaget er ferdig tegnet neste
+        gang lokasjonen kommer, og en uendret verdi gir samme frame uten arbeid.
+        
+        Args:
+            reading: readings.Reading
+        
+        Returns:
+            RGB bytes for send_frame(), eller None ved feil
+        """
+        compositor = self.scene(f"reading:{reading.name}")
+        self._paint_value(compositor, reading.value, reading.name, reading.metric, reading.stale)
+        return self.render_compositor(compositor)
+    
+    @_with_state_lock
+    def show_trend(self, location_name: str, series, value: float, hours: float = 6,
+                   metric: Metric = TEMPERATURE) -> bool:
+        """
+        Viser sparkline for de siste timene med nåværende verdi over
+        
+        Grafen holdes per lokasjon og oppdateres inkrementelt - bare nye
+        kolonner tegnes, med mindre skalaen (min/maks i vinduet) endres.
+        
+        Args:
+            location_name: Navn på lokasjonen
+            series: history.SeriesBuffer med målingene for lokasjonen
+            value: Nåværende verdi (vises som tall øverst)
+            hours: Antall timer grafen viser
+            metric: Måletype (farge og tegn etter tallet)
+        
+        Returns:
+            True hvis vellykket
+        """
+        color_for = metric.color
+        
+        # Tallet øverst (7 rader) og grafen under en tom rad
+        graph_top = 8
+        rows = max(1, self.height - graph_top)
+        sparkline = self._sparklines.get(location_name)
+        if sparkline is None or (sparkline.width, sparkline.rows, sparkline.hours) != (self.width, rows, hours):
+            sparkline = Sparkline(self.width, rows, hours, color_for)
+            self._sparklines[location_name] = sparkline
+        
+        compositor = self.scene(f"trend:{location_name}")
+        if sparkline.update(series, time.time()):
+            compositor.layer('graph', z=0).paint(sparkline.sprite(), 0, graph_top)
+        
+        chars_to_display = list(f"{value:.1f}{metric.suffix}")
+        compositor.layer('value', z=10).paint(self._text_sprite(chars_to_display, color_for(value), 0))
+        
+        return self.show_compositor(compositor)
+    
+    @_with_state_lock
+    def show_price_profile(self, profile, now: Optional[float] = None) -> bool:
+        """
+        Viser dagens strømpriser som søyler med nåværende periode uthevet
+        
+        Søylene og markeringen av billigste periode (nederste rad) tegnes én
+        gang per profil. Senere kall flytter bare uthevingen når perioden skifter.
+        
+        Args:
+            profile: price_profile.PriceProfile for dagen
+            now: Tidspunkt som utheves (standard nå)
+        
+        Returns:
+            True hvis vellykket
+        """
+        compositor = self.scene('prices')
+        rows = self.height - 1  # Nederste rad markerer billigste periode
+        columns = profile.columns(self.width)
+        top_price = max(max(columns, default=0), 1)
+        heights = [max(1, int(round(price / top_price * rows))) for price in columns]
+        
+        if self._price_bars_for != (profile, self.width, self.height):
+            bars = [[None] * self.width for _ in range(self.height)]
+            for x, (price, height) in enumerate(zip(columns, heights)):
+                color = price_color(price)
+                for y in range(rows - height, rows):
+                    bars[y][x] = color
+            if profile.cheapest:
+                first, length, _ = profile.cheapest
+                for slot in range(first, first + length):
+                    for x in profile.column_range(slot, self.width):
+                        bars[self.height - 1][x] = (0, 255, 0)
+            compositor.layer('bars', z=0, static=True).paint(bars)
+            self._price_bars_for = (profile, self.width, self.height)
+        
+        # Uthevingen er hvit over søylen med halv dekkevne
+        highlight = [[None] * self.width for _ in range(self.height)]
+        slot = profile.slot_at(time.time() if now is None else now)
+        if slot is not None:
+            for x in profile.column_range(slot, self.width):
+                for y in range(rows - heights[x], rows):
+                    highlight[y][x] = (255, 255, 255)
+        compositor.layer('highlight', z=10, alpha=0.5).paint(highlight)
+        
+        return self.show_compositor(compositor)
+    
+    @_with_state_lock
+    def show_forecast_timeline(self, forecast, hours: float = 24, now: Optional[float] = None) -> bool:
+        """
+        Viser prognosen for de neste timene: temperatur som kurve og nedbør som søyler
+        
+        Kolonne 0 er timen nå. Tegnes bare på nytt når prognosen eller timen endres.
+        
+        Args:
+            forecast: yr_client.Forecast
+            hours: Antall timer tidslinjen dekker
+            now: Unix-tid (standard nå)
+        
+        Returns:
+            True hvis vellykket
+        """
+        now = time.time() if now is None else now
+        compositor = self.scene('forecast')
+        first = forecast.index_at(now)
+        if first is None:
+            return False
+        
+        key = (forecast, first, hours, self.width, self.height)
+        if self._forecast_drawn_for != key:
+            precipitation_rows = 4  # Nederste rader viser nedbør (0,5 mm per piksel)
+            temperature_rows = self.height - precipitation_rows
+            start = forecast.times[first]
+            indexes = [forecast.index_at(start + x * hours * 3600 / self.width) for x in range(self.width)]
+            temperatures = [forecast.temperature[i] for i in indexes]
+            known = [t for t in temperatures if t == t]  # NaN er ulik seg selv
+            low, high = (min(known), max(known)) if known else (0.0, 0.0)
+            
+            curve = [[None] * self.width for _ in range(self.height)]
+            bars = [[None] * self.width for _ in range(self.height)]
+            for x, index in enumerate(indexes):
+                temperature = temperatures[x]
+                if temperature == temperature:
+                    level = temperature_rows // 2 if high == low else \
+                        int(round((temperature - low) / (high - low) * (temperature_rows - 1)))
+                    curve[temperature_rows - 1 - level][x] = temperature_color(temperature)
                 
-                # Juster offset basert på tegntype og neste tegn
-                if char == '.':
-                    x_offset += 3  # Punktum får mindre plass
-                else:
-                    # Sjekk om neste tegn er punktum
-                    next_char = chars_to_display[i + 1] if i + 1 < len(chars_to_display) else None
-                    if next_char == '.':
-                        x_offset += 5  # Kun 5 piksler før punktum (kutt 1 piksel mellomrom)
-                    else:
-                        x_offset += 6  # 5 bred + 1 mellomrom
+                amount = forecast.precipitation[index]
+                filled = min(precipitation_rows, int(math.ceil(amount * 2))) if amount == amount else 0
+                for y in range(self.height - filled, self.height):
+                    bars[y][x] = (0, 80, 255)
+            
+            compositor.layer('precipitation', z=0).paint(bars)
+            compositor.layer('temperature', z=10).paint(curve)
+            self._forecast_drawn_for = key
         
-        return self.show_pattern(canvas)
+        return self.show_compositor(compositor)
     
+    @_with_state_lock
     def show_clock(self, hours: int, minutes: int) -> bool:
         """
         Viser en fancy digital klokke på Twinkly Square (HH:MM format)
@@ -499,83 +1268,106 @@ class TwinklySquare:
         # Formater tid som HH:MM
         time_str = f"{hours:02d}:{minutes:02d}"
         
-        # Klokkefarger - gradient fra blå til oransje basert på tid på døgnet
-        # Hvert siffer får sin egen farge
-        if 0 <= hours < 6:
-            # Natt (midnatt til 06:00): Mørke kalde farger
-            digit_colors = [
-                (20, 40, 150),   # Mørk blå
-                (80, 20, 120),   # Lilla
-                (20, 100, 150),  # Cyan-blå
-                (100, 40, 150)   # Lys lilla
-            ]
-            colon_color = (150, 40, 150)  # Lilla/magenta kontrast
-        elif 6 <= hours < 12:
-            # Morgen (06:00 til 12:00): Friske morgenfarger
-            blend = (hours - 6) / 6
-            digit_colors = [
-                (50, 150, 255),   # Lys blå
-                (100, 200, 200),  # Turkis
-                (200, 220, 100),  # Gul-grønn
-                (255, 200, 50)    # Gul
-            ]
-            colon_color = (255, 100, 150)  # Rosa kontrast
-        elif 12 <= hours < 18:
-            # Ettermiddag (12:00 til 18:00): Varme solfarger
-            digit_colors = [
-                (255, 200, 0),    # Gul
-                (255, 150, 0),    # Oransje
-                (255, 100, 50),   # Rød-oransje
-                (255, 200, 100)   # Lys oransje
-            ]
-            colon_color = (0, 200, 255)  # Cyan kontrast
-        else:
-            # Kveld (18:00 til midnatt): Solnedgangsfarger
-            digit_colors = [
-                (255, 100, 0),    # Oransje
-                (200, 50, 100),   # Rød-lilla
-                (150, 100, 200),  # Lilla-blå
-                (100, 150, 255)   # Blå
-            ]
-            colon_color = (150, 255, 100)  # Lime grønn kontrast
-        
-        # Lag canvas
-        canvas = [[(0, 0, 0) for _ in range(self.width)] for _ in range(self.height)]
+        # Klokkefarger - glir fra natt (kalde) via morgen og ettermiddag til
+        # kveld (solnedgang). Hvert siffer får sin egen farge
+        digit_colors, colon_color = clock_colors(hours, minutes)
+        
+        compositor = self.scene('clock')
+        self._paint_clock(compositor.layer('clock', z=10), time_str, digit_colors, colon_color,
+                          (self.height - 7) // 2)
+        return self.show_compositor(compositor)
+    
+    @_with_state_lock
+    def show_clock_with_temperature(self, hours: int, minutes: int, temperature: float,
+                                    location_name: str, metric: Metric = TEMPERATURE,
+                                    stale: bool = False) -> bool:
+        """
+        Delt scene: klokke øverst og temperatur (eller strømpris) nederst
+        
+        Args:
+            hours: Timer (0-23)
+            minutes: Minutter (0-59)
+            temperature: Verdien som vises under klokken
+            location_name: Navn på lokasjonen verdien kommer fra
+            metric: Måletype (farge og tegn etter tallet)
+            stale: Verdien er gammel - vises dempet
+        
+        Returns:
+            True hvis vellykket
+        """
+        color = metric.color(temperature)
+        if stale:
+            color = tuple(int(c * STALE_DIM) for c in color)
+        chars_to_display = list(f"{int(round(temperature))}{metric.suffix}")
+        
+        digit_colors, colon_color = clock_colors(hours, minutes)
+        compositor = self.scene('clock_split')
+        self._paint_clock(compositor.layer('clock', z=10), f"{hours:02d}:{minutes:02d}",
+                          digit_colors, colon_color, 0)
+        compositor.layer('value', z=10).paint(
+            self._text_sprite(chars_to_display, color, max(8, self.height - 7)))
+        return self.show_compositor(compositor)
+    
+    def _paint_clock(self, layer: Layer, time_str: str, digit_colors: list,
+                     colon_color: Tuple[int, int, int], start_y: int):
+        """
+        Tegner HH:MM inn i et lag - hvert siffer for seg
+        
+        Sifrene står på faste plasser, så et minutt-tikk gjør bare
+        sifrene som faktisk endret seg skitne.
         
-        # Tegn tiden - kompakt layout for 24 bred display
+        Args:
+            layer: Laget klokken tegnes i
+            time_str: Tiden som "HH:MM"
+            digit_colors: Farge for hvert av de 4 sifrene
+            colon_color: Farge på kolon
+            start_y: Øvre kant for sifrene
+        """
+        # Tegn tiden - kompakt layout, sentrert i bredden
         # HH:MM = 2 siffer + kolon + 2 siffer
         # Layout: 5 bred siffer + kolon 1 bred + 5 bred siffer
         # Total: 5 + 5 + 1 + 5 + 5 = 21 bred (med 3 piksler marger totalt)
-        
-        start_y = (self.height - 7) // 2
-        x_offset = 2  # Start x-posisjon (sentrert: (24-21)/2 ≈ 1.5)
+        x_offset = (self.width - 21 + 1) // 2  # Start x-posisjon (2 på 24 bred display)
         digit_index = 0  # Teller for hvilken farge vi skal bruke
         
-        for i, char in enumerate(time_str):
+        for char in time_str:
             if char == ':':
-                # Tegn kolon (to prikker) - 1 piksel bred
-                # Øvre prikk
-                canvas[start_y + 2][x_offset] = colon_color
-                # Nedre prikk
-                canvas[start_y + 4][x_offset] = colon_color
+                # Kolon (to prikker) - 1 piksel bred
+                layer.paint(COLON_GLYPH, x_offset, start_y, colon_color)
                 x_offset += 1  # 1 piksel kolon
             elif char in DIGIT_FONT:
-                digit = DIGIT_FONT[char]
+                # Hele 5x7-ruten tegnes slik at forrige siffer viskes ut
                 current_color = digit_colors[digit_index % len(digit_colors)]
-                
-                # Tegn siffer (full 5 piksel bredde)
-                for y, row in enumerate(digit):
-                    for x in range(len(row)):  # Alle 5 piksler
-                        if row[x] == 1:
-                            canvas_y = start_y + y
-                            canvas_x = x_offset + x
-                            if 0 <= canvas_x < self.width and 0 <= canvas_y < self.height:
-                                canvas[canvas_y][canvas_x] = current_color
-                
+                layer.paint(DIGIT_FONT[char], x_offset, start_y, current_color)
                 x_offset += 5  # 5 piksler siffer (ingen mellomrom)
                 digit_index += 1  # Neste farge for neste siffer
+    
+    def play_effect(self, effect_name: str, duration: float = 3) -> bool:
+        """
+        Spiller en effekt fra effects.py
         
-        return self.show_pattern(canvas)
+        Effekten spilles som film på enheten når det støttes (lastes opp
+        første gang), ellers strømmes den frame for frame.
+        
+        Args:
+            effect_name: Nøkkel i effects.EFFECTS
+            duration: Varighet i sekunder
+        
+        Returns:
+            True hvis effekten ble vist
+        """
+        effect = EFFECTS[effect_name]
+        
+        if self.use_movies and self.movies.play(effect_name):
+            time.sleep(duration)
+            return True
+        
+        ok = True
+        frames = int(duration * effect.fps)
+        for canvas in islice(effect.frames(self.width, self.height), frames):
+            ok = self.show_pattern(canvas) and ok
+            time.sleep(1 / effect.fps)
+        return ok
     
     def show_sun_animation(self, duration=3):
         """
@@ -584,39 +1376,7 @@ class TwinklySquare:
         Args:
             duration: Varighet i sekunder
         """
-        import math
-        frames = int(duration * 10)  # 10 fps
-        
-        for frame in range(frames):
-            canvas = [[(0, 0, 20) for _ in range(self.width)] for _ in range(self.height)]  # Blå himmel
-            
-            # Sol i midten
-            center_x, center_y = self.width // 2, self.height // 2
-            pulse = 0.8 + 0.2 * math.sin(frame * 0.5)  # Pulsering
-            
-            # Sol-sirkel
-            for y in range(self.height):
-                for x in range(self.width):
-                    dist = ((x - center_x) ** 2 + (y - center_y) ** 2) ** 0.5
-                    if dist < 3 * pulse:
-                        # Gul sol
-                        canvas[y][x] = (255, 255, 0)
-                    elif dist < 3.5 * pulse:
-                        # Orange kant
-                        canvas[y][x] = (255, 150, 0)
-            
-            # Stråler
-            if frame % 5 < 3:
-                for angle in range(0, 360, 45):
-                    rad = math.radians(angle)
-                    for r in range(4, 8):
-                        x = int(center_x + r * math.cos(rad))
-                        y = int(center_y + r * math.sin(rad))
-                        if 0 <= x < self.width and 0 <= y < self.height:
-                            canvas[y][x] = (255, 255, 100)
-            
-            self.show_pattern(canvas)
-            time.sleep(0.1)
+        return self.play_effect('sun', duration)
     
     def show_rain_animation(self, duration=3):
         """
@@ -625,41 +1385,7 @@ class TwinklySquare:
         Args:
             duration: Varighet i sekunder
         """
-        import random
-        frames = int(duration * 10)
-        
-        # Initialiser dråper
-        drops = []
-        for _ in range(15):
-            drops.append({
-                'x': random.randint(0, self.width - 1),
-                'y': random.randint(-10, self.height - 1),
-                'speed': random.uniform(0.5, 1.5)
-            })
-        
-        for frame in range(frames):
-            canvas = [[(20, 20, 40) for _ in range(self.width)] for _ in range(self.height)]  # Mørk himmel
-            
-            # Oppdater og tegn dråper
-            for drop in drops:
-                drop['y'] += drop['speed']
-                
-                # Reset dråpe som faller ut
-                if drop['y'] >= self.height:
-                    drop['y'] = -2
-                    drop['x'] = random.randint(0, self.width - 1)
-                
-                # Tegn dråpe
-                y = int(drop['y'])
-                x = int(drop['x'])
-                if 0 <= y < self.height and 0 <= x < self.width:
-                    canvas[y][x] = (100, 100, 255)  # Blå dråpe
-                    # Liten hale
-                    if y > 0:
-                        canvas[y - 1][x] = (50, 50, 150)
-            
-            self.show_pattern(canvas)
-            time.sleep(0.1)
+        return self.play_effect('rain', duration)
     
     def show_snow_animation(self, duration=3):
         """
@@ -668,46 +1394,7 @@ class TwinklySquare:
         Args:
             duration: Varighet i sekunder
         """
-        import random
-        frames = int(duration * 10)
-        
-        # Initialiser snøfnugg
-        flakes = []
-        for _ in range(20):
-            flakes.append({
-                'x': random.randint(0, self.width - 1),
-                'y': random.randint(-15, self.height - 1),
-                'speed': random.uniform(0.2, 0.6),
-                'drift': random.uniform(-0.2, 0.2)
-            })
-        
-        for frame in range(frames):
-            canvas = [[(10, 10, 30) for _ in range(self.width)] for _ in range(self.height)]  # Mørkeblå himmel
-            
-            # Oppdater og tegn snøfnugg
-            for flake in flakes:
-                flake['y'] += flake['speed']
-                flake['x'] += flake['drift']
-                
-                # Reset snøfnugg som faller ut
-                if flake['y'] >= self.height:
-                    flake['y'] = -2
-                    flake['x'] = random.randint(0, self.width - 1)
-                
-                # Wrap rundt kantene
-                if flake['x'] < 0:
-                    flake['x'] = self.width - 1
-                elif flake['x'] >= self.width:
-                    flake['x'] = 0
-                
-                # Tegn snøfnugg
-                y = int(flake['y'])
-                x = int(flake['x'])
-                if 0 <= y < self.height and 0 <= x < self.width:
-                    canvas[y][x] = (255, 255, 255)  # Hvit
-            
-            self.show_pattern(canvas)
-            time.sleep(0.1)
+        return self.play_effect('snow', duration)
     
     def show_electricity_warning(self, price, threshold=100, duration=2):
         """
@@ -721,37 +1408,7 @@ class TwinklySquare:
         if price < threshold:
             return  # Ikke vis varsling hvis pris er lav
         
-        frames = int(duration * 4)  # 4 fps for blinking
-        
-        for frame in range(frames):
-            if frame % 2 == 0:
-                # Rød bakgrunn med lyn-symbol
-                canvas = [[(255, 0, 0) for _ in range(self.width)] for _ in range(self.height)]
-                
-                # Tegn lyn-symbol i midten (forenklet)
-                mid_x = self.width // 2
-                lyn_pattern = [
-                    (mid_x, 3),
-                    (mid_x, 4),
-                    (mid_x - 1, 5),
-                    (mid_x - 1, 6),
-                    (mid_x, 7),
-                    (mid_x, 8),
-                    (mid_x + 1, 9),
-                    (mid_x + 1, 10),
-                    (mid_x, 11),
-                    (mid_x, 12)
-                ]
-                
-                for x, y in lyn_pattern:
-                    if 0 <= x < self.width and 0 <= y < self.height:
-                        canvas[y][x] = (255, 255, 0)  # Gul lyn
-            else:
-                # Svart skjerm (av)
-                canvas = [[(0, 0, 0) for _ in range(self.width)] for _ in range(self.height)]
-            
-            self.show_pattern(canvas)
-            time.sleep(0.25)
+        return self.play_effect('electricity_warning', duration)
     
     def show_thunder_animation(self, duration=3):
         """
@@ -760,53 +1417,7 @@ class TwinklySquare:
         Args:
             duration: Varighet i sekunder
         """
-        import random
-        frames = int(duration * 10)
-        
-        # Initialiser regndr åper
-        drops = []
-        for _ in range(20):
-            drops.append({
-                'x': random.randint(0, self.width - 1),
-                'y': random.randint(-10, self.height - 1),
-                'speed': random.uniform(1.0, 2.0)  # Raskere regn under tordenvær
-            })
-        
-        for frame in range(frames):
-            # Mørk himmel
-            canvas = [[(10, 10, 20) for _ in range(self.width)] for _ in range(self.height)]
-            
-            # Oppdater og tegn regndråper
-            for drop in drops:
-                drop['y'] += drop['speed']
-                if drop['y'] >= self.height:
-                    drop['y'] = -2
-                    drop['x'] = random.randint(0, self.width - 1)
-                
-                y = int(drop['y'])
-                x = int(drop['x'])
-                if 0 <= y < self.height and 0 <= x < self.width:
-                    canvas[y][x] = (100, 100, 255)
-            
-            # Lyn-effekt (tilfeldig)
-            if random.random() < 0.15:  # 15% sjanse for lyn
-                # Hvit flash over hele skjermen
-                for y in range(self.height):
-                    for x in range(self.width):
-                        canvas[y][x] = (255, 255, 255)
-            elif random.random() < 0.1:  # 10% sjanse for lyn-bolt
-                # Tegn lyn-bolt
-                mid_x = random.randint(self.width // 4, 3 * self.width // 4)
-                for y in range(0, self.height, 2):
-                    x_offset = random.choice([-1, 0, 1])
-                    x = mid_x + x_offset
-                    if 0 <= x < self.width:
-                        canvas[y][x] = (255, 255, 100)  # Gult lyn
-                        if y + 1 < self.height:
-                            canvas[y + 1][x] = (255, 255, 200)  # Hvitt lyn
-            
-            self.show_pattern(canvas)
-            time.sleep(0.1)
+        return self.play_effect('thunder', duration)
     
     def show_fog_animation(self, duration=3):
         """
@@ -815,27 +1426,7 @@ class TwinklySquare:
         Args:
             duration: Varighet i sekunder
         """
-        import random
-        import math
-        frames = int(duration * 10)
-        
-        for frame in range(frames):
-            canvas = [[(40, 40, 50) for _ in range(self.width)] for _ in range(self.height)]
-            
-            # Bevegelige tåkebanker
-            for y in range(self.height):
-                for x in range(self.width):
-                    # Bruk sinus-bølge for tåke-effekt
-                    wave1 = math.sin((x + frame * 0.3) * 0.5) * 0.5 + 0.5
-                    wave2 = math.sin((y + frame * 0.2) * 0.7) * 0.5 + 0.5
-                    fog_intensity = (wave1 + wave2) / 2
-                    
-                    # Grå tåke med varierende intensitet
-                    gray = int(100 + fog_intensity * 100)
-                    canvas[y][x] = (gray, gray, gray + 10)
-            
-            self.show_pattern(canvas)
-            time.sleep(0.1)
+        return self.play_effect('fog', duration)
     
     def clear(self) -> bool:
         """
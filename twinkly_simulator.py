@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+"""
+Lokal Twinkly-simulator for last- og latenstesting
+Snakker HTTP-endepunktene xled bruker og tar imot realtime-frames over UDP
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+REALTIME_UDP_PORT = 7777
+PANEL_SIZE = 8
+API_PREFIX = '/xled/v1/'
+
+
+def square_layout(panels_x: int = 3, panels_y: int = 2) -> List[Dict[str, float]]:
+    """
+    Lager et layout som ligner en Twinkly Square med flere paneler
+
+    Args:
+        panels_x: Antall paneler i bredden
+        panels_y: Antall paneler i høyden
+
+    Returns:
+        Liste med {'x', 'y', 'z'} koordinater i Twinkly sitt koordinatsystem
+    """
+    width = panels_x * PANEL_SIZE
+    height = panels_y * PANEL_SIZE
+    coordinates = []
+    for panel_y in range(panels_y):
+        for panel_x in range(panels_x):
+            for row in range(PANEL_SIZE):
+                columns = range(PANEL_SIZE) if row % 2 == 0 else range(PANEL_SIZE - 1, -1, -1)
+                for col in columns:
+                    x = panel_x * PANEL_SIZE + col
+                    y = panel_y * PANEL_SIZE + row
+                    coordinates.append({
+                        'x': -1.0 + (2 * x + 1) / width,
+                        'y': 1.0 - (y + 0.5) / height,
+                        'z': 0.0
+                    })
+    return coordinates
+
+
+class TwinklySimulator:
+    """Simulerer en Twinkly-enhet på localhost"""
+
+    def __init__(self, host: str = '127.0.0.1', http_port: int = 8081,
+                 udp_port: int = REALTIME_UDP_PORT, panels_x: int = 3, panels_y: int = 2,
+                 latency: float = 0.0, jitter: float = 0.0, packet_loss: float = 0.0,
+                 rt_timeout: float = 60.0, mac: str = '98:cd:ac:00:00:01',
+                 max_recorded_frames: int = 1000):
+        """
+        Args:
+            host: Adresse å lytte på
+            http_port: Port for HTTP API (bruk TWINKLY_IP=host:port)
+            udp_port: Port for realtime UDP (xled bruker alltid 7777)
+            panels_x: Antall paneler i bredden
+            panels_y: Antall paneler i høyden
+            latency: Forsinkelse i sekunder på hvert HTTP-svar
+            jitter: Tilfeldig ekstra forsinkelse (0 til jitter sekunder)
+            packet_loss: Andel UDP-pakker som forkastes (0.0-1.0)
+            rt_timeout: Sekunder uten frames før enheten forlater rt-modus
+            mac: MAC-adresse enheten rapporterer
+            max_recorded_frames: Antall mottatte frames som tas vare på
+        """
+        self.host = host
+        self.http_port = http_port
+        self.udp_port = udp_port
+        self.layout = square_layout(panels_x, panels_y)
+        self.latency = latency
+        self.jitter = jitter
+        self.packet_loss = packet_loss
+        self.rt_timeout = rt_timeout
+        self.mac = mac
+        self.frame_size = len(self.layout) * 3
+
+        self.mode = 'movie'
+        self._mode_before_rt = 'movie'
+        self.token: Optional[str] = None
+        self.verified = False
+        self.frames = deque(maxlen=max_recorded_frames)  # (tidspunkt, bytes)
+
+        # Filmer lagret på enheten (movies-API og gammelt led/movie-API)
+        self.movie_capacity = 5397  # Frames, som i gestalt
+        self.movies: List[dict] = []
+        self.current_movie_id: Optional[int] = None
+        self._pending_movie: Optional[dict] = None
+        self._next_movie_id = 0
+
+        self._lock = threading.Lock()
+        self._partial = bytearray()
+        self._last_frame_at = 0.0
+        self._stop = threading.Event()
+        self._http: Optional[ThreadingHTTPServer] = None
+        self._udp: Optional[socket.socket] = None
+        self._threads: List[threading.Thread] = []
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Nullstiller tellere og mottatte frames"""
+        with self._lock:
+            self.counters = {
+                'http_requests': 0,
+                'logins': 0,
+                'mode_changes': 0,
+                'rt_timeouts': 0,
+                'packets_received': 0,
+                'packets_lost': 0,
+                'packets_rejected': 0,
+                'frames_received': 0,
+                'frames_ignored': 0,
+                'frames_incomplete': 0,
+                'movie_uploads': 0,
+                'movie_bytes': 0,
+            }
+            self.frames.clear()
+
+    # --- Tilstand ---
+
+    def _expire_rt_mode(self, now: float):
+        """Faller tilbake fra rt-modus når ingen frames har kommet innen timeout"""
+        if self.mode == 'rt' and now - self._last_frame_at > self.rt_timeout:
+            self.mode = self._mode_before_rt
+            self.counters['rt_timeouts'] += 1
+            self.counters['mode_changes'] += 1
+
+    def current_mode(self) -> str:
+        """Nåværende modus etter eventuell rt-timeout"""
+        with self._lock:
+            self._expire_rt_mode(time.time())
+            return self.mode
+
+    def set_mode(self, mode: str):
+        """Bytter modus som om det kom via API"""
+        with self._lock:
+            now = time.time()
+            self._expire_rt_mode(now)
+            if mode == 'rt' and self.mode != 'rt':
+                self._mode_before_rt = self.mode
+                # Enheten gir en ny frist fra tidspunktet rt-modus settes
+                self._last_frame_at = now
+            if mode != self.mode:
+                self.counters['mode_changes'] += 1
+            self.mode = mode
+
+    def stats(self) -> dict:
+        """
+        Statistikk over hva simulatoren har mottatt
+
+        Returns:
+            Dictionary med tellere, modus og målt fps
+        """
+        with self._lock:
+            now = time.time()
+            self._expire_rt_mode(now)
+            recent = [t for t, _ in self.frames if now - t <= 5.0]
+            fps = 0.0
+            if len(recent) > 1:
+                span = recent[-1] - recent[0]
+                fps = (len(recent) - 1) / span if span > 0 else 0.0
+            return dict(
+                self.counters,
+                mode=self.mode,
+                fps=round(fps, 2),
+                leds=len(self.layout),
+                movies=len(self.movies),
+                current_movie=self._movie_name(self.current_movie_id),
+                last_frame_age=round(now - self._last_frame_at, 3) if self._last_frame_at else None,
+            )
+
+    # --- Filmer ---
+
+    def _movie_name(self, movie_id: Optional[int]) -> Optional[str]:
+        for movie in self.movies:
+            if movie['id'] == movie_id:
+                return movie['name']
+        return None
+
+    def _used_frames(self) -> int:
+        return sum(movie['frames_number'] for movie in self.movies)
+
+    def _movie_listing(self) -> dict:
+        return {
+            'movies': [{key: value for key, value in movie.items() if key not in ('data', 'legacy')}
+                       for movie in self.movies if not movie.get('legacy')],
+            'available_frames': self.movie_capacity - self._used_frames(),
+            'max_capacity': self.movie_capacity,
+            'code': 1000,
+        }
+
+    def _handle_movies(self, method: str, endpoint: str, body: bytes):
+        """Endepunktene for filmer (movies/* og det gamle led/movie/*)"""
+        with self._lock:
+            if endpoint == 'movies':
+                if method == 'DELETE':
+                    self.movies = []
+                    self.current_movie_id = None
+                    return 200, {'code': 1000}
+                return 200, self._movie_listing()
+
+            if endpoint == 'movies/new' and method == 'POST':
+                try:
+                    config = json.loads(body or b'{}')
+                    movie = {
+                        'id': self._next_movie_id,
+                        'name': str(config['name']),
+                        'unique_id': str(config['unique_id']),
+                        'descriptor_type': str(config['descriptor_type']),
+                        'leds_per_frame': int(config['leds_per_frame']),
+                        'frames_number': int(config['frames_number']),
+                        'fps': float(config['fps']),
+                    }
+                except (ValueError, KeyError, TypeError):
+                    return 400, {'code': 1101}
+                if movie['descriptor_type'] != 'rgb_raw' or movie['leds_per_frame'] != len(self.layout):
+                    return 400, {'code': 1101}
+                if movie['frames_number'] > self.movie_capacity - self._used_frames():
+                    return 400, {'code': 1105}
+                self._next_movie_id += 1
+                self._pending_movie = movie
+                return 200, {'id': movie['id'], 'code': 1000}
+
+            if endpoint in ('movies/full', 'led/movie/full') and method == 'POST':
+                movie = self._pending_movie
+                if movie is None:
+                    return 400, {'code': 1104}
+                if len(body) != movie['leds_per_frame'] * 3 * movie['frames_number']:
+                    return 400, {'code': 1103}
+                movie['data'] = body
+                self._pending_movie = None
+                if endpoint == 'led/movie/full':
+                    # Det gamle API-et har bare én film, og den blir gjeldende film
+                    self.movies = [m for m in self.movies if m.get('legacy') is None]
+                    movie['legacy'] = True
+                    self.current_movie_id = movie['id']
+                self.movies.append(movie)
+                self.counters['movie_uploads'] += 1
+                self.counters['movie_bytes'] += len(body)
+                return 200, {'frames_number': movie['frames_number'], 'code': 1000}
+
+            if endpoint == 'led/movie/config' and method == 'POST':
+                try:
+                    config = json.loads(body or b'{}')
+                    frame_delay = int(config['frame_delay'])
+                    self._pending_movie = {
+                        'id': self._next_movie_id,
+                        'name': 'legacy',
+                        'unique_id': '',
+                        'descriptor_type': 'rgb_raw',
+                        'leds_per_frame': int(config['leds_number']),
+                        'frames_number': int(config['frames_number']),
+                        'fps': round(1000 / frame_delay, 2) if frame_delay else 0,
+                    }
+                except (ValueError, KeyError, TypeError):
+                    return 400, {'code': 1101}
+                self._next_movie_id += 1
+                return 200, {'code': 1000}
+
+            if endpoint == 'movies/current':
+                if method == 'POST':
+                    try:
+                        movie_id = int(json.loads(body or b'{}')['id'])
+                    except (ValueError, KeyError, TypeError):
+                        return 400, {'code': 1101}
+                    if self._movie_name(movie_id) is None:
+                        return 400, {'code': 1104}
+                    self.current_movie_id = movie_id
+                    return 200, {'code': 1000}
+                for movie in self.movies:
+                    if movie['id'] == self.current_movie_id:
+                        return 200, {'id': movie['id'], 'unique_id': movie['unique_id'],
+                                     'name': movie['name'], 'code': 1000}
+                return 200, {'id': -1, 'code': 1000}
+
+        return 404, {'code': 1104}
+
+    # --- HTTP ---
+
+    def _delay(self):
+        """Simulert nettverks- og prosesseringsforsinkelse"""
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _gestalt(self) -> dict:
+        return {
+            'product_name': 'Twinkly',
+            'hardware_version': '100',
+            'bytes_per_led': 3,
+            'hw_id': self.mac.replace(':', '')[-6:],
+            'flash_size': 64,
+            'led_type': 14,
+            'product_code': 'TWQ064STW',
+            'fw_family': 'G',
+            'device_name': 'Twinkly_Simulator',
+            'uptime': str(int(time.monotonic() * 1000)),
+            'mac': self.mac,
+            'uuid': '00000000-0000-0000-0000-' + self.mac.replace(':', ''),
+            'max_supported_led': 1024,
+            'number_of_led': len(self.layout),
+            'led_profile': 'RGB',
+            'frame_rate': 23.74,
+            'movie_capacity': 5397,
+            'copyright': 'LEDWORKS 2021',
+            'code': 1000,
+        }
+
+    def handle_http(self, method: str, path: str, headers, body: bytes):
+        """
+        Behandler ett API-kall
+
+        Returns:
+            Tuple med (HTTP status, JSON-svar)
+        """
+        with self._lock:
+            self.counters['http_requests'] += 1
+
+        if path.startswith('/sim/'):
+            return self._handle_sim(method, path, body)
+
+        if not path.startswith(API_PREFIX):
+            return 404, {'code': 1104}
+        endpoint = path[len(API_PREFIX):].split('?')[0]
+
+        self._delay()
+
+        if endpoint == 'login' and method == 'POST':
+            with self._lock:
+                self.token = base64.b64encode(os.urandom(8)).decode()
+                self.verified = False
+                self.counters['logins'] += 1
+            return 200, {
+                'authentication_token': self.token,
+                'authentication_token_expires_in': 14400,
+                'challenge-response': base64.b64encode(os.urandom(20)).decode()[:40],
+                'code': 1000,
+            }
+
+        if endpoint == 'gestalt':
+            return 200, self._gestalt()
+
+        # Resten krever gyldig token
+        if not self.token or headers.get('X-Auth-Token') != self.token:
+            return 401, {'code': 1104}
+
+        if endpoint == 'verify' and method == 'POST':
+            self.verified = True
+            return 200, {'code': 1000}
+        if endpoint == 'fw/version':
+            return 200, {'version': '2.8.11', 'code': 1000}
+        if endpoint == 'device_name':
+            return 200, {'name': 'Twinkly_Simulator', 'code': 1000}
+        if endpoint == 'led/layout/full':
+            return 200, {'source': '2d', 'synthesized': False, 'coordinates': self.layout, 'code': 1000}
+        if endpoint == 'led/mode':
+            if method == 'POST':
+                try:
+                    mode = json.loads(body or b'{}').get('mode')
+                except ValueError:
+                    return 400, {'code': 1101}
+                if mode not in ('off', 'color', 'demo', 'effect', 'movie', 'playlist', 'rt'):
+                    return 400, {'code': 1101}
+                self.set_mode(mode)
+                return 200, {'code': 1000}
+            return 200, {'mode': self.current_mode(), 'code': 1000}
+        if endpoint.startswith('movies') or endpoint.startswith('led/movie/'):
+            return self._handle_movies(method, endpoint, body)
+
+        return 404, {'code': 1104}
+
+    def _handle_sim(self, method: str, path: str, body: bytes):
+        """Kontroll-endepunkter for selve simulatoren (ikke en del av Twinkly API)"""
+        if path == '/sim/stats':
+            return 200, self.stats()
+        if path == '/sim/reset' and method == 'POST':
+            self.reset_stats()
+            return 200, {'ok': True}
+        if path == '/sim/config' and method == 'POST':
+            try:
+                config = json.loads(body or b'{}')
+            except ValueError:
+                return 400, {'error': 'ugyldig JSON'}
+            for key in ('latency', 'jitter', 'packet_loss', 'rt_timeout'):
+                if key in config:
+                    setattr(self, key, float(config[key]))
+            if 'mode' in config:
+                # Simuler at enheten bytter modus selv (f.eks. fra appen)
+                self.set_mode(config['mode'])
+            return 200, {'ok': True}
+        return 404, {'error': 'ukjent endepunkt'}
+
+    # --- UDP ---
+
+    def handle_packet(self, packet: bytes):
+        """
+        Behandler én realtime UDP-pakke (protokollversjon 1, 2 eller 3)
+
+        Args:
+            packet: Rå UDP-pakke
+        """
+        with self._lock:
+            self.counters['packets_received'] += 1
+
+            if self.packet_loss and random.random() < self.packet_loss:
+                self.counters['packets_lost'] += 1
+                return
+
+            if len(packet) < 10 or not self.token:
+                self.counters['packets_rejected'] += 1
+                return
+
+            version = packet[0]
+            token = base64.b64encode(packet[1:9]).decode()
+            if token != self.token:
+                self.counters['packets_rejected'] += 1
+                return
+
+            if version == 3:
+                if len(packet) < 12:
+                    self.counters['packets_rejected'] += 1
+                    return
+                fragment = packet[11]
+                payload = packet[12:]
+                if fragment == 0:
+                    if self._partial:
+                        self.counters['frames_incomplete'] += 1
+                    self._partial = bytearray()
+                elif not self._partial:
+                    # Første fragment gikk tapt - resten av framen er ubrukelig
+                    return
+                self._partial.extend(payload)
+                if len(self._partial) < self.frame_size:
+                    return
+                frame = bytes(self._partial[:self.frame_size])
+                self._partial = bytearray()
+            else:
+                # Versjon 1 og 2 har 10 byte header og hele framen i én pakke
+                frame = bytes(packet[10:])
+
+            now = time.time()
+            self._expire_rt_mode(now)
+            if self.mode != 'rt':
+                self.counters['frames_ignored'] += 1
+                return
+
+            self._last_frame_at = now
+            self.counters['frames_received'] += 1
+            self.frames.append((now, frame))
+
+    def _udp_loop(self):
+        while not self._stop.is_set():
+            try:
+                packet, _ = self._udp.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.handle_packet(packet)
+
+    # --- Start/stopp ---
+
+    def _make_handler(self):
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, payload = simulator.handle_http(method, self.path, self.headers, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def do_DELETE(self):
+                self._respond('DELETE')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Starter HTTP- og UDP-serveren i bakgrunnstråder"""
+        self._stop.clear()
+        self._http = ThreadingHTTPServer((self.host, self.http_port), self._make_handler())
+        self._http.daemon_threads = True
+        self.http_port = self._http.server_address[1]
+
+        self._udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._udp.bind((self.host, self.udp_port))
+        self._udp.settimeout(0.5)
+        self.udp_port = self._udp.getsockname()[1]
+
+        self._threads = [
+            threading.Thread(target=self._http.serve_forever, name='sim-http', daemon=True),
+            threading.Thread(target=self._udp_loop, name='sim-udp', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stopper serverne"""
+        self._stop.set()
+        if self._http:
+            self._http.shutdown()
+            self._http.server_close()
+        if self._udp:
+            self._udp.close()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    @property
+    def address(self) -> str:
+        """Adressen TwinklySquare skal bruke (TWINKLY_IP)"""
+        return f"{self.host}:{self.http_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokal Twinkly-simulator")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--http-port', type=int, default=8081)
+    parser.add_argument('--udp-port', type=int, default=REALTIME_UDP_PORT)
+    parser.add_argument('--panels', default='3x2', help="Paneloppsett BxH (standard 3x2 = 384 LEDs)")
+    parser.add_argument('--latency', type=float, default=0.0, help="HTTP-forsinkelse i sekunder")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Tilfeldig ekstra HTTP-forsinkelse")
+    parser.add_argument('--packet-loss', type=float, default=0.0, help="Andel UDP-pakker som forkastes")
+    parser.add_argument('--rt-timeout', type=float, default=60.0, help="Sekunder før rt-modus faller ut")
+    args = parser.parse_args()
+
+    panels_x, panels_y = (int(v) for v in args.panels.lower().split('x'))
+    simulator = TwinklySimulator(
+        host=args.host,
+        http_port=args.http_port,
+        udp_port=args.udp_port,
+        panels_x=panels_x,
+        panels_y=panels_y,
+        latency=args.latency,
+        jitter=args.jitter,
+        packet_loss=args.packet_loss,
+        rt_timeout=args.rt_timeout
+    )
+    simulator.start()
+
+    print("=" * 50)
+    print("Twinkly Simulator")
+    print("=" * 50)
+    print(f"HTTP: http://{simulator.address}{API_PREFIX}")
+    print(f"UDP:  {args.host}:{simulator.udp_port}")
+    print(f"Bruk TWINKLY_IP={simulator.address}")
+    print("Trykk Ctrl+C for å stoppe\n")
+
+    try:
+        while True:
+            time.sleep(5)
+            s = simulator.stats()
+            print(f"  modus={s['mode']:6s} fps={s['fps']:6.2f} frames={s['frames_received']} "
+                  f"tapt={s['packets_lost']} ufullstendige={s['frames_incomplete']} "
+                  f"rt-timeouts={s['rt_timeouts']}")
+    except KeyboardInterrupt:
+        print("\nStopper...")
+    finally:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
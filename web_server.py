@@ -2,12 +2,14 @@
 """
 Webserver for å kontrollere Twinkly Display
 """
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
 import subprocess
 import json
 import os
+import time
 from pathlib import Path
 from dotenv import load_dotenv
+from metrics import load_snapshot, to_prometheus
 
 app = Flask(__name__)
 
@@ -18,6 +20,17 @@ load_dotenv(env_path)
 # State fil for å lagre innstillinger
 STATE_FILE = Path(__file__).parent / 'display_state.json'
 
+# Yr-prognoser deles mellom forespørslene - hvert sted hentes bare når Expires er passert
+_forecasts = None
+
+def get_forecasts():
+    """ForecastManager for stedene i YR_LOCATIONS (lages ved første bruk)"""
+    global _forecasts
+    if _forecasts is None:
+        from forecast_manager import ForecastManager
+        _forecasts = ForecastManager(base_url=os.getenv('YR_API_URL'))
+    return _forecasts
+
 def get_state():
     """Hent nåværende state"""
     if STATE_FILE.exists():
@@ -53,8 +66,8 @@ def get_locations():
     try:
         # Importer alle klienter
         from netatmo_client import NetatmoClient
-        from yr_client import YrClient
         from electricity_client import ElectricityClient
+        from forecast_manager import temperature_key
         
         locations = []
         
@@ -71,14 +84,15 @@ def get_locations():
                 client_secret=netatmo_client_secret,
                 username=netatmo_username,
                 password=netatmo_password,
-                refresh_token=netatmo_refresh_token
+                refresh_token=netatmo_refresh_token,
+                api_url=os.getenv('NETATMO_API_URL')
             )
             temps = netatmo.get_all_temperatures()
             locations.extend(list(temps.keys()))
         
         # Legg til Yr og Strømpris
-        locations.append('Ute (Sokndal)')
-        locations.append('Strømpris NO2')
+        locations.extend(temperature_key(name) for name in get_forecasts().clients)
+        locations.append(ElectricityClient(region='NO2').reading_name)
         
         return locations
     except Exception as e:
@@ -100,7 +114,6 @@ def status():
     # Hent temperaturer
     try:
         from netatmo_client import NetatmoClient
-        from yr_client import YrClient
         from electricity_client import ElectricityClient
         
         netatmo_client_id = os.getenv('NETATMO_CLIENT_ID')
@@ -117,25 +130,25 @@ def status():
                 client_secret=netatmo_client_secret,
                 username=netatmo_username,
                 password=netatmo_password,
-                refresh_token=netatmo_refresh_token
+                refresh_token=netatmo_refresh_token,
+                api_url=os.getenv('NETATMO_API_URL')
             )
             temperatures = netatmo.get_all_temperatures()
         
-        # Legg til Yr utetemperatur
+        # Legg til Yr utetemperatur for alle steder (hentes samtidig, bare de som er utløpt)
         try:
-            yr = YrClient(lat=58.35, lon=6.63)
-            yr_temp = yr.get_current_temperature()
-            if yr_temp is not None:
-                temperatures['Ute (Sokndal)'] = yr_temp
+            forecasts = get_forecasts()
+            forecasts.refresh()
+            temperatures.update(forecasts.current_temperatures())
         except Exception as e:
             print(f"Yr feil: {e}")
         
         # Legg til strømpris
         try:
-            electricity = ElectricityClient(region='NO2')
-            price = electricity.get_current_price()
+            electricity = ElectricityClient(region='NO2', base_url=os.getenv('STROMPRIS_API_URL'))
+            price = electricity.get_current_reading()
             if price is not None:
-                temperatures['Strømpris NO2'] = price
+                temperatures[price.name] = price.value
         except Exception as e:
             print(f"Strømpris feil: {e}")
         
@@ -147,6 +160,28 @@ def status():
     
     return jsonify(state)
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Driftsmålinger fra main.py i Prometheus-format"""
+    snapshot = load_snapshot()
+    if snapshot is None:
+        return Response("# main.py har ikke skrevet metrics.json ennå\n", status=503, mimetype='text/plain')
+    text = to_prometheus(snapshot)
+    # Gamle tall betyr at main.py har stoppet - vises som egen måling
+    text += "# HELP twinkly_metrics_age_seconds Sekunder siden main.py skrev målingene\n"
+    text += "# TYPE twinkly_metrics_age_seconds gauge\n"
+    text += f"twinkly_metrics_age_seconds {time.time() - snapshot['time']:.1f}\n"
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Driftsmålinger fra main.py som JSON (for kontrollpanelet)"""
+    snapshot = load_snapshot()
+    if snapshot is None:
+        return jsonify({'success': False, 'error': 'Ingen målinger ennå - kjører main.py?'}), 503
+    snapshot['age'] = time.time() - snapshot['time']
+    return jsonify(snapshot)
+
 @app.route('/api/start', methods=['POST'])
 def start_service():
     """Start display service"""
@@ -186,17 +221,18 @@ def stop_service():
         # Stopp main.py prosessen
         subprocess.run(['pkill', '-f', 'python.*main.py'], capture_output=True)
         
-        # Slå av Twinkly display
-        try:
-            from twinkly_client import TwinklySquare
-            twinkly_ip = os.getenv('TWINKLY_IP')
-            if twinkly_ip:
-                twinkly = TwinklySquare(ip_address=twinkly_ip)
-                if twinkly.connect():
-                    twinkly.clear()
-                    print("✓ Twinkly display slått av")
-        except Exception as e:
-            print(f"Kunne ikke slå av Twinkly: {e}")
+        # Slå av Twinkly display(ene)
+        from twinkly_client import TwinklySquare
+        from display_worker import load_device_configs
+        for device in load_device_configs():
+            try:
+                if device['ip']:
+                    twinkly = TwinklySquare(ip_address=device['ip'])
+                    if twinkly.connect():
+                        twinkly.clear()
+                        print(f"✓ {device['name']} slått av")
+            except Exception as e:
+                print(f"Kunne ikke slå av {device['name']}: {e}")
         
         state = get_state()
         state['service_running'] = False
@@ -208,12 +244,12 @@ def stop_service():
 
 @app.route('/api/mode', methods=['POST'])
 def set_mode():
-    """Sett modus (rotate eller single)"""
+    """Sett modus (rotate, single, trend, prices eller forecast)"""
     try:
         data = request.json
         mode = data.get('mode')
         
-        if mode not in ['rotate', 'single']:
+        if mode not in ['rotate', 'single', 'trend', 'prices', 'forecast']:
             return jsonify({'success': False, 'error': 'Ugyldig modus'}), 400
         
         state = get_state()
@@ -225,6 +261,9 @@ def set_mode():
             if not location:
                 return jsonify({'success': False, 'error': 'Location kreves for single mode'}), 400
             state['location'] = location
+        elif mode == 'trend':
+            # Uten lokasjon roteres det mellom trendene for alle lokasjoner
+            state['location'] = data.get('location')
         else:
             state['location'] = None
         
@@ -330,30 +369,35 @@ def reconnect_twinkly():
     """Prøv å koble til Twinkly på nytt"""
     try:
         from twinkly_client import TwinklySquare
-        twinkly_ip = os.getenv('TWINKLY_IP')
+        from display_worker import load_device_configs
+        devices = [device for device in load_device_configs() if device['ip']]
         
-        if not twinkly_ip:
+        if not devices:
             return jsonify({'success': False, 'error': 'Twinkly IP ikke konfigurert'}), 400
         
-        # Prøv å koble til
-        twinkly = TwinklySquare(ip_address=twinkly_ip)
-        
+        # Prøv å koble til hver enhet
         max_retries = 5
-        for attempt in range(1, max_retries + 1):
-            if twinkly.connect():
-                if twinkly.set_mode_rt():
-                    return jsonify({
-                        'success': True, 
-                        'message': f'✓ Koblet til Twinkly (forsøk {attempt}/{max_retries})'
-                    })
-            
-            if attempt < max_retries:
-                import time
-                time.sleep(2)
+        connected = []
+        for device in devices:
+            twinkly = TwinklySquare(ip_address=device['ip'])
+            for attempt in range(1, max_retries + 1):
+                if twinkly.connect() and twinkly.set_mode_rt():
+                    connected.append(f"{device['name']} (forsøk {attempt}/{max_retries})")
+                    break
+                
+                if attempt < max_retries:
+                    import time
+                    time.sleep(2)
+        
+        if len(connected) == len(devices):
+            return jsonify({
+                'success': True, 
+                'message': f'✓ Koblet til {", ".join(connected)}'
+            })
         
         return jsonify({
             'success': False, 
-            'error': f'Kunne ikke koble til Twinkly etter {max_retries} forsøk'
+            'error': f'Kunne ikke koble til {len(devices) - len(connected)} av {len(devices)} Twinkly-enheter etter {max_retries} forsøk'
         }), 500
         
     except Exception as e:
@@ -2,139 +2,256 @@
 Yr API Client for værdata
 Bruker Locationforecast API fra Yr/MET Norway
 """
+import math
 import requests
-from datetime import datetime
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+
+import metrics
+
+
+# Hvor lenge en prognose brukes når svaret mangler Expires
+DEFAULT_MAX_AGE = 30 * 60
+
+# met.no krever maks 4 desimaler - flere gir 403 og bommer på CDN-cachen
+COORD_DECIMALS = 4
+
+# Svartid og resultat per kall (cached = prognosen var fortsatt fersk, ingen forespørsel)
+FETCH_SECONDS, FETCHES = metrics.fetch_metrics('yr', ('ok', 'not_modified', 'cached', 'error'))
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[float]:
+    """HTTP-dato (Expires/Last-Modified) som Unix-tid"""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class Forecast:
+    """
+    Locationforecast tolket én gang til kolonner (én tabell per felt)
+    
+    Rad i tilsvarer timeseries[i]. Manglende tall lagres som NaN og
+    returneres som None.
+    """
+    
+    COLUMNS = ('temperature', 'humidity', 'wind_speed', 'wind_direction', 'precipitation')
+    
+    def __init__(self, data: dict, updated_at: Optional[float] = None):
+        """
+        Args:
+            data: JSON-svar fra Locationforecast (compact)
+            updated_at: Når prognosen ble hentet (Unix-tid, standard nå)
+        """
+        self.updated_at = time.time() if updated_at is None else updated_at
+        self.times = array('d')
+        self.temperature = array('f')
+        self.humidity = array('f')
+        self.wind_speed = array('f')
+        self.wind_direction = array('f')
+        self.precipitation = array('f')
+        # Symbolkoder lagres som indeks i symbol_codes (-1 = mangler)
+        self.symbol_codes: List[str] = []
+        self.symbols = array('h')
+        symbol_index: Dict[str, int] = {}
+        nan = float('nan')
+        
+        for entry in data.get('properties', {}).get('timeseries', []):
+            entry_data = entry.get('data', {})
+            instant = entry_data.get('instant', {}).get('details', {})
+            # Siste del av prognosen har bare 6-timers oppsummering
+            period = entry_data.get('next_1_hours') or entry_data.get('next_6_hours') or {}
+            
+            self.times.append(datetime.strptime(entry['time'], '%Y-%m-%dT%H:%M:%SZ')
+                              .replace(tzinfo=timezone.utc).timestamp())
+            for column, value in (
+                (self.temperature, instant.get('air_temperature')),
+                (self.humidity, instant.get('relative_humidity')),
+                (self.wind_speed, instant.get('wind_speed')),
+                (self.wind_direction, instant.get('wind_from_direction')),
+                (self.precipitation, period.get('details', {}).get('precipitation_amount', 0)),
+            ):
+                column.append(nan if value is None else value)
+            
+            symbol = period.get('summary', {}).get('symbol_code')
+            if symbol is None:
+                self.symbols.append(-1)
+            else:
+                if symbol not in symbol_index:
+                    symbol_index[symbol] = len(self.symbol_codes)
+                    self.symbol_codes.append(symbol)
+                self.symbols.append(symbol_index[symbol])
+    
+    def __len__(self) -> int:
+        return len(self.times)
+    
+    def index_at(self, timestamp: float) -> Optional[int]:
+        """
+        Raden som gjelder på tidspunktet (siste rad med tid <= timestamp)
+        
+        Før første rad brukes første rad. None hvis prognosen er tom.
+        """
+        if not self.times:
+            return None
+        return max(0, bisect_right(self.times, timestamp) - 1)
+    
+    def row(self, index: int) -> dict:
+        """Én rad som dict (samme nøkler som YrClient.get_weather_data)"""
+        def value(column):
+            v = column[index]
+            return None if math.isnan(v) else round(v, 1)
+        
+        symbol = self.symbols[index]
+        return {
+            'time': self.times[index],
+            'temperature': value(self.temperature),
+            'humidity': value(self.humidity),
+            'wind_speed': value(self.wind_speed),
+            'wind_direction': value(self.wind_direction),
+            'symbol': self.symbol_codes[symbol] if symbol >= 0 else None,
+            'precipitation': value(self.precipitation) or 0,
+        }
+    
+    def current(self, now: Optional[float] = None) -> Optional[dict]:
+        """Raden som gjelder nå (ikke bare første rad - cachet prognose kan være eldre)"""
+        index = self.index_at(time.time() if now is None else now)
+        return None if index is None else self.row(index)
+    
+    def range_indexes(self, start: float, end: float) -> range:
+        """Indekser for rader med start <= tid < end (binærsøk)"""
+        return range(bisect_left(self.times, start), bisect_left(self.times, end))
+    
+    def range(self, start: float, end: float) -> List[dict]:
+        """Rader med start <= tid < end"""
+        return [self.row(i) for i in self.range_indexes(start, end)]
+    
+    def next_hours(self, hours: float = 24, now: Optional[float] = None) -> List[dict]:
+        """
+        Prognosen for de neste timene, fra raden som gjelder nå
+        
+        Args:
+            hours: Antall timer fremover (typisk 24-48)
+            now: Unix-tid (standard nå)
+        """
+        now = time.time() if now is None else now
+        first = self.index_at(now)
+        if first is None:
+            return []
+        return self.range(self.times[first], now + hours * 3600)
 
 
 class YrClient:
     """Klient for å hente værdata fra Yr"""
     
-    def __init__(self, lat=58.0, lon=6.5):
+    BASE_URL = "https://api.met.no/weatherapi/locationforecast/2.0/compact"
+    
+    def __init__(self, lat=58.0, lon=6.5, base_url=None, session=None):
         """
         Args:
             lat: Breddegrad (default: Sokndal ~58.0)
             lon: Lengdegrad (default: Sokndal ~6.5)
+            base_url: Overstyrer API-adressen (f.eks. fake_upstream.py)
+            session: Delt requests.Session (f.eks. fra ForecastManager) - standard ingen
         """
-        self.lat = lat
-        self.lon = lon
-        self.base_url = "https://api.met.no/weatherapi/locationforecast/2.0/compact"
+        self.lat = round(lat, COORD_DECIMALS)
+        self.lon = round(lon, COORD_DECIMALS)
+        self.base_url = base_url or self.BASE_URL
+        self.http = session or requests
         self.headers = {
             'User-Agent': 'TwinklyDisplay/1.0 (private home display)'
         }
+        # Prognosen tolkes én gang og brukes til Expires fra met.no
+        self.forecast: Optional[Forecast] = None
+        self.expires_at = 0.0
+        self.last_modified: Optional[str] = None
+        self.last_success = 0.0  # Siste svar med 200 eller 304 (Unix-tid)
     
-    def get_current_temperature(self):
+    def get_forecast(self) -> Optional[Forecast]:
         """
-        Hent nåværende utetemperatur fra Yr
+        Henter prognosen - cachet til Expires, og med If-Modified-Since etterpå
         
         Returns:
-            float: Temperatur i celsius, eller None ved feil
+            Forecast, eller None ved feil (siste prognose brukes hvis den finnes)
         """
+        now = time.time()
+        if self.forecast is not None and now < self.expires_at:
+            FETCHES['cached'].inc()
+            return self.forecast
+        
+        start = time.perf_counter()
         try:
             params = {
                 'lat': self.lat,
                 'lon': self.lon
             }
+            headers = dict(self.headers)
+            if self.forecast is not None and self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
             
-            response = requests.get(
+            response = self.http.get(
                 self.base_url,
                 params=params,
-                headers=self.headers,
+                headers=headers,
                 timeout=10
             )
+            FETCH_SECONDS.observe(time.perf_counter() - start)
             
             if response.status_code == 200:
-                data = response.json()
-                # Hent første timeserie (nå)
-                timeseries = data.get('properties', {}).get('timeseries', [])
-                if timeseries:
-                    current = timeseries[0]
-                    temp = current.get('data', {}).get('instant', {}).get('details', {}).get('air_temperature')
-                    return temp
+                self.forecast = Forecast(response.json(), now)
+                self.last_modified = response.headers.get('Last-Modified')
+                FETCHES['ok'].inc()
+            elif response.status_code == 304:
+                FETCHES['not_modified'].inc()
             else:
                 print(f"Yr API feil: {response.status_code}")
-                return None
+                FETCHES['error'].inc()
+                return self.forecast
+            
+            self.expires_at = _parse_http_date(response.headers.get('Expires')) or now + DEFAULT_MAX_AGE
+            self.last_success = now
+            return self.forecast
                 
         except Exception as e:
             print(f"Feil ved henting av Yr data: {e}")
-            return None
+            FETCHES['error'].inc()
+            return self.forecast
+    
+    def get_current_temperature(self):
+        """
+        Hent nåværende utetemperatur fra Yr
+        
+        Returns:
+            float: Temperatur i celsius, eller None ved feil
+        """
+        weather = self.get_weather_data()
+        return weather['temperature'] if weather else None
     
     def get_weather_symbol(self):
         """
-        Hent værsymbol (for fremtidig bruk)
+        Hent værsymbol for inneværende time
         
         Returns:
             str: Værsymbol kode eller None
         """
-        try:
-            params = {
-                'lat': self.lat,
-                'lon': self.lon
-            }
-            
-            response = requests.get(
-                self.base_url,
-                params=params,
-                headers=self.headers,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                timeseries = data.get('properties', {}).get('timeseries', [])
-                if timeseries:
-                    current = timeseries[0]
-                    symbol = current.get('data', {}).get('next_1_hours', {}).get('summary', {}).get('symbol_code')
-                    return symbol
-            
-            return None
-                
-        except Exception as e:
-            print(f"Feil ved henting av værsymbol: {e}")
-            return None
+        weather = self.get_weather_data()
+        return weather['symbol'] if weather else None
     
     def get_weather_data(self):
         """
-        Hent komplett værdata
+        Hent komplett værdata for nå
         
         Returns:
             dict: Værdata med temperatur, symbol, nedbør, vind, etc. eller None
         """
-        try:
-            params = {
-                'lat': self.lat,
-                'lon': self.lon
-            }
-            
-            response = requests.get(
-                self.base_url,
-                params=params,
-                headers=self.headers,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                timeseries = data.get('properties', {}).get('timeseries', [])
-                if timeseries:
-                    current = timeseries[0]['data']
-                    instant = current.get('instant', {}).get('details', {})
-                    next_hour = current.get('next_1_hours', {})
-                    
-                    weather_data = {
-                        'temperature': instant.get('air_temperature'),
-                        'humidity': instant.get('relative_humidity'),
-                        'wind_speed': instant.get('wind_speed'),
-                        'wind_direction': instant.get('wind_from_direction'),
-                        'symbol': next_hour.get('summary', {}).get('symbol_code'),
-                        'precipitation': next_hour.get('details', {}).get('precipitation_amount', 0)
-                    }
-                    return weather_data
-            
-            return None
-                
-        except Exception as e:
-            print(f"Feil ved henting av værdata: {e}")
-            return None
+        forecast = self.get_forecast()
+        return forecast.current() if forecast is not None else None
     
     def is_rainy(self):
         """Sjekk om det regner"""